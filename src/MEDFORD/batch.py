@@ -0,0 +1,113 @@
+"""Module for validating many MEDFORD files at once, e.g. a whole archive.
+
+Files are validated on a pool of worker processes that import the parser (and
+pydantic) once and are then reused for every file, instead of starting a new
+interpreter per file. Used by `medford validate --recursive DIR -j N`."""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from typing import Any, Dict, Iterator, List, Optional, TextIO, TYPE_CHECKING
+
+if TYPE_CHECKING :
+    from MEDFORD.cache import ResultCache
+
+class FileOutcome() :
+    """Pass/fail summary of validating one file, small enough to send back from a worker."""
+    filename: str
+    passed: bool
+    error_counts: Dict[str, int] # number of errors per category, see ValidationResult.errors
+    exception: Optional[str]     # set if the parser itself failed on the file
+    seconds: float
+
+    def __init__(self, filename: str, passed: bool, error_counts: Dict[str, int], exception: Optional[str], seconds: float) :
+        self.filename = filename
+        self.passed = passed
+        self.error_counts = error_counts
+        self.exception = exception
+        self.seconds = seconds
+
+    def __str__(self) -> str :
+        if self.passed :
+            return f"PASS {self.filename}"
+        if self.exception is not None :
+            return f"FAIL {self.filename} (parser error: {self.exception})"
+        counts = ", ".join([f"{n} {cat}" for cat, n in sorted(self.error_counts.items())])
+        return f"FAIL {self.filename} ({counts})"
+
+def find_mfd_files(root: str) -> List[str] :
+    """Returns every .mfd file (any case) under root, sorted."""
+    out: List[str] = []
+    for dirpath, _, filenames in os.walk(root) :
+        for fn in filenames :
+            if os.path.splitext(fn)[1].lower() == ".mfd" :
+                out.append(os.path.join(dirpath, fn))
+    out.sort()
+    return out
+
+def validate_file(filename: str, cache_dir: Optional[str] = None, **options: Any) -> FileOutcome :
+    """Validates one file, turning any exception the parser raises into a failed outcome.
+    If cache_dir is given, results are read from and written to a ResultCache there.
+    options are passed on to the MFD, e.g. mode or duplicate_policy.
+
+    What the parser prints while validating is discarded."""
+    from MEDFORD.medford import validate
+
+    start = time.perf_counter()
+    try :
+        cache = _get_cache(cache_dir) if cache_dir is not None else None
+        with open(os.devnull, 'w', encoding="utf-8") as devnull, redirect_stdout(devnull) :
+            res = validate(filename, cache=cache, **options)
+    except Exception as e : # pylint: disable=broad-exception-caught
+        return FileOutcome(filename, False, {}, f"{type(e).__name__}: {e}", time.perf_counter() - start)
+    counts = {cat: len(errs) for cat, errs in res.errors.items()}
+    return FileOutcome(filename, res.is_valid, counts, None, time.perf_counter() - start)
+
+_caches: Dict[str, 'ResultCache'] = {}
+
+def _get_cache(cache_dir: str) -> 'ResultCache' :
+    # one ResultCache per directory and process, so its size is not re-summed for every file
+    from MEDFORD.cache import ResultCache
+    if cache_dir not in _caches :
+        _caches[cache_dir] = ResultCache(cache_dir)
+    return _caches[cache_dir]
+
+def _init_worker() -> None :
+    # the parser prints debugging output as it goes, including on import
+    sys.stdout = open(os.devnull, 'w', encoding="utf-8")
+    # import the parser and the pydantic models once per worker, not once per file
+    import MEDFORD.medford # pylint: disable=unused-import,import-outside-toplevel
+
+def validate_files(filenames: List[str], workers: int = 1, cache_dir: Optional[str] = None, **options: Any) -> Iterator[FileOutcome] :
+    """Validates files on a pool of worker processes, yielding each outcome as it completes.
+
+    With workers=1 the files are validated in this process, in order; workers=0
+    uses one worker per CPU. options are passed on to validate_file."""
+    if workers == 1 :
+        for fn in filenames :
+            yield validate_file(fn, cache_dir, **options)
+        return
+
+    n_workers = workers if workers > 0 else (os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker) as executor :
+        futures = [executor.submit(validate_file, fn, cache_dir, **options) for fn in filenames]
+        for fut in as_completed(futures) :
+            yield fut.result()
+
+def run_batch(root: str, workers: int = 1, out: TextIO = sys.stdout, cache_dir: Optional[str] = None, **options: Any) -> int :
+    """Validates every MEDFORD file under root, writing a PASS/FAIL line per file
+    as soon as it is done and a summary at the end. options are passed on to
+    validate_file. Returns the exit status: 0 if every file passed, 1 otherwise."""
+    filenames = find_mfd_files(root)
+    start = time.perf_counter()
+    n_failed = 0
+    for outcome in validate_files(filenames, workers, cache_dir, **options) :
+        if not outcome.passed :
+            n_failed += 1
+        print(outcome, file=out, flush=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"{len(filenames)} files: {len(filenames) - n_failed} passed, {n_failed} failed ({elapsed:.1f}s)", file=out, flush=True)
+    return 0 if n_failed == 0 else 1
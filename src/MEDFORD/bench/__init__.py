@@ -0,0 +1 @@
+"""Benchmarks of the MEDFORD parser on synthetic corpora, see `medford-bench`."""
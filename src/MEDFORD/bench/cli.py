@@ -0,0 +1,140 @@
+"""Command line tool for the MEDFORD benchmarks, `medford-bench`."""
+
+import argparse
+import json
+import os
+import sys
+from typing import List, Optional
+
+from MEDFORD.bench.compare import compare_results, format_comparisons
+from MEDFORD.bench.corpus import CorpusSpec, WORKLOADS, write_corpus
+
+# shipped with the package, so compare finds it from any directory. Regenerate it with
+#   `medford-bench run -o src/MEDFORD/bench/baseline.json` whenever a change is meant
+#   to move the speed or memory of a stage.
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+ap = argparse.ArgumentParser(prog="medford-bench")
+subparsers = ap.add_subparsers(dest="command", required=True)
+
+run_ap = subparsers.add_parser("run", help="Benchmark each stage of the parser on the standard workloads.")
+run_ap.add_argument("-w", "--workload", action="append", choices=list(WORKLOADS.keys()),
+                    help="Workload to run (can be repeated). Defaults to all of them.")
+run_ap.add_argument("--repeat", type=int, default=5,
+                    help="Number of timed runs of each stage; the best is reported.")
+run_ap.add_argument("-o", "--output", type=str,
+                    help="Write the results as JSON to this file.")
+
+cmp_ap = subparsers.add_parser("compare", help="Run the workloads and compare them against a baseline; exits with status 1 on a regression.")
+cmp_ap.add_argument("--baseline", type=str, default=DEFAULT_BASELINE,
+                    help="Results to compare against, as written by run -o.")
+cmp_ap.add_argument("-w", "--workload", action="append", choices=list(WORKLOADS.keys()),
+                    help="Workload to compare (can be repeated). Defaults to every workload in the baseline.")
+cmp_ap.add_argument("--current", type=str,
+                    help="Compare these results instead of running the workloads.")
+cmp_ap.add_argument("--speed-threshold", type=float, default=0.25,
+                    help="Largest allowed drop in lines/sec of a stage, as a fraction of the baseline.")
+cmp_ap.add_argument("--memory-threshold", type=float, default=0.10,
+                    help="Largest allowed growth in peak memory of a stage, as a fraction of the baseline.")
+cmp_ap.add_argument("--repeat", type=int, default=5,
+                    help="Number of timed runs of each stage; the best is reported.")
+cmp_ap.add_argument("-o", "--output", type=str,
+                    help="Write the current results as JSON to this file (e.g. to update the baseline).")
+
+lines_ap = subparsers.add_parser("lines", help="Time the line scanner on worst-case lines of growing length.")
+lines_ap.add_argument("--length", type=int, action="append",
+                      help="Line length to run (can be repeated). Defaults to 1000, 10000 and 100000.")
+lines_ap.add_argument("--repeat", type=int, default=5,
+                      help="Number of timed runs of each line; the best is reported.")
+lines_ap.add_argument("-o", "--output", type=str,
+                      help="Write the results as JSON to this file.")
+
+collect_ap = subparsers.add_parser("collect", help="Time the LineCollector alone on large synthetic files.")
+collect_ap.add_argument("--lines", type=int, action="append",
+                        help="Approximate number of lines of the file (can be repeated). Defaults to 1000000.")
+collect_ap.add_argument("--repeat", type=int, default=3,
+                        help="Number of timed runs at each size; the best is reported.")
+collect_ap.add_argument("-o", "--output", type=str,
+                        help="Write the results as JSON to this file.")
+
+gen_ap = subparsers.add_parser("generate", help="Write a synthetic MEDFORD file.")
+gen_ap.add_argument("output", type=str,
+                    help="File to write.")
+gen_ap.add_argument("-w", "--workload", choices=list(WORKLOADS.keys()),
+                    help="Use the shape of a standard workload; other options are ignored.")
+gen_ap.add_argument("--blocks", type=int, default=100)
+gen_ap.add_argument("--details", type=int, default=4,
+                    help="Details per block, including the name.")
+gen_ap.add_argument("--continuation", type=int, default=0,
+                    help="Continuation lines after each detail.")
+gen_ap.add_argument("--macros", type=int, default=0,
+                    help="Number of macros defined.")
+gen_ap.add_argument("--macro-chain", type=int, default=1,
+                    help="Length of the chains of macros using the previous macro.")
+gen_ap.add_argument("--macro-ratio", type=float, default=0.0,
+                    help="Fraction of details using a macro.")
+gen_ap.add_argument("--latex-ratio", type=float, default=0.0,
+                    help="Fraction of details with a LaTeX span.")
+gen_ap.add_argument("--comment-ratio", type=float, default=0.0,
+                    help="Fraction of details with an inline comment.")
+gen_ap.add_argument("--seed", type=int, default=0)
+
+def main(argv: Optional[List[str]] = None) -> int :
+    args = ap.parse_args(argv)
+
+    if args.command == "generate" :
+        if args.workload is not None :
+            spec = WORKLOADS[args.workload]
+        else :
+            spec = CorpusSpec(args.blocks, args.details, args.continuation, args.macros, args.macro_chain,
+                              args.macro_ratio, args.latex_ratio, args.comment_ratio, args.seed)
+        n = write_corpus(spec, args.output)
+        print(f"Wrote {n} lines to {args.output}")
+        return 0
+
+    # imported here so that generating a file does not need pydantic
+    from MEDFORD.bench.runner import bench_collect, bench_lines, format_collect_results, format_line_results, format_results, run_workloads
+
+    if args.command == "collect" :
+        collect_results = bench_collect(args.lines or [1000000], args.repeat)
+        print(format_collect_results(collect_results))
+        if args.output is not None :
+            with open(args.output, 'w', encoding="utf-8") as f :
+                json.dump(collect_results, f, indent=2)
+        return 0
+
+    if args.command == "lines" :
+        line_results = bench_lines(args.length or [1000, 10000, 100000], args.repeat)
+        print(format_line_results(line_results))
+        if args.output is not None :
+            with open(args.output, 'w', encoding="utf-8") as f :
+                json.dump(line_results, f, indent=2)
+        return 0
+
+    if args.command == "compare" :
+        with open(args.baseline, 'r', encoding="utf-8") as f :
+            baseline = json.load(f)
+        if args.current is not None :
+            with open(args.current, 'r', encoding="utf-8") as f :
+                results = json.load(f)
+        else :
+            results = run_workloads(args.workload or list(baseline["workloads"].keys()), args.repeat)
+    else :
+        results = run_workloads(args.workload, args.repeat)
+        print(format_results(results))
+
+    if args.output is not None :
+        with open(args.output, 'w', encoding="utf-8") as f :
+            json.dump(results, f, indent=2)
+
+    if args.command == "compare" :
+        comparisons = compare_results(baseline, results, args.speed_threshold, args.memory_threshold)
+        print(format_comparisons(comparisons))
+        regressed = [c for c in comparisons if c.regressed]
+        if len(regressed) > 0 :
+            print(f"{len(regressed)} regressions past the threshold.")
+            return 1
+    return 0
+
+if __name__ == "__main__" :
+    sys.exit(main())
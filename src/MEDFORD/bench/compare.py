@@ -0,0 +1,57 @@
+"""Comparison of benchmark results against a stored baseline, see `medford-bench compare`."""
+
+from typing import Any, Dict, List
+
+class Comparison() :
+    """Change of one metric of one stage of a workload, between the baseline and
+    the current results. change is relative: +0.1 means 10% more than the baseline."""
+    workload: str
+    stage: str
+    metric: str
+    baseline: float
+    current: float
+    change: float
+    regressed: bool
+
+    def __init__(self, workload: str, stage: str, metric: str, baseline: float, current: float, threshold: float) :
+        self.workload = workload
+        self.stage = stage
+        self.metric = metric
+        self.baseline = baseline
+        self.current = current
+        self.change = (current - baseline) / baseline if baseline > 0 else 0.0
+        if metric in LOWER_IS_WORSE :
+            self.regressed = self.change < -threshold
+        else :
+            self.regressed = self.change > threshold
+
+    def __str__(self) -> str :
+        status = "REGRESSED" if self.regressed else "ok"
+        return f"{self.workload:<16}{self.stage:<12}{self.metric:<15}{self.baseline:>14.0f}{self.current:>14.0f}{self.change:>+9.1%}  {status}"
+
+# metrics compared, and whether a drop (rather than a rise) is a regression
+LOWER_IS_WORSE = {"lines_per_sec"}
+METRICS: List[str] = ["lines_per_sec", "peak_bytes"]
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any],
+                    speed_threshold: float = 0.25, memory_threshold: float = 0.10) -> List[Comparison] :
+    """Compares every stage of every workload present in both results (as written
+    by medford-bench run). A stage regresses if its lines/sec drops by more than
+    speed_threshold, or its peak memory grows by more than memory_threshold."""
+    out: List[Comparison] = []
+    thresholds = {"lines_per_sec": speed_threshold, "peak_bytes": memory_threshold}
+    for wname, w in current["workloads"].items() :
+        if wname not in baseline["workloads"] :
+            continue
+        base_stages = baseline["workloads"][wname]["stages"]
+        for sname, s in w["stages"].items() :
+            if sname not in base_stages :
+                continue
+            for metric in METRICS :
+                out.append(Comparison(wname, sname, metric, base_stages[sname][metric], s[metric], thresholds[metric]))
+    return out
+
+def format_comparisons(comparisons: List[Comparison]) -> str :
+    rows = [f"{'workload':<16}{'stage':<12}{'metric':<15}{'baseline':>14}{'current':>14}{'change':>9}"]
+    rows.extend([str(c) for c in comparisons])
+    return "\n".join(rows)
@@ -0,0 +1,148 @@
+"""Generator of synthetic MEDFORD files for benchmarking.
+
+The files are valid MEDFORD (they pass every stage of the parser) and are
+deterministic for a given CorpusSpec, so timings can be compared between
+commits. The shape of the file (number of blocks, continuation lines, macro
+use, LaTeX and inline comments) is set by the CorpusSpec."""
+
+import random
+from typing import Callable, Dict, List
+
+class CorpusSpec() :
+    """Shape of a synthetic MEDFORD file, see generate.
+
+    Ratios are the probability that a given Detail contains a macro use,
+    a LaTeX span or an inline comment. Macros are defined in chains of
+    macro_chain macros, each using the previous one, so resolving the last
+    macro of a chain resolves macro_chain macros."""
+    n_blocks: int
+    details_per_block: int
+    continuation_depth: int # continuation lines after each Detail
+    n_macros: int
+    macro_chain: int
+    macro_ratio: float
+    latex_ratio: float
+    comment_ratio: float
+    seed: int
+
+    def __init__(self, n_blocks: int = 100, details_per_block: int = 4, continuation_depth: int = 0,
+                 n_macros: int = 0, macro_chain: int = 1, macro_ratio: float = 0.0,
+                 latex_ratio: float = 0.0, comment_ratio: float = 0.0, seed: int = 0) :
+        if macro_chain < 1 :
+            raise ValueError("macro_chain must be at least 1.")
+        self.n_blocks = n_blocks
+        self.details_per_block = details_per_block
+        self.continuation_depth = continuation_depth
+        self.n_macros = n_macros
+        self.macro_chain = macro_chain
+        self.macro_ratio = macro_ratio
+        self.latex_ratio = latex_ratio
+        self.comment_ratio = comment_ratio
+        self.seed = seed
+
+    def to_dict(self) -> Dict[str, float] :
+        return dict(vars(self))
+
+# Standard workloads, used by `medford-bench run` unless others are named.
+WORKLOADS: Dict[str, CorpusSpec] = {
+    "plain": CorpusSpec(n_blocks=2000),
+    "continuation": CorpusSpec(n_blocks=1000, continuation_depth=4),
+    "macros": CorpusSpec(n_blocks=2000, n_macros=200, macro_chain=5, macro_ratio=0.5),
+    "latex_comments": CorpusSpec(n_blocks=2000, latex_ratio=0.5, comment_ratio=0.5),
+    "mixed": CorpusSpec(n_blocks=2000, continuation_depth=1, n_macros=100, macro_chain=3,
+                        macro_ratio=0.2, latex_ratio=0.2, comment_ratio=0.2),
+}
+
+# Major token and the minor tokens its Details cycle through.
+_majors: List[List[str]] = [
+    ["Contributor", "Association", "Role", "Email", "ORCID"],
+    ["Paper", "Link", "Note"],
+    ["Data", "URI", "Type", "Note"],
+    ["Method", "Type", "Note"],
+    ["Project", "Note"],
+]
+
+_words: List[str] = ("coral genome sequencing sample reef assembly read depth temperature "
+                     "site cruise station annotation protein expression library").split()
+
+def _text(rng: random.Random, n_words: int) -> str :
+    return " ".join([rng.choice(_words) for _ in range(n_words)])
+
+def _macro_name(i: int) -> str :
+    return f"M{i}"
+
+def _content(spec: CorpusSpec, rng: random.Random) -> str :
+    parts = [_text(rng, rng.randint(2, 8))]
+    if spec.n_macros > 0 and rng.random() < spec.macro_ratio :
+        parts.append("`@{" + _macro_name(rng.randrange(spec.n_macros)) + "}")
+        parts.append(_text(rng, 2))
+    if rng.random() < spec.latex_ratio :
+        parts.append("$$x_{" + str(rng.randrange(100)) + "}^2 + \\alpha$$")
+    if rng.random() < spec.comment_ratio :
+        parts.append("# " + _text(rng, 3))
+    return " ".join(parts)
+
+def generate(spec: CorpusSpec) -> str :
+    """Returns the text of a synthetic MEDFORD file with the given shape."""
+    rng = random.Random(spec.seed)
+    out: List[str] = []
+
+    for i in range(spec.n_macros) :
+        body = _text(rng, 3)
+        if i % spec.macro_chain != 0 :
+            body = body + " `@{" + _macro_name(i - 1) + "}"
+        out.append(f"`@{_macro_name(i)} {body}")
+
+    out.append("@MEDFORD Synthetic benchmark corpus")
+    out.append("@MEDFORD-Version 2.0")
+    out.append("")
+
+    for b in range(spec.n_blocks) :
+        major, *minors = _majors[b % len(_majors)]
+        # names must be unique within a major, or later Blocks replace earlier ones
+        out.append(f"@{major} {major} {b} {_text(rng, 2)}")
+        for d in range(spec.details_per_block - 1) :
+            out.append(f"@{major}-{minors[d % len(minors)]} {_content(spec, rng)}")
+            for _ in range(spec.continuation_depth) :
+                out.append(_text(rng, rng.randint(3, 10)))
+        out.append("")
+
+    return "\n".join(out) + "\n"
+
+def write_corpus(spec: CorpusSpec, filename: str) -> int :
+    """Writes a synthetic MEDFORD file to filename, returning its number of lines."""
+    text = generate(spec)
+    with open(filename, 'w', encoding="utf-8") as f :
+        f.write(text)
+    return text.count("\n")
+
+# Worst-case lines for the line scanner, each a function of the (approximate)
+#   length of the line. Used to check that the time per line stays linear in its
+#   length, see `medford-bench lines`.
+ADVERSARIAL_LINES: Dict[str, Callable[[int], str]] = {
+    "tex_spans": lambda n: "@Major-minor " + "$$x$$ " * (n // 6) + "# comment",
+    "unclosed_tex": lambda n: "@Major-minor " + "$$" + "x" * n,
+    "unclosed_tex_repeated": lambda n: "@Major-minor " + "$$xxxxxx$ " * (n // 10),
+    "dollar_run": lambda n: "@Major-minor " + "$" * n,
+    "hash_run": lambda n: "@Major-minor " + "# " * (n // 2),
+    "comments_in_tex": lambda n: "@Major-minor $$" + "# " * (n // 2) + "$$ # comment",
+    "macro_spans": lambda n: "@Major-minor " + "`@M " * (n // 4),
+    "macros_between_tex": lambda n: "@Major-minor " + "$$x$$ `@{M} " * (n // 12),
+    "unclosed_macro_brace": lambda n: "@Major-minor " + "`@{" + "a" * n,
+    "unterminated_macro_name": lambda n: "@Major-minor " + "`@" + "a" * n + "$",
+    "macro_headers": lambda n: "@Major-minor " + "`@" * (n // 2),
+    "parens_in_tex": lambda n: "@Major-minor " + "$$x(" * (n // 4),
+    "continuation": lambda n: "x" * n,
+}
+
+def fuzz_line(rng: random.Random, length: int) -> str :
+    """Returns a random line of about length characters, made of the pieces
+    of MEDFORD syntax that the line scanner looks for."""
+    pieces = ["$$", "$", "#", "# ", "`@", "`@{", "}", "{", "(", ")", "a", "M1", "_", " ", "\t"]
+    out: List[str] = [rng.choice(["", "`@Mac ", "@Major ", "@Major-minor "])]
+    size = len(out[0])
+    while size < length :
+        piece = rng.choice(pieces)
+        out.append(piece)
+        size += len(piece)
+    return "".join(out)
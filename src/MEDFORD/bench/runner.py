@@ -0,0 +1,193 @@
+"""Benchmarks of each stage of the MEDFORD parser, and of the whole pipeline.
+
+Each stage is timed on its own, with its input prepared beforehand and fresh
+objects for every repeat (Details cache their content, so re-running a stage on
+the same objects would measure the cache). Peak memory is measured in a
+separate, untimed run with tracemalloc, since tracing slows everything down."""
+
+import contextlib
+import gc
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from MEDFORD.bench.corpus import ADVERSARIAL_LINES, WORKLOADS, CorpusSpec, generate, write_corpus
+from MEDFORD.objs.linereader import LineReader
+from MEDFORD.objs.linecollector import LineCollector
+from MEDFORD.objs.dictionizer import Dictionizer
+from MEDFORD.models.generics import Entity
+from MEDFORD.medford import MFD
+
+import MEDFORD.mfdglobals as mfdglobals
+
+STAGES: List[str] = ["read", "collect", "dictionize", "entity", "end_to_end"]
+
+@contextlib.contextmanager
+def _quiet() -> Iterator[None] :
+    # the parser prints as it goes, and reports errors to the current validator;
+    #   keep both out of the way of the benchmark.
+    with open(os.devnull, 'w', encoding="utf-8") as devnull :
+        with contextlib.redirect_stdout(devnull), mfdglobals.mv.context(mfdglobals.mv.new()) :
+            yield
+
+def _measure(setup: Callable[[], Any], stage: Callable[[Any], Any], repeat: int) -> Tuple[List[float], int] :
+    """Runs stage(setup()) repeat times, returning the wall time of each run and
+    the peak memory (in bytes) allocated by one more, traced, run."""
+    times: List[float] = []
+    for _ in range(repeat) :
+        arg = setup()
+        gc.collect()
+        start = time.perf_counter()
+        stage(arg)
+        times.append(time.perf_counter() - start)
+
+    arg = setup()
+    gc.collect()
+    tracemalloc.start()
+    try :
+        stage(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally :
+        tracemalloc.stop()
+    return times, peak
+
+def _collect(lines: List[Any]) -> Tuple[LineCollector, Dict[str, Any], List[Any], Dict[str, Any]] :
+    lc = LineCollector(lines)
+    return lc, lc.get_macros(), lc.get_flat_blocks(), lc.get_1lvl_blocks()
+
+def _dictionize(collected: Tuple[LineCollector, Dict[str, Any], List[Any], Dict[str, Any]]) -> Dict[str, Any] :
+    _, macros, blocks, named = collected
+    return Dictionizer(macros, named).generate_dict(blocks)
+
+def bench_file(filename: str, repeat: int = 5) -> Dict[str, Any] :
+    """Benchmarks every stage on the MEDFORD file at filename.
+
+    Returns the number of lines and bytes of the file, and for each stage in
+    STAGES the best and median wall time in seconds, lines per second (from the
+    best time) and peak memory in bytes."""
+    with open(filename, 'r', encoding="utf-8") as f :
+        text_lines = f.readlines()
+    n_lines = len(text_lines)
+
+    def read_lines() -> List[Any] :
+        return list(LineReader.iter_lines(text_lines))
+
+    def collected() -> Tuple[LineCollector, Dict[str, Any], List[Any], Dict[str, Any]] :
+        return _collect(read_lines())
+
+    def dictionized() -> Dict[str, Any] :
+        return _dictionize(collected())
+
+    stages: Dict[str, Tuple[Callable[[], Any], Callable[[Any], Any]]] = {
+        "read": (lambda: text_lines, lambda ls: list(LineReader.iter_lines(ls))),
+        "collect": (read_lines, _collect),
+        "dictionize": (collected, _dictionize),
+        "entity": (dictionized, lambda d: Entity(**d)),
+        "end_to_end": (lambda: filename, lambda fn: MFD(fn, validator=mfdglobals.mv.new()).run()),
+    }
+
+    out: Dict[str, Any] = {"lines": n_lines, "bytes": os.path.getsize(filename), "stages": {}}
+    with _quiet() :
+        for name in STAGES :
+            setup, stage = stages[name]
+            times, peak = _measure(setup, stage, repeat)
+            best = min(times)
+            out["stages"][name] = {
+                "seconds": best,
+                "median": statistics.median(times),
+                "lines_per_sec": n_lines / best if best > 0 else float("inf"),
+                "peak_bytes": peak,
+            }
+    return out
+
+def run_workloads(names: Optional[List[str]] = None, repeat: int = 5) -> Dict[str, Any] :
+    """Generates each named workload (all of WORKLOADS by default) and benchmarks it.
+
+    Returns a JSON-serializable dict of the results, alongside the versions of
+    the parser and Python they were measured with."""
+    if names is None :
+        names = list(WORKLOADS.keys())
+
+    results: Dict[str, Any] = {
+        "medford_version": mfdglobals.version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "repeat": repeat,
+        "workloads": {},
+    }
+    with tempfile.TemporaryDirectory() as tmpdir :
+        for name in names :
+            spec = WORKLOADS[name]
+            filename = os.path.join(tmpdir, name + ".mfd")
+            write_corpus(spec, filename)
+            res = bench_file(filename, repeat)
+            res["spec"] = spec.to_dict()
+            results["workloads"][name] = res
+    return results
+
+def bench_lines(lengths: List[int], repeat: int = 5) -> Dict[str, Any] :
+    """Times LineReader.process_line on every line of ADVERSARIAL_LINES at each length.
+
+    Returns, per line, the best time in seconds at each length and the time per
+    character, which should stay about the same as lines grow."""
+    out: Dict[str, Any] = {}
+    with _quiet() :
+        for name, make_line in ADVERSARIAL_LINES.items() :
+            rows = []
+            for length in lengths :
+                line = make_line(length)
+                times, _ = _measure(lambda: line, lambda l: LineReader.process_line(l, 0), repeat)
+                best = min(times)
+                rows.append({"length": len(line), "seconds": best, "ns_per_char": best * 1e9 / len(line)})
+            out[name] = rows
+    return out
+
+def bench_collect(sizes: List[int], repeat: int = 3) -> List[Dict[str, Any]] :
+    """Times the LineCollector alone on synthetic files of about each number of lines.
+
+    The lines are read once per size, and only collected repeat times; memory
+    is not traced, as tracing millions of Lines would take far longer than
+    collecting them. Returns, per size, the number of lines, the best time in
+    seconds and lines per second."""
+    out: List[Dict[str, Any]] = []
+    with _quiet() :
+        for n in sizes :
+            # a name and 3 details with a continuation line each, then a blank line (not a Line): 8 lines per block
+            spec = CorpusSpec(n_blocks=max(1, n // 8), continuation_depth=1, n_macros=100, macro_ratio=0.2)
+            lines = list(LineReader.iter_lines(generate(spec).splitlines(True)))
+            times: List[float] = []
+            for _ in range(repeat) :
+                gc.collect()
+                start = time.perf_counter()
+                LineCollector(lines)
+                times.append(time.perf_counter() - start)
+            best = min(times)
+            out.append({"lines": len(lines), "seconds": best, "lines_per_sec": len(lines) / best if best > 0 else float("inf")})
+            del lines
+    return out
+
+def format_collect_results(results: List[Dict[str, Any]]) -> str :
+    rows = [f"{'lines':>10}{'seconds':>12}{'lines/s':>12}"]
+    for r in results :
+        rows.append(f"{r['lines']:>10}{r['seconds']:>12.4f}{r['lines_per_sec']:>12.0f}")
+    return "\n".join(rows)
+
+def format_line_results(results: Dict[str, Any]) -> str :
+    rows = [f"{'line':<24}{'length':>10}{'seconds':>12}{'ns/char':>10}"]
+    for name, lrows in results.items() :
+        for r in lrows :
+            rows.append(f"{name:<24}{r['length']:>10}{r['seconds']:>12.6f}{r['ns_per_char']:>10.1f}")
+    return "\n".join(rows)
+
+def format_results(results: Dict[str, Any]) -> str :
+    """Returns the results as a table, one row per workload and stage."""
+    rows = [f"{'workload':<16}{'stage':<12}{'seconds':>10}{'lines/s':>12}{'peak KiB':>11}"]
+    for wname, w in results["workloads"].items() :
+        for sname, s in w["stages"].items() :
+            rows.append(f"{wname:<16}{sname:<12}{s['seconds']:>10.4f}{s['lines_per_sec']:>12.0f}{s['peak_bytes'] / 1024:>11.0f}")
+    return "\n".join(rows)
@@ -0,0 +1,122 @@
+"""Module containing the on-disk cache of validation results.
+
+Results are keyed by the SHA-256 of the file's bytes, the parser version and
+the output mode, so a file that has not changed since it was last validated
+skips the whole pipeline. Entries are evicted least recently used first once
+the cache directory grows past its size bound."""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import List, Optional, Tuple
+
+import MEDFORD.mfdglobals as mfdglobals
+
+def default_cache_dir() -> str :
+    """Returns the cache directory used by the command line tool, $XDG_CACHE_HOME/medford
+    (or ~/.cache/medford)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "medford")
+
+class ResultCache() :
+    """Directory of pickled results, one file per key; MFD stores the plain
+    records of its ValidationResults (see ValidationResult._to_record).
+
+    The modification time of an entry is its last use: get touches it, and
+    eviction removes the oldest entries first. The cache is safe to share between
+    processes (e.g. the workers of a batch run); entries are written atomically,
+    and the size bound is kept approximately."""
+    directory: str
+    max_bytes: int
+
+    _total_bytes: int # estimate of the size of the directory
+
+    DEFAULT_MAX_BYTES: int = 512 * 1024 * 1024
+    SUFFIX: str = ".pickle"
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES) :
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum([size for (_, size, _) in self._entries()])
+
+    @staticmethod
+    def key(data: bytes, mode: str, options: str = "") -> str :
+        """Returns the key for a file's bytes, as validated in the given output mode.
+        options covers any other setting that changes the result."""
+        h = hashlib.sha256()
+        h.update(data)
+        for part in (mfdglobals.version, mode, options) :
+            h.update(b"\0")
+            h.update(part.encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[object] :
+        """Returns the result stored under key, or None."""
+        path = self._path(key)
+        try :
+            with open(path, 'rb') as f :
+                result = pickle.load(f)
+        except FileNotFoundError :
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) :
+            # written by an incompatible version of the parser, or truncated
+            self._remove(path)
+            return None
+
+        try :
+            os.utime(path)
+        except FileNotFoundError :
+            pass
+        return result
+
+    def put(self, key: str, result: object) -> None :
+        """Stores result under key, evicting old entries if the cache is over its size bound."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try :
+            with os.fdopen(fd, 'wb') as f :
+                pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException :
+            self._remove(tmp_path)
+            raise
+
+        self._total_bytes += os.path.getsize(self._path(key))
+        if self._total_bytes > self.max_bytes :
+            self.evict()
+
+    def evict(self) -> None :
+        """Removes the least recently used entries until the cache is under 90% of
+        its size bound, so that eviction does not run on every put."""
+        entries = self._entries()
+        total = sum([size for (_, size, _) in entries])
+        entries.sort(key=lambda e: e[2])
+        target = self.max_bytes * 9 // 10
+        for (path, size, _) in entries :
+            if total <= target :
+                break
+            self._remove(path)
+            total -= size
+        self._total_bytes = total
+
+    def _entries(self) -> List[Tuple[str, int, float]] :
+        out: List[Tuple[str, int, float]] = []
+        for entry in os.scandir(self.directory) :
+            if entry.name.endswith(ResultCache.SUFFIX) :
+                try :
+                    st = entry.stat()
+                except FileNotFoundError :
+                    continue
+                out.append((entry.path, st.st_size, st.st_mtime))
+        return out
+
+    def _path(self, key: str) -> str :
+        return os.path.join(self.directory, key + ResultCache.SUFFIX)
+
+    @staticmethod
+    def _remove(path: str) -> None :
+        try :
+            os.remove(path)
+        except FileNotFoundError :
+            pass
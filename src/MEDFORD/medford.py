@@ -1,7 +1,10 @@
 """Module containing the MEDFORD parser, which can validate and compile MEDFORD metadata files."""
 
 import sys
-from typing import List, Dict
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, List, Dict, Optional, Union
 
 import argparse
 import json
@@ -10,9 +13,15 @@ from enum import Enum
 from pathlib import PurePath #?
 
 from MEDFORD.objs.linereader import LineReader, Line
-from MEDFORD.objs.linecollector import LineCollector, Macro, Block
+from MEDFORD.objs.linecollector import BlockIndex, DuplicatePolicy, LineCollector, Macro, Block
+from MEDFORD.objs.linecollections import Detail
 from MEDFORD.objs.dictionizer import Dictionizer
 from MEDFORD.models.generics import Entity
+from MEDFORD.submodules.mfdvalidator.errors import CachedError, ErrType, MFDErr
+from MEDFORD.submodules.mfdvalidator.notice import CachedWarning, DuplicateBlockWarning, MFDWarning, UnusedMacroWarning
+from MEDFORD.submodules.mfdvalidator.validator import MedfordValidator
+from MEDFORD.cache import ResultCache, default_cache_dir
+from pydantic import ValidationError
 
 import MEDFORD.mfdglobals as mfdglobals
 
@@ -52,6 +61,154 @@ class OutputMode(Enum):
         return None
 
 
+class StageProfile() :
+    """Measurements of one stage of the MEDFORD pipeline, see ValidationResult.profile.
+
+    wall_time and cpu_time are in seconds; counts holds the number of objects the
+    stage produced or worked through (e.g. lines, blocks, resolved macros), by name."""
+    name: str
+    wall_time: float
+    cpu_time: float
+    counts: Dict[str, int]
+
+    def __init__(self, name: str, wall_time: float = 0.0, cpu_time: float = 0.0) :
+        self.name = name
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.counts = {}
+
+    def to_dict(self) -> Dict[str, Any] :
+        return {"name": self.name, "wall_time": self.wall_time, "cpu_time": self.cpu_time, "counts": dict(self.counts)}
+
+class ValidationResult() :
+    """Outcome of running the MEDFORD parser on one file, see validate.
+
+    entity is the validated pydantic Entity, or None if the file did not get as
+    far as pydantic validation. In that case dict_data holds whatever the
+    Dictionizer produced (None if it did not run either). errors holds every
+    error found, grouped by category (the value of its ErrType, e.g. "syntax"),
+    and timings the wall time in seconds of each stage that ran. profile holds
+    more detailed measurements of the same stages, see format_profile. from_cache
+    is set if the result was taken from a ResultCache instead of running the stages
+    (see CachedResult)."""
+    filename: str
+    entity: Optional[Entity]
+    dict_data: Optional[Dict[str, Any]]
+    errors: Dict[str, List[MFDErr]]
+    warnings: List[MFDWarning]
+    timings: Dict[str, float]
+    profile: Dict[str, StageProfile]
+    from_cache: bool
+
+    def __init__(self, filename: str) :
+        self.filename = filename
+        self.entity = None
+        self.dict_data = None
+        self.errors = {}
+        self.warnings = []
+        self.timings = {}
+        self.profile = {}
+        self.from_cache = False
+
+    @property
+    def is_valid(self) -> bool :
+        return self.entity is not None and len(self.errors) == 0
+
+    def n_errors(self) -> int :
+        return sum([len(errs) for errs in self.errors.values()])
+
+    def has_syntax_err(self) -> bool :
+        return ErrType.SYNTAX.value in self.errors
+
+    def has_other_err(self) -> bool :
+        # same split as the MedfordValidator: neither syntax nor pydantic
+        return any([cat not in (ErrType.SYNTAX.value, ErrType.PYDANTIC.value) for cat in self.errors.keys()])
+
+    def get_errors(self, *categories: str) -> List[MFDErr] :
+        """Returns the errors in the given categories, in the order they were found."""
+        out: List[MFDErr] = []
+        for cat in categories :
+            out.extend(self.errors.get(cat, []))
+        return out
+
+    def get_other_errors(self) -> List[MFDErr] :
+        return [err for cat, errs in self.errors.items() if cat not in (ErrType.SYNTAX.value, ErrType.PYDANTIC.value) for err in errs]
+
+    def format_profile(self) -> str :
+        """Returns the profile as a table, one row per stage."""
+        rows = [f"{'stage':<12}{'wall (s)':>10}{'cpu (s)':>10}  counts"]
+        for st in self.profile.values() :
+            counts = " ".join([f"{k}={v}" for k, v in st.counts.items()])
+            rows.append(f"{st.name:<12}{st.wall_time:>10.4f}{st.cpu_time:>10.4f}  {counts}")
+        return "\n".join(rows)
+
+    @contextmanager
+    def _stage(self, name: str) -> Iterator[StageProfile] :
+        st = StageProfile(name)
+        self.profile[name] = st
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        try :
+            yield st
+        finally :
+            st.cpu_time = time.process_time() - cpu_start
+            st.wall_time = time.perf_counter() - start
+            self.timings[name] = st.wall_time
+
+    def _collect_errors(self, validator: MedfordValidator) -> None :
+        for err in validator.get_errors() :
+            self.errors.setdefault(err.errtype.value, []).append(err)
+
+    def _to_record(self) -> Dict[str, Any] :
+        """Returns what a ResultCache keeps of the result, see CachedResult. It holds
+        plain values only, so that none of the Lines, Details or Blocks are stored."""
+        errors = {}
+        for cat, errs in self.errors.items() :
+            errors[cat] = [(e.errname, e.msg, e.helpmsg, e.lineno_head, e.lineno_range) for e in map(CachedError.of, errs)]
+        return {"is_valid": self.is_valid,
+                "errors": errors,
+                "warnings": [(w.name, w.msg, w.help_msg, list(w.lines)) for w in self.warnings],
+                "dict_data": _plain_data(self.dict_data)}
+
+class CachedResult(ValidationResult) :
+    """A ValidationResult rebuilt from a ResultCache record, see ValidationResult._to_record.
+
+    It has no entity, and its errors and warnings are CachedErrors and
+    CachedWarnings: names, messages and line numbers only. dict_data holds plain
+    values, as written with --write_json: each (Detail, value) pair the Dictionizer
+    produced is reduced to its value, and the Blocks are left out."""
+    _is_valid: bool
+
+    def __init__(self, filename: str, record: Dict[str, Any]) :
+        super().__init__(filename)
+        self._is_valid = record["is_valid"]
+        for cat, errs in record["errors"].items() :
+            self.errors[cat] = [CachedError(name, ErrType(cat), msg, helpmsg, head, lines) for (name, msg, helpmsg, head, lines) in errs]
+        self.warnings = [CachedWarning(*w) for w in record["warnings"]]
+        self.dict_data = record["dict_data"]
+        self.from_cache = True
+
+    @property
+    def is_valid(self) -> bool :
+        return self._is_valid
+
+def _plain_data(data: Any) -> Any :
+    # the Dictionizer's output, without the objects of the file
+    if isinstance(data, dict) :
+        return {k: _plain_data(v) for k, v in data.items() if not isinstance(v, Block)}
+    if isinstance(data, list) :
+        return [_plain_data(v) for v in data]
+    if isinstance(data, tuple) and len(data) == 2 and isinstance(data[0], Detail) :
+        return _plain_data(data[1])
+    return data
+
+def validate(source: Union[str, PurePath], **kwargs) -> ValidationResult :
+    """Validates the MEDFORD file at path source and returns a ValidationResult.
+
+    Unlike the command line tool, never prints errors or exits; keyword arguments
+    are passed on to MFD (e.g. use_mmap, workers)."""
+    return MFD(source, **kwargs).run()
+
 class MFD() :
     """Base class runner of the MEDFORD parser. Runs the entire validation/compilation pipeline from file input to output."""
 
@@ -63,100 +220,233 @@ class MFD() :
     mfdglobals.init()
 
     filename: str
-    object_lines: List[Line]
     line_collector: LineCollector
     dictionizer: Dictionizer
 
     write_json: bool
     output_path: str
+    use_mmap: bool
+    workers: int
+    report_unused_macros: bool
+    duplicate_policy: DuplicatePolicy
+    max_line_length: Optional[int] # see LineReader.process_line
+    max_expanded_chars: Optional[int] # limits of the macro expansion budget, see MacroGraph
+    max_expansion_ratio: Optional[float]
+    validator: Optional[MedfordValidator]
+    mode: OutputMode
+    cache: Optional[ResultCache]
+    profile: bool # print the profile of the stages, see run_medford
 
     macro_definitions: Dict[str, Macro]
-    blocks: List[Block]
+    block_index: BlockIndex
+    blocks: List[Block] # views of block_index
     named_blocks: Dict[str, Block]
 
     dict_data = None
     pydantic_version = None
 
-    def __init__(self, filename, write_json:bool=False, output_path:str=".") :
+    def __init__(self, filename, write_json:bool=False, output_path:str=".", use_mmap:bool=False, workers:int=1, report_unused_macros:bool=False, validator:Optional[MedfordValidator]=None,
+                 mode:OutputMode=OutputMode.OTHER, cache:Optional[ResultCache]=None, profile:bool=False,
+                 duplicate_policy:DuplicatePolicy=DuplicatePolicy.WARN, max_expanded_chars:Optional[int]=Macro.MAX_EXPANDED_CHARS,
+                 max_expansion_ratio:Optional[float]=Macro.MAX_EXPANSION_RATIO, max_line_length:Optional[int]=LineReader.MAX_LINE_LENGTH) :
         self.filename = filename
         self.write_json = write_json
         self.output_path = output_path
+        self.use_mmap = use_mmap
+        self.workers = workers
+        self.report_unused_macros = report_unused_macros
+        self.duplicate_policy = duplicate_policy
+        self.max_expanded_chars = max_expanded_chars
+        self.max_expansion_ratio = max_expansion_ratio
+        self.max_line_length = max_line_length
+        self.validator = validator
+        self.mode = mode
+        self.cache = cache
+        self.profile = profile
 
     def run_medford(self):
-        """Main function that runs MEDFORD compilation from start to finish."""
-        self.em_inst = mfdglobals.validator # this is just for debug purposes
+        """Main function that runs MEDFORD compilation from start to finish, as the
+        command line tool: prints any errors, and exits with status 1 if there are
+        syntax errors or other (non-pydantic) errors. See run for the library version."""
+        result = self.run()
+
+        if self.profile :
+            print(result.format_profile())
+
+        for w in result.warnings :
+            print(f"Line {w.get_start_line()}: {w.msg}")
+
+        # printed from the result rather than self.validator, which is not set up
+        #   when the result comes from the cache
+        if result.has_syntax_err() :
+            syntax_errs = result.get_errors(ErrType.SYNTAX.value)
+            print(f"Syntax errors found! : {len(syntax_errs)} errors")
+            MFD._print_errs(syntax_errs)
+            sys.exit(1)
+            # TODO : enter error mode
+
+        if result.has_other_err() :
+            print(f"Other errors found! : {len(result.get_other_errors())} errors")
+            sys.exit(1)
+            # TODO : enter error mode
+
+        MFD._print_errs(result.get_errors(ErrType.PYDANTIC.value))
+
+    @staticmethod
+    def _print_errs(errs: List[MFDErr]) -> None :
+        for err in errs :
+            print(f"line {err.get_head_lineno()}: {err.msg}")
+
+    def run(self) -> 'ValidationResult' :
+        """Runs the MEDFORD pipeline on the file and returns the outcome, without
+        printing errors or exiting.
+
+        Stops after the LineCollector if there are syntax errors, and after the
+        Dictionizer if there are other errors, as the command line tool does.
+        Errors are collected in self.validator (a new MedfordValidator unless one
+        was given), not the process-wide one, so that several MFDs can run at
+        once in different threads or asyncio tasks.
+
+        If a cache is given and holds a result for the same file contents, parser
+        version and options, it is returned as a CachedResult without running any stage."""
+        key = None
+        if self.cache is not None :
+            start = time.perf_counter()
+            with open(self.filename, 'rb') as f :
+                key = ResultCache.key(f.read(), str(self.mode), f"unused_macros={self.report_unused_macros},max_line_length={self.max_line_length},duplicates={self.duplicate_policy.value},"
+                                      f"max_expanded_chars={self.max_expanded_chars},max_expansion_ratio={self.max_expansion_ratio}")
+            record = self.cache.get(key)
+            if isinstance(record, dict) :
+                cached = CachedResult(str(self.filename), record)
+                cached.timings = {"cache": time.perf_counter() - start}
+                cached.profile = {"cache": StageProfile("cache", cached.timings["cache"])}
+                self.dict_data = cached.dict_data
+                self._write_output(cached)
+                return cached
+
+        if self.validator is None :
+            self.validator = mfdglobals.mv.new()
+        result = ValidationResult(str(self.filename))
+        with mfdglobals.mv.context(self.validator) :
+            self._run_medford(result)
+        result._collect_errors(self.validator)
+
+        if self.cache is not None and key is not None :
+            self.cache.put(key, result._to_record())
+        self._write_output(result)
+        return result
+
+    def _write_output(self, result: 'ValidationResult') -> None :
+        # TODO: export to json, bag
+        # TODO: implement all of the old models
+        if result.has_syntax_err() or result.has_other_err() :
+            return
+
+        if self.write_json :
+            if self.output_path == "." :
+                with open("medford_output.json", 'w', encoding="utf-8") as f:
+                    json.dump(self.dict_data, f, indent=2)
+
+    def _run_medford(self, result: 'ValidationResult') -> None :
+        self.em_inst = mfdglobals.mv.instance() # this is just for debug purposes
         
-        # TODO: way to avoid putting all lines into memory?
         # TODO: make LineProcessor take all of the strs/filename and do the work itself?
-        # 1, 2
-        self.object_lines = MFD._get_line_objects(self.filename)
-
-        # 3
-        self.line_collector = MFD._get_line_collector(self.object_lines)
-        self.macro_definitions = self.line_collector.get_macros()
-        self.blocks = self.line_collector.get_flat_blocks()
-        self.named_blocks = self.line_collector.get_1lvl_blocks()
+        # 1, 2, 3
+        # Lines are read as they are collected, so only those the collected objects refer to are kept.
+        kinds: Counter = Counter()
+        with result._stage("collect") as st :
+            self.line_collector = LineCollector(duplicate_policy=self.duplicate_policy)
+            for line in MFD._iter_line_objects(self.filename, self.use_mmap, self.workers, self.max_line_length) :
+                kinds[type(line).__name__] += 1
+                self.line_collector.feed(line)
+            self.line_collector.close()
+            self.macro_definitions = self.line_collector.get_macros()
+            self.block_index = self.line_collector.block_index
+            self.blocks = self.line_collector.get_flat_blocks()
+            self.named_blocks = self.line_collector.get_1lvl_blocks()
+            mfdglobals.mv.instance().set_line_index(self.line_collector.get_line_index)
+        st.counts["lines"] = sum(kinds.values())
+        st.counts.update(kinds)
+        st.counts["macros"] = len(self.macro_definitions)
+        st.counts["blocks"] = len(self.blocks)
+        st.counts["details"] = sum([len(b.details) for b in self.blocks])
+        st.counts["comments"] = len(self.line_collector.comments)
+        st.counts["duplicates"] = len(self.block_index.duplicates)
+        if self.duplicate_policy == DuplicatePolicy.WARN :
+            for b in self.block_index.duplicates :
+                key = b.get_str_major() + '@' + b.name
+                first = self.block_index.get_first(key)
+                result.warnings.append(DuplicateBlockWarning(key, first.get_linenos()[0], b.get_linenos()))
 
         # stop here and check for syntax errors
         if mfdglobals.mv.instance().has_syntax_err() :
-            print(f"Syntax errors found! : {mfdglobals.mv.instance().n_syntax_errs()} errors")
-            mfdglobals.mv.instance().print_syntax_errs()
-            sys.exit(1)
-            # TODO : enter error mode
+            return
 
         # 4
-        self.dictionizer = MFD._get_dictionizer(self.macro_definitions, self.named_blocks)
-        self.dict_data = self.dictionizer.generate_dict(self.blocks)
+        with result._stage("dictionize") as st :
+            self.dictionizer = MFD._get_dictionizer(self.macro_definitions, self.named_blocks, self.max_expanded_chars, self.max_expansion_ratio)
+            self.dict_data = self.dictionizer.generate_dict(self.blocks)
+        st.counts["macro_uses"] = self.dictionizer.n_macro_uses
+        st.counts["macros_resolved"] = len(self.dictionizer.resolved_macros)
+        st.counts["expanded_chars"] = self.dictionizer.macro_graph.expanded_chars
+        result.dict_data = self.dict_data
+        if self.report_unused_macros :
+            for m in self.dictionizer.get_unused_macros(self.blocks) :
+                result.warnings.append(UnusedMacroWarning(m.name, m.get_linenos()))
 
         if mfdglobals.mv.instance().has_other_err() :
-            print(f"Other errors found! : {mfdglobals.mv.instance().n_other_errs()} errors")
-            sys.exit(1)
-            # TODO : enter error mode
+            return
 
         # 5
         # TODO : this kind of breaks all of my type checking and requires
         # me to use Dict[str, Any] instead of Dict[str, Dict[...]]...
         # maybe in the future look into fixing this?
         #   The problem is that Blocks aren't Dicts.
-        self.pydantic_version = Entity(**self.dict_data)
-        if mfdglobals.mv.instance().has_pydantic_err() :
-            mfdglobals.mv.instance().print_pydantic_errs()
-        
-        #try:
-        #    self.pydantic_version = Entity(**self.dict_data)
-        #    print(self.pydantic_version.dict())
-        #except ValidationError as e:
-        #    if(len(e.errors()) != mfdglobals.mv.instance().n_pydantic_errs()) :
-        #        print("ERROR: Validation errors are not all being accounted for by the validator.")
-        #        raise Exception("Missing validation errors")
-        #    else :
-        #        if mfdglobals.mv.instance().has_pydantic_err() :
-        #            mfdglobals.mv.instance().print_pydantic_errs()
+        with result._stage("pydantic") as st :
+            try :
+                self.pydantic_version = Entity(**self.dict_data)
+            except ValidationError as e :
+                st.counts["errors"] = e.error_count()
+                mfdglobals.mv.instance().handle_pydantic_errors(e, self.dict_data)
+        st.counts["blocks"] = sum([len(v) for v in self.dict_data.values() if isinstance(v, list)])
+        st.counts.setdefault("errors", 0)
+        result.entity = self.pydantic_version
+
+
+    def stream_blocks(self) -> Iterator[Block] :
+        """Streams the Blocks of the file, yielding each one as soon as it is complete.
+
+        Lines are read lazily from the file handle, so peak memory grows with the
+        largest Block rather than the whole file. Once exhausted, the macros defined
+        in the file are available from self.line_collector.get_macros().
+        Errors go to the validator current where the generator is consumed."""
+        self.line_collector = LineCollector()
+        yield from self.line_collector.iter_blocks(MFD._iter_line_objects(self.filename, self.use_mmap, self.workers, self.max_line_length))
 
-        # TODO: export to json, bag
-        # TODO: implement all of the old models
+    @classmethod
+    def _iter_line_objects(cls, filename: str, use_mmap: bool = False, workers: int = 1,
+                           max_line_length: Optional[int] = LineReader.MAX_LINE_LENGTH) -> Iterator[Line] :
+        # Lines come back from worker processes as plain strings, so the pool takes precedence over mmap.
+        if workers != 1 :
+            yield from LineReader.iter_parallel_lines(filename, workers if workers > 0 else None, max_line_length=max_line_length)
+            return
 
-        if self.write_json :
-            if self.output_path == "." :
-                with open("medford_output.json", 'w', encoding="utf-8") as f:
-                    json.dump(self.dict_data, f, indent=2)
+        if use_mmap :
+            yield from LineReader.iter_mmap_lines(filename, max_line_length=max_line_length)
+            return
 
-    @classmethod
-    def _get_line_objects(cls, filename: str) -> List[Line] :
-        object_lines = []
         with open(filename, 'r', encoding="utf-8") as f :
-            for idx,line in enumerate(f.readlines()) :
-                p_line = LineReader.process_line(line, idx)
-                if p_line is not None :
-                    object_lines.append(p_line)
+            yield from LineReader.iter_lines(f, max_line_length=max_line_length)
 
-        return object_lines
+    @classmethod
+    def _get_line_objects(cls, filename: str, use_mmap: bool = False, workers: int = 1,
+                          max_line_length: Optional[int] = LineReader.MAX_LINE_LENGTH) -> List[Line] :
+        return list(MFD._iter_line_objects(filename, use_mmap, workers, max_line_length))
     
     # for testing purposes in model unit tests
     @classmethod
     def _get_unvalidated_blocks(cls, input: str)-> List[Block] :
-        object_lines = MFD._get_line_objects(input)
-        line_collector = MFD._get_line_collector(object_lines)
+        line_collector = MFD._get_line_collector(MFD._iter_line_objects(input))
         #macro_definitions = line_collector.get_macros()
         blocks = line_collector.get_flat_blocks()
 
@@ -165,14 +455,16 @@ class MFD() :
 
     # note for later: what happens when it takes too long to process ?
     # user writes a new line, add it to LineCollector that single line at a time?
+    #   -> see MEDFORD.objs.document.MFDDocument, which re-parses only edited lines.
     # 10s of ms amount of time to run is allocation usually
     @classmethod
-    def _get_line_collector(cls, object_lines: List[Line]) -> LineCollector:
-        return LineCollector(object_lines)
+    def _get_line_collector(cls, object_lines: Iterable[Line], duplicate_policy: DuplicatePolicy = DuplicatePolicy.WARN) -> LineCollector:
+        return LineCollector(object_lines, duplicate_policy)
 
     @classmethod
-    def _get_dictionizer(cls, macro_definitions: Dict[str, Macro], name_dictionary: Dict[str, Block]) -> Dictionizer :
-        return Dictionizer(macro_definitions, name_dictionary)
+    def _get_dictionizer(cls, macro_definitions: Dict[str, Macro], name_dictionary: Dict[str, Block],
+                         max_expanded_chars: Optional[int] = Macro.MAX_EXPANDED_CHARS, max_expansion_ratio: Optional[float] = Macro.MAX_EXPANSION_RATIO) -> Dictionizer :
+        return Dictionizer(macro_definitions, name_dictionary, max_expanded_chars, max_expansion_ratio)
 
 
 ap = argparse.ArgumentParser(prog="MEDFORD parser")
@@ -180,7 +472,7 @@ ap = argparse.ArgumentParser(prog="MEDFORD parser")
 ap.add_argument("action", type=ParserMode, choices=list(ParserMode),
                 help="Whether to run the MEDFORD parser in Validation or Compilation mode. (Compilation creates a novel output file.)")
 ap.add_argument("file", type=str,
-                help="Input MEDFORD file to validate or compile.")
+                help="Input MEDFORD file to validate or compile (a directory, with --recursive).")
 ap.add_argument("-m", "--mode", type=OutputMode, choices=list(OutputMode), default=OutputMode.OTHER,
                 help="The output mode of the MEDFORD parser; what format should be validated against or compiled to.")
 
@@ -191,6 +483,29 @@ ap.add_argument("--dir", type=str,
 ap.add_argument("--permissible", action="store_true", default=False,
                 help="Enables permissible mode for the MEDFORD parser. This disables a significant number of the parser's validation features. (not implemented)")
 
+ap.add_argument("--mmap", action="store_true", default=False,
+                help="Memory-map the input file and keep only offsets into it for each line, instead of a copy of every line.")
+ap.add_argument("-j", "--workers", type=int, default=1,
+                help="Number of worker processes used to read large files in parallel chunks, or with --recursive, to validate files in parallel. 0 uses one per CPU.")
+ap.add_argument("-r", "--recursive", action="store_true", default=False,
+                help="Validate every .mfd file in the directory given as file and its subdirectories, printing a PASS/FAIL line per file and a summary.")
+ap.add_argument("--cache-dir", type=str, default=None,
+                help="Directory of the cache of validation results, which lets unchanged files skip re-validation. Defaults to $XDG_CACHE_HOME/medford.")
+ap.add_argument("--no-cache", action="store_true", default=False,
+                help="Do not read or write the cache of validation results.")
+ap.add_argument("--max-line-length", type=int, default=LineReader.MAX_LINE_LENGTH,
+                help="Longest line, in characters, that is read; longer lines are reported as errors and skipped. 0 for no limit.")
+ap.add_argument("--profile", action="store_true", default=False,
+                help="Print the wall time, CPU time and object counts of each stage of the parser.")
+ap.add_argument("--duplicates", type=DuplicatePolicy, choices=list(DuplicatePolicy), default=DuplicatePolicy.WARN,
+                help="What to do with a Block that has the same major token and name as an earlier one: report an error, warn and keep the later one, or merge their details.")
+ap.add_argument("--max-expanded-chars", type=int, default=Macro.MAX_EXPANDED_CHARS,
+                help="Most characters all macro expansions in a file may produce; Details and macros past it are reported as errors. 0 for no limit.")
+ap.add_argument("--max-expansion-ratio", type=float, default=Macro.MAX_EXPANSION_RATIO,
+                help="Most characters macro expansions may produce per character of the text they are expanded from. 0 for no limit.")
+ap.add_argument("--report-unused-macros", action="store_true", default=False,
+                help="Print a warning for every macro that is defined but never used.")
+
 # debug arguments
 # TODO: Implement
 ap.add_argument("--write_json", action="store_true", default=False,
@@ -208,7 +523,20 @@ ap.add_argument("-v", "--version", action='version', version='%(prog)s {version}
 # want full API call to include all minor api calls; return dict w/ string indices?
 def parse_args_and_go() :
     args = ap.parse_args()
-    mfd = MFD(PurePath(args.file))
+    cache_dir = None if args.no_cache else (args.cache_dir or default_cache_dir())
+    max_expanded_chars = args.max_expanded_chars if args.max_expanded_chars > 0 else None
+    max_expansion_ratio = args.max_expansion_ratio if args.max_expansion_ratio > 0 else None
+    max_line_length = args.max_line_length if args.max_line_length > 0 else None
+    if args.recursive :
+        from MEDFORD.batch import run_batch
+        sys.exit(run_batch(args.file, args.workers, cache_dir=cache_dir, mode=args.mode, use_mmap=args.mmap, report_unused_macros=args.report_unused_macros,
+                           duplicate_policy=args.duplicates, max_expanded_chars=max_expanded_chars, max_expansion_ratio=max_expansion_ratio,
+                           max_line_length=max_line_length))
+
+    cache = ResultCache(cache_dir) if cache_dir is not None else None
+    mfd = MFD(PurePath(args.file), use_mmap=args.mmap, workers=args.workers, report_unused_macros=args.report_unused_macros,
+              mode=args.mode, cache=cache, profile=args.profile, duplicate_policy=args.duplicates,
+              max_expanded_chars=max_expanded_chars, max_expansion_ratio=max_expansion_ratio, max_line_length=max_line_length)
     mfd.run_medford()
 
 if __name__ == "__main__" :
@@ -2,8 +2,8 @@
 such as macro definitions and generating the output dictionary for pydantic
 consumption."""
 
-from typing import Any, List, Dict
-from MEDFORD.objs.linecollections import Block, Macro
+from typing import Any, List, Dict, Optional
+from MEDFORD.objs.linecollections import Block, Detail, Macro, MacroGraph
 
 class Dictionizer() :
     """Class to handle dictionary-based management of MEDFORD metadata.
@@ -14,20 +14,62 @@ class Dictionizer() :
     content (stored in the variable macro_dictionary) and a function to
     generate a dictionary from a list of the completed Blocks."""
     macro_dictionary: Dict[str, Macro]
+    macro_graph: MacroGraph
     resolved_macros: Dict[str, str]
+    n_macro_uses: int # macro uses expanded in Details so far
     name_dictionary: Dict[str, Block]
 
-    def __init__(self, macro_dictionary: Dict[str, Macro], name_dictionary: Dict[str, Block]) :
+    def __init__(self, macro_dictionary: Dict[str, Macro], name_dictionary: Dict[str, Block],
+                 max_expanded_chars: Optional[int] = Macro.MAX_EXPANDED_CHARS, max_expansion_ratio: Optional[float] = Macro.MAX_EXPANSION_RATIO) :
         self.macro_dictionary = macro_dictionary
         self.name_dictionary = name_dictionary
+        # loops and too-deep chains are reported up front, but a macro is only
+        #   expanded, and charged to the budget, once a Detail uses it; see resolve_macros.
+        self.macro_graph = MacroGraph(macro_dictionary, max_expanded_chars, max_expansion_ratio)
+        self.macro_graph.check()
         self.resolved_macros = {}
-        # TODO : separate into a different function, tbh
-        # ask the macros to resolve themselves
-        for (n,m) in macro_dictionary.items() :
-            res = m.resolve(self.macro_dictionary)
-            if not isinstance(res, str) :
-                raise ValueError(f"Attempting to resolve macro {m.name} resulted in an error return, not a string.")
-            self.resolved_macros[n] = res
+        self.n_macro_uses = 0
+
+    def resolve_macros(self, names: Optional[List[str]]) -> Dict[str, str] :
+        """Makes sure the given macros (and the macros they use) are resolved,
+        and returns resolved_macros. Each macro is only ever expanded once."""
+        if names is not None :
+            todo = [n for n in names if n not in self.resolved_macros]
+            if len(todo) > 0 :
+                self.resolved_macros.update(self.macro_graph.resolve(todo))
+        return self.resolved_macros
+
+    def _expand(self, detail: Detail) -> str :
+        """Returns the content of a Detail, as long as expanding its macros stays
+        within the budget of the MacroGraph; otherwise 'ERROR'."""
+        if detail.used_macro_names is None :
+            return detail.get_content(self.resolved_macros)
+
+        self.n_macro_uses += len(detail.used_macro_names)
+        self.resolve_macros(detail.used_macro_names)
+        lengths = {n: len(self.resolved_macros[n]) for n in detail.used_macro_names if n in self.resolved_macros}
+        if not self.macro_graph.charge(detail, detail.get_content_length(lengths)) :
+            return "ERROR"
+        return detail.get_content(self.resolved_macros)
+
+    def get_unused_macros(self, bls: List[Block]) -> List[Macro] :
+        """Returns the macros that no Detail in the given Blocks uses, directly
+        or through other macros, in order of definition. Does not expand any macro."""
+        used = set()
+        todo: List[str] = []
+        for bl in bls :
+            # names are not expanded, but a macro written in one still counts as used
+            for names in (bl.head_detail.used_macro_names, bl.used_macro_names) :
+                if names is not None :
+                    todo.extend(names)
+        while len(todo) > 0 :
+            name = todo.pop()
+            if name in used or name not in self.macro_dictionary :
+                continue
+            used.add(name)
+            todo.extend(self.macro_graph.uses[name])
+
+        return [m for (n,m) in self.macro_dictionary.items() if n not in used]
 
 
     def validate_atat(self, bls: List[Block]) :
@@ -71,4 +113,4 @@ class Dictionizer() :
             for _, (minor, detail) in enumerate(cur_block.minor_tokens) :
                 if minor not in cur_parent_dict.keys() :
                     cur_parent_dict[minor] = []
-                cur_parent_dict[minor].append((detail, detail.get_content(self.resolved_macros)))
+                cur_parent_dict[minor].append((detail, self._expand(detail)))
@@ -0,0 +1,244 @@
+"""Module containing the MFDDocument class, an incrementally re-parsable
+MEDFORD file for editor integrations.
+
+An MFDDocument keeps the Line objects, Macros and Blocks of a file, split into
+segments that can each be collected independently of the others. When a range
+of lines is edited, only the edited lines are passed through the LineReader
+again, only the segments around the edit are collected again, and only the
+macros defined there (and the macros that use them) are resolved again."""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from MEDFORD.objs.lines import Line, CommentLine
+from MEDFORD.objs.linereader import LineReader
+from MEDFORD.objs.linecollector import BlockIndex, LineCollector
+from MEDFORD.objs.linecollections import Block, Macro, MacroGraph
+from MEDFORD.objs.lineindex import LineIndex, Position
+
+class _Segment() :
+    """A run of lines, [start, end), that a fresh LineCollector can collect on its
+    own (see LineCollector._sync_state), along with everything collected from it."""
+    start: int
+    end: int
+    entry_has_block: bool
+    blocks: List[Block]
+    macros: Dict[str, Macro]
+    comments: List[CommentLine]
+
+    def __init__(self, start: int, entry_has_block: bool) :
+        self.start = start
+        self.entry_has_block = entry_has_block
+        self.end = start
+        self.blocks = []
+        self.macros = {}
+        self.comments = []
+
+class MFDDocument() :
+    """Class representing a parsed MEDFORD file that can be edited in place.
+
+    Stores the text of every line, the Line object each one produced (None for
+    empty lines), and the segments they were collected into. Use `edit` to
+    replace a range of lines; the Blocks, macro definitions and resolved macro
+    content are kept up to date.
+    
+    Errors found while collecting are reported to the current validator as usual.
+    """
+    texts: List[str]
+    lines: List[Optional[Line]]
+    segments: List[_Segment]
+
+    macros: Dict[str, Macro]
+    resolved_macros: Dict[str, str]
+    _line_index: Optional[LineIndex] # built on first use after an edit, see get_line_index
+
+    def __init__(self, texts: List[str]) :
+        self._line_index = None
+        self.texts = list(texts)
+        self.lines = [LineReader.process_line(t, idx) for idx, t in enumerate(self.texts)]
+        self.segments, _ = self._collect(0, False)
+
+        self.resolved_macros = {}
+        self._merge_macros()
+        self._resolve_macros(set(self.macros.keys()))
+
+    @classmethod
+    def from_file(cls, filename: str) -> 'MFDDocument' :
+        with open(filename, 'r', encoding="utf-8") as f :
+            return cls(list(f))
+
+    def edit(self, start: int, end: int, new_texts: List[str]) -> None :
+        """Replaces lines [start, end) with new_texts and updates the document.
+
+        Lines are 0-indexed, as in the rest of the parser. Texts should keep
+        their line endings, as they would be read from a file."""
+        if not 0 <= start <= end <= len(self.texts) :
+            raise ValueError(f"Invalid edit range [{start}, {end}) for a document of {len(self.texts)} lines.")
+
+        delta = len(new_texts) - (end - start)
+        new_lines = [LineReader.process_line(t, start + idx) for idx, t in enumerate(new_texts)]
+        for l in self.lines[end:] :
+            if l is not None :
+                l.lineno += delta
+
+        self._line_index = None
+        self.texts[start:end] = new_texts
+        self.lines[start:end] = new_lines
+        new_end = start + len(new_texts)
+
+        # the segment holding the line before the edit may now run into it, so start there.
+        first_seg = 0
+        while first_seg + 1 < len(self.segments) and self.segments[first_seg + 1].start < start :
+            first_seg += 1
+
+        # segments entirely after the edit can be kept, once collection syncs up with one of them.
+        reusable: Dict[int, int] = {}
+        for idx in range(first_seg + 1, len(self.segments)) :
+            seg = self.segments[idx]
+            if seg.start >= end :
+                seg.start += delta
+                seg.end += delta
+                reusable[seg.start] = idx
+
+        changed_names: Set[str] = set()
+        first = self.segments[first_seg]
+        new_segments, stop_idx = self._collect(first.start, first.entry_has_block, new_end, reusable)
+        if stop_idx is None :
+            stop_idx = len(self.segments)
+
+        for seg in self.segments[first_seg:stop_idx] :
+            changed_names.update(seg.macros.keys())
+        for seg in new_segments :
+            changed_names.update(seg.macros.keys())
+
+        self.segments[first_seg:stop_idx] = new_segments
+        self._merge_macros()
+        self._resolve_macros(changed_names)
+
+    def _collect(self, start: int, entry_has_block: bool, min_end: Optional[int] = None, reusable: Optional[Dict[int, int]] = None) -> Tuple[List[_Segment], Optional[int]] :
+        """Collects lines from `start` onwards into segments, each with its own LineCollector.
+        
+        Stops early at the first line at or after min_end where collection syncs up with
+        one of the reusable (already collected) segments. Returns the new segments and
+        the index of the segment collection stopped at, or None if it ran to the end."""
+        segments: List[_Segment] = []
+        seg = _Segment(start, entry_has_block)
+        lc = MFDDocument._new_collector(entry_has_block)
+        has_lines = False
+
+        for idx in range(start, len(self.lines)) :
+            line = self.lines[idx]
+            if line is None :
+                continue
+
+            sync = seg.entry_has_block if not has_lines else lc._sync_state(line)
+            if sync is not None :
+                if has_lines :
+                    self._finish_segment(seg, lc, idx)
+                    segments.append(seg)
+                    seg = _Segment(idx, sync)
+                    lc = MFDDocument._new_collector(sync)
+
+                if min_end is not None and reusable is not None and idx >= min_end and idx in reusable and \
+                        self.segments[reusable[idx]].entry_has_block == sync :
+                    # only empty lines since the start of seg
+                    if idx > seg.start :
+                        seg.end = idx
+                        segments.append(seg)
+                    return (segments, reusable[idx])
+
+            seg.blocks.extend(lc._feed(line))
+            has_lines = True
+
+        if has_lines :
+            self._finish_segment(seg, lc, len(self.lines))
+        else :
+            seg.end = len(self.lines)
+        if has_lines or seg.end > seg.start or len(segments) == 0 :
+            segments.append(seg)
+        return (segments, None)
+
+    @staticmethod
+    def _new_collector(entry_has_block: bool) -> LineCollector :
+        lc = LineCollector()
+        lc._group_has_block = entry_has_block
+        return lc
+
+    def _finish_segment(self, seg: _Segment, lc: LineCollector, end: int) -> None :
+        seg.blocks.extend(lc._close())
+        seg.end = end
+        seg.macros = lc.get_macros()
+        seg.comments = lc.comments
+
+    def _merge_macros(self) -> None :
+        # same semantics as a single LineCollector: later definitions replace earlier ones.
+        self.macros = {}
+        for seg in self.segments :
+            self.macros.update(seg.macros)
+
+    def _resolve_macros(self, changed_names: Set[str]) -> None :
+        """Resolves the given macros again, along with every macro that uses them."""
+        users: Dict[str, Set[str]] = {}
+        for name, m in self.macros.items() :
+            if m.used_macro_names is not None :
+                for used in m.used_macro_names :
+                    users.setdefault(used, set()).add(name)
+
+        dirty: Set[str] = set()
+        todo = list(changed_names)
+        while len(todo) > 0 :
+            name = todo.pop()
+            if name in dirty :
+                continue
+            dirty.add(name)
+            todo.extend(users.get(name, ()))
+
+        for name in dirty :
+            if name in self.macros :
+                self.macros[name].clear_resolution()
+            else :
+                self.resolved_macros.pop(name, None)
+
+        resolved = MacroGraph(self.macros).resolve([n for n in dirty if n in self.macros], skip_undefined=True)
+        for name in dirty :
+            if name in resolved :
+                self.resolved_macros[name] = resolved[name]
+            else :
+                # uses a macro that is not defined (yet); common while a file is being edited.
+                self.resolved_macros.pop(name, None)
+
+    def get_blocks(self) -> List[Block] :
+        """Returns every Block in the document, in file order."""
+        out: List[Block] = []
+        for seg in self.segments :
+            out.extend(seg.blocks)
+        return out
+
+    def get_named_blocks(self) -> Dict[str, Block] :
+        """Returns the Blocks keyed by major@name, as LineCollector.get_1lvl_blocks does."""
+        return BlockIndex(self.get_blocks()).keyed()
+
+    def get_line_index(self) -> LineIndex :
+        """Returns the LineIndex of the document as it is now."""
+        if self._line_index is None :
+            index = LineIndex()
+            for seg in self.segments :
+                for l in seg.comments :
+                    index.add(l)
+                for m in seg.macros.values() :
+                    index.add(m)
+                for b in seg.blocks :
+                    for d in b.details :
+                        index.add(d)
+                    index.add(b)
+            self._line_index = index
+        return self._line_index
+
+    def find(self, lineno: int) -> Position :
+        """Returns the Line, Macro or Detail, and Block at lineno, e.g. for a hover."""
+        return self.get_line_index().find(lineno)
+
+    def get_comments(self) -> List[CommentLine] :
+        out: List[CommentLine] = []
+        for seg in self.segments :
+            out.extend(seg.comments)
+        return out
@@ -6,10 +6,12 @@ Line collections include objects such as Macros and Details (e.g. a Macro
 is defined as a MacroLine followed by 0 or more ContinueLines.)
 """
 
-from typing import Optional, List, Dict, Tuple, Union
+import copy
+from collections import deque
+from typing import Collection, Optional, List, Dict, Set, Tuple, Union
 from MEDFORD.objs.lines import AtAtLine, ContinueLine, MacroLine, NovelDetailLine
 
-from MEDFORD.submodules.mfdvalidator.errors import MissingDescError, MaxMacroDepthExceeded, AtAtReferencedDoesNotExist, MissingContent
+from MEDFORD.submodules.mfdvalidator.errors import MissingDescError, MaxMacroDepthExceeded, MacroExpansionLimitExceeded, AtAtReferencedDoesNotExist, MissingContent
 
 import MEDFORD.mfdglobals as mfdglobals 
 
@@ -48,7 +50,7 @@ class LineCollection() :
                     self.has_macros = True
                     if self.used_macro_names is None :
                         self.used_macro_names = []
-                    self.used_macro_names = [m[2] for m in el.macro_uses]
+                    self.used_macro_names.extend([m[2] for m in el.macro_uses])
 
     # don't implement yet, will do after rework is done.
     #has_references: bool = False
@@ -69,12 +71,22 @@ class LineCollection() :
         Takes as input a dictionary containing all known macro names
         and their substitutions.
         """
-        out : str = self.headline.get_content(resolved_macros)
+        if self.extralines is None :
+            return self.headline.get_content(resolved_macros)
+
+        parts : List[str] = [self.headline.get_content(resolved_macros)]
+        for line in self.extralines :
+            parts.append(line.get_content(resolved_macros))
+        return "".join(parts)
+
+    def get_content_length(self, macro_lengths: Dict[str, int]) -> int :
+        """Returns the length of LineCollection.get_content, given the length of
+        each macro's content, without building it."""
+        n = self.headline.get_content_length(macro_lengths)
         if self.extralines is not None :
             for line in self.extralines :
-                out += line.get_content(resolved_macros)
-
-        return out
+                n += line.get_content_length(macro_lengths)
+        return n
 
     def get_linenos(self) -> List[int] :
         """Returns a list of line numbers of all lines in the LineCollection.
@@ -87,7 +99,7 @@ class LineCollection() :
 
     # pylint: disable=unused-argument
     # yes, pylint, I know these aren't used. Temporary while atat is disabled.
-    def validate_atat(self, macro_defs: Dict[str, str], named_blocks: List[str]) -> bool :
+    def validate_atat(self, macro_defs: Dict[str, str], named_blocks: Collection[str]) -> bool :
         """
         TEMPORARILY DISABLED: ALWAYS RETURNS TRUE
         
@@ -136,6 +148,12 @@ class Macro(LineCollection) :
     resolution: str
 
     MAX_DEPTH: int = 10
+    # Default limits on the total expansion of macros in one file, so that a
+    #   macro repeating another several times, many levels deep, cannot blow up
+    #   memory. The ratio is to the size of what is expanded. None disables.
+    #   See MacroGraph to set them for one file.
+    MAX_EXPANDED_CHARS: Optional[int] = 10_000_000
+    MAX_EXPANSION_RATIO: Optional[float] = 1000.0
 
     def __init__(self, headline: MacroLine, extralines: Optional[List[ContinueLine]]):
         super(Macro, self).__init__(headline, extralines)
@@ -154,88 +172,280 @@ class Macro(LineCollection) :
                 outstr = outstr + el.raw_content
         return outstr
 
-    def resolve(self, macro_definitions: Dict[str, 'Macro'], depth: Optional[int] = None) -> Union[str, List['Macro']] :
-        """Resolve the content of the macro, up to 10 recursions.
+    def resolve(self, macro_definitions: Dict[str, 'Macro']) -> str :
+        """Resolve the content of the macro, up to 10 references deep.
 
-        Given a list of macros that have currently been defined, and the
-        current recursion depth of resolution, either returns the resolved
-        macro string or, in failure case, a list of all macros that were
-        used to reach failure.
-        """
-        # TODO : add a new way to track max resolutions.
-        if depth is None :
-            cdepth: int = 0
-        else :
-            cdepth: int = depth
-
-        print(self.name)
-        print(cdepth)
+        Given the macros that have currently been defined, returns the resolved
+        macro string, or 'ERROR' if the macro (or a macro it uses) is part of
+        a reference loop or too deep a reference chain. The error itself is
+        reported to the validator.
 
+        To resolve many macros at once, use MacroGraph instead; this builds a
+        MacroGraph over all of macro_definitions on every unresolved call.
+        """
+        if not self._is_resolved :
+            MacroGraph(macro_definitions).resolve([self.name])
         if self._is_resolved :
             return self.resolution
+        return "ERROR"
 
-        if cdepth == Macro.MAX_DEPTH :
-            return [self]
+    def _set_resolution(self, resolution: str, n_resolutions: int) -> None :
+        self._is_resolved = True
+        self.resolution = resolution
+        self._n_resolutions = n_resolutions
 
-        if not self.has_macros :
-            self._is_resolved = True
-            self.resolution = self.get_content({})
-            self._n_resolutions = 0
-            return self.resolution
+    def clear_resolution(self) -> None :
+        """Forgets the resolved content of the macro, e.g. after a macro it uses has been redefined."""
+        self._is_resolved = False
+        self._deepest_res_macro = None
 
-        if self.used_macro_names is not None and len(self.used_macro_names) > 0:
-            resolved_macros : Dict[str, str] = {}
-            deepest_resolution : int = 0
-            deepest_macro : Macro = self
+    def _get_resolution_chain(self) -> List['Macro'] :
+        tmp : List['Macro'] = [self]
+        cur = self._deepest_res_macro
+        while cur is not None :
+            tmp.append(cur)
+            cur = cur._deepest_res_macro
+        return tmp
 
-            for m in self.used_macro_names :
-                r = macro_definitions[m].resolve(macro_definitions, cdepth + 1)
+    def __eq__(self, other) -> bool :
+        if isinstance(other, type(self)) and self.name == other.name:
+            return super().__eq__(other)
 
-                # error branch
-                if isinstance(r, List) :
-                    r.insert(0,self)
-                    if cdepth == 0 :
-                        mfdglobals.validator.add_error(MaxMacroDepthExceeded(r))
-                        return "ERROR"
+        return False
 
-                    return r
 
-                # macro resolved successfully
-                if isinstance(r, str) :
-                    resolved_macros[m] = r
-                    cur_res_depth = macro_definitions[m]._n_resolutions + 1
-                    if cur_res_depth > deepest_resolution :
-                        deepest_resolution = cur_res_depth
-                        deepest_macro = macro_definitions[m]
 
-                else :
-                    raise TypeError(f"Unknown type returned from Macro.resolve(): {type(r).__name__}")
+class MacroGraph() :
+    """Graph of which Macros use which other Macros.
 
-            self._n_resolutions = deepest_resolution
-            self._deepest_res_macro = deepest_macro
+    Built once over a set of macro definitions, so that every Macro is resolved
+    exactly once, after all the Macros it uses. Reference loops are found up
+    front (Tarjan's strongly connected components) instead of by recursing until
+    Macro.MAX_DEPTH is hit.
+    """
+    macros: Dict[str, Macro]
+    uses: Dict[str, List[str]]
+    failed: Set[str]     # in a loop, too deep, or using such a macro; already reported
+    undefined: Set[str]  # use an undefined macro, directly or not
+    expanded_chars: int  # expansion budget spent so far, see charge
+    source_chars: int
+    max_expanded_chars: Optional[int]
+    max_expansion_ratio: Optional[float]
+    _budget_exceeded: bool
+    _depth: Dict[str, int]
+    _lengths: Dict[str, int]
+    _order: Dict[str, int]
+
+    def __init__(self, macros: Dict[str, Macro], max_expanded_chars: Optional[int] = Macro.MAX_EXPANDED_CHARS,
+                 max_expansion_ratio: Optional[float] = Macro.MAX_EXPANSION_RATIO) :
+        self.macros = macros
+        self.uses = {}
+        self.failed = set()
+        self.undefined = set()
+        self.expanded_chars = 0
+        self.source_chars = 0
+        self.max_expanded_chars = max_expanded_chars
+        self.max_expansion_ratio = max_expansion_ratio
+        self._budget_exceeded = False
+        self._depth = {}
+        self._lengths = {}
+        self._order = {}
+        for idx, (name, m) in enumerate(macros.items()) :
+            self._order[name] = idx
+            if m.used_macro_names is None :
+                self.uses[name] = []
+            else :
+                # only the distinct names matter; keep order for the error messages
+                self.uses[name] = list(dict.fromkeys(m.used_macro_names))
 
-            if self._n_resolutions == Macro.MAX_DEPTH :
-                mfdglobals.validator.add_error(MaxMacroDepthExceeded(self._get_resolution_chain()))
-                return 'ERROR'
+    def check(self, names: Optional[List[str]] = None, skip_undefined: bool = False) -> List[str] :
+        """Checks the named macros (default: all of them) and every macro they use,
+        without expanding any of them.
 
-            res = self.get_content(resolved_macros)
-            self._is_resolved = True
-            self.resolution = res
-            return res
+        Macros in a reference loop or more than Macro.MAX_DEPTH references deep are
+        reported to the validator once and added to failed, as is every macro that
+        uses them. A macro that uses an undefined macro raises a KeyError,
+        unless skip_undefined is set, in which case it is added to undefined.
+        The expansion budget is only charged by resolve.
 
-        raise ValueError("Somehow has_macros is True but used_macro_names is None.")
+        Returns the names of all macros visited, each after the macros it uses.
+        """
+        if names is None :
+            roots = list(self.macros.keys())
+        else :
+            roots = [n for n in names if n in self.macros]
+
+        visited: List[str] = []
+        for component in self._components(roots) :
+            visited.extend(component)
+            name = component[0]
+            if name in self._depth or name in self.failed or name in self.undefined :
+                # checked by an earlier call
+                continue
+
+            if len(component) > 1 or name in self.uses[name] :
+                loop = self._find_loop(component)
+                mfdglobals.mv.instance().add_error(MaxMacroDepthExceeded([self.macros[n] for n in loop]))
+                self.failed.update(component)
+                continue
+
+            m = self.macros[name]
+            if m._is_resolved :
+                self._depth[name] = m._n_resolutions
+                self._lengths[name] = len(m.resolution)
+                continue
+
+            deps = self.uses[name]
+            if any(d not in self.macros or d in self.undefined for d in deps) :
+                if not skip_undefined :
+                    raise KeyError([d for d in deps if d not in self.macros or d in self.undefined][0])
+                self.undefined.add(name)
+                continue
+            if any(d in self.failed for d in deps) :
+                # already reported on the macro it uses
+                self.failed.add(name)
+                continue
+
+            deepest: Optional[str] = None
+            for d in deps :
+                if deepest is None or self._depth[d] > self._depth[deepest] :
+                    deepest = d
+            m._deepest_res_macro = None if deepest is None else self.macros[deepest]
+            depth = 0 if deepest is None else self._depth[deepest] + 1
+
+            if depth >= Macro.MAX_DEPTH :
+                mfdglobals.mv.instance().add_error(MaxMacroDepthExceeded(m._get_resolution_chain()))
+                self.failed.add(name)
+                continue
+
+            self._depth[name] = depth
+            self._lengths[name] = m.get_content_length(self._lengths)
+
+        return visited
+
+    def resolve(self, names: Optional[List[str]] = None, skip_undefined: bool = False) -> Dict[str, str] :
+        """Resolves the named macros (default: all of them) and every macro they use.
+
+        Returns a dictionary from macro name to resolved content, for every macro
+        that was visited. Macros that failed the check (see check), or whose
+        expansion goes over the budget (see charge), resolve to 'ERROR'; with
+        skip_undefined, macros using an undefined macro are left out.
+        """
+        out: Dict[str, str] = {}
+        for name in self.check(names, skip_undefined) :
+            if name in self.failed :
+                out[name] = "ERROR"
+                continue
+            if name in self.undefined :
+                continue
+
+            m = self.macros[name]
+            if not m._is_resolved :
+                deps = self.uses[name]
+                # the length is known before anything is expanded, so the budget is
+                #   enforced without ever building the oversized string.
+                if any(d in self.failed for d in deps) or not self.charge(m, self._lengths[name]) :
+                    self.failed.add(name)
+                    out[name] = "ERROR"
+                    continue
+                m._set_resolution(m.get_content({d: self.macros[d].resolution for d in deps}), self._depth[name])
+            out[name] = m.resolution
 
-    def _get_resolution_chain(self) -> List['Macro'] :
-        tmp : List['Macro'] = [self]
-        if self._deepest_res_macro is not None :
-            tmp.append(self._deepest_res_macro)
-        return tmp
+        return out
 
-    def __eq__(self, other) -> bool :
-        if isinstance(other, type(self)) and self.name == other.name:
-            return super().__eq__(other)
+    def charge(self, collection: LineCollection, length: int) -> bool :
+        """Spends length expanded characters of collection's content from the
+        expansion budget (max_expanded_chars, max_expansion_ratio).
 
-        return False
+        Returns False if that goes over budget, in which case the content must
+        not be expanded. Only the first collection over budget is reported to
+        the validator; once spent, the budget stays spent.
+        """
+        if self._budget_exceeded :
+            return False
+
+        self.expanded_chars += length
+        self.source_chars += len(collection.get_raw_content()) # type: ignore
+        limit: Optional[str] = None
+        if self.max_expanded_chars is not None and self.expanded_chars > self.max_expanded_chars :
+            limit = f"{self.max_expanded_chars} characters in total"
+        elif self.max_expansion_ratio is not None and self.expanded_chars > self.max_expansion_ratio * max(self.source_chars, 1) :
+            limit = f"{self.max_expansion_ratio:g} times the length of the text it was expanded from"
+
+        if limit is not None :
+            self._budget_exceeded = True
+            mfdglobals.mv.instance().add_error(MacroExpansionLimitExceeded(collection, self.expanded_chars, limit))
+            return False
+        return True
+
+    def _components(self, roots: List[str]) -> List[List[str]] :
+        """Strongly connected components reachable from roots, each one listed
+        after every component it uses. Iterative Tarjan, so deep chains are fine."""
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        out: List[List[str]] = []
+
+        for root in roots :
+            if root in index :
+                continue
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work: List[Tuple[str, int]] = [(root, 0)]
+            while len(work) > 0 :
+                v, i = work[-1]
+                succ = self.uses[v]
+                if i < len(succ) :
+                    work[-1] = (v, i + 1)
+                    w = succ[i]
+                    if w not in self.macros :
+                        continue
+                    if w not in index :
+                        index[w] = low[w] = len(index)
+                        stack.append(w)
+                        on_stack.add(w)
+                        work.append((w, 0))
+                    elif w in on_stack :
+                        low[v] = min(low[v], index[w])
+                    continue
+
+                work.pop()
+                if len(work) > 0 :
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+                if low[v] == index[v] :
+                    component: List[str] = []
+                    while True :
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        component.append(w)
+                        if w == v :
+                            break
+                    out.append(component)
+        return out
+
+    def _find_loop(self, component: List[str]) -> List[str] :
+        """Returns a shortest loop through the first-defined macro of a strongly
+        connected component, e.g. ['A', 'B', 'A']."""
+        members = set(component)
+        start = min(component, key=lambda n: self._order[n])
+        parent: Dict[str, Optional[str]] = {start: None}
+        queue = deque([start])
+        while len(queue) > 0 :
+            v = queue.popleft()
+            for w in self.uses[v] :
+                if w == start :
+                    path = [v]
+                    while parent[path[-1]] is not None :
+                        path.append(parent[path[-1]]) # type: ignore
+                    path.reverse()
+                    return path + [start]
+                if w in members and w not in parent :
+                    parent[w] = v
+                    queue.append(w)
+        raise ValueError(f"No loop through macro {start} in its component.")
 
 
 # TODO: create 'HasMajors' mixin
@@ -245,6 +455,8 @@ class Detail(LineCollection) :
     major_tokens: List[str]
     minor_token: Optional[str]
     is_header: bool
+    _content: Optional[str] = None
+    _content_key: Tuple[Optional[str], ...] = ()
     # payload should only be obtained at the end, so macros, etc can be accurately replaced
 
 #    _fulldesc: List[Union[NovelDetailLine, ContinueLine]] # keep LineReturns so we can extract comments, linenos later
@@ -275,7 +487,7 @@ class Detail(LineCollection) :
                 content_length = content_length + len(line.raw_content.strip())
 
         if content_length == 0 :
-            mfdglobals.validator.add_error(MissingContent(self))
+            mfdglobals.mv.instance().add_error(MissingContent(self))
 
 
     def get_str_majors(self) -> str :
@@ -293,12 +505,21 @@ class Detail(LineCollection) :
         return out
 
     def get_content(self, resolved_macros: Dict[str, str]) -> str :
-        out = self.headline.get_content(resolved_macros)
-        if self.extralines is not None :
-            for line in self.extralines :
-                out = out + line.get_content(resolved_macros)
-        out = out.strip()
-        return out
+        """Returns the content of the Detail, with macros substituted.
+
+        The result is cached, and reused for as long as the content of every
+        macro the Detail uses stays the same.
+        """
+        if self.used_macro_names is None :
+            key : Tuple[Optional[str], ...] = ()
+        else :
+            key = tuple([resolved_macros.get(n) for n in self.used_macro_names])
+        if self._content is not None and key == self._content_key :
+            return self._content
+
+        self._content = super().get_content(resolved_macros).strip()
+        self._content_key = key
+        return self._content
 
     def __eq__(self, other) -> bool :
         if isinstance(other, type(self)) :
@@ -338,10 +559,10 @@ class AtAt(Detail) :
                 temp_name += line.get_content(macro_defs)
         return temp_name
 
-    def validate_atat(self, macro_defs: Dict[str, str], named_blocks: List[str]) -> bool:
+    def validate_atat(self, macro_defs: Dict[str, str], named_blocks: Collection[str]) -> bool:
         referenced_name = self._get_referenced_name(macro_defs)
         if referenced_name not in named_blocks :
-            mfdglobals.validator.add_error(AtAtReferencedDoesNotExist(self, referenced_name, named_blocks))
+            mfdglobals.mv.instance().add_error(AtAtReferencedDoesNotExist(self, referenced_name, named_blocks))
         return self._get_referenced_name(macro_defs) in named_blocks
 
 class Block() :
@@ -378,33 +599,51 @@ class Block() :
         # ?
         self.major_tokens = details[0].major_tokens
         if details[0].minor_token is not None and details[0].minor_token != "" :
-            mfdglobals.validator.add_error(MissingDescError(details[0]))
+            mfdglobals.mv.instance().add_error(MissingDescError(details[0]))
             #raise ValueError("No desc line for first detail provided to Block constructor.")
         self.head_detail = details[0]
         self.name = details[0].get_raw_content().strip()
 
         if len(details) > 0 :
             self.minor_tokens = []
-            for idx, detail in enumerate(details[1:]) :
-                if detail.major_tokens != self.major_tokens :
-                    my_majors_str = "_".join(self.major_tokens)
-                    detail_majors_str = "_".join(detail.major_tokens)
-                    raise ValueError(f"Block provided details of multiple major tokens: Block Major is {my_majors_str} while line {idx} has major of {detail_majors_str}.")
-                if detail.minor_token is None :
-                    raise ValueError(f"Block provided a detail with no minor token past first detail: detail # {idx}.")
+            self._add_minors(details[1:])
+
+    def copy(self) -> 'Block' :
+        """Returns a copy of the Block, sharing its Details, that can be extended
+        (see add_details) without changing this one. The Details are not checked again."""
+        out = copy.copy(self)
+        out.details = list(self.details)
+        out.minor_tokens = None if self.minor_tokens is None else list(self.minor_tokens)
+        out.used_macro_names = None if self.used_macro_names is None else list(self.used_macro_names)
+        return out
 
-                self.minor_tokens.append((detail.minor_token, detail))
+    def add_details(self, details: List[Detail]) -> None :
+        """Appends Details (none of them a Name line) to the end of the Block,
+        e.g. those of another Block of the same name being merged into it."""
+        self.details.extend(details)
+        self._add_minors(details)
 
-                #if detail
+    def _add_minors(self, details: List[Detail]) -> None :
+        for idx, detail in enumerate(details) :
+            if detail.major_tokens != self.major_tokens :
+                my_majors_str = "_".join(self.major_tokens)
+                detail_majors_str = "_".join(detail.major_tokens)
+                raise ValueError(f"Block provided details of multiple major tokens: Block Major is {my_majors_str} while line {idx} has major of {detail_majors_str}.")
+            if detail.minor_token is None :
+                raise ValueError(f"Block provided a detail with no minor token past first detail: detail # {idx}.")
 
-                if detail.has_macros and detail.used_macro_names is not None :
-                    if self.used_macro_names is None :
-                        self.used_macro_names = []
-                        self.has_macros = True
+            self.minor_tokens.append((detail.minor_token, detail))
+
+            #if detail
 
-                    for macro_use in detail.used_macro_names :
-                        if macro_use not in self.used_macro_names :
-                            self.used_macro_names.append(macro_use)
+            if detail.has_macros and detail.used_macro_names is not None :
+                if self.used_macro_names is None :
+                    self.used_macro_names = []
+                    self.has_macros = True
+
+                for macro_use in detail.used_macro_names :
+                    if macro_use not in self.used_macro_names :
+                        self.used_macro_names.append(macro_use)
 
     def get_str_major(self) -> str :
         """Returns the Block's major tokens as a _-joined string.
@@ -453,16 +692,14 @@ class Block() :
     def validate_atat(self, macro_defs: Dict[str, str], named_blocks : Dict[str, 'Block']) -> bool :
         """DEPRECIATED.
         """
-        block_names_only = []
-        block_names_only.extend(named_blocks.keys())
-
+        # the names are looked up, not listed: no need to copy them for every Block
         for d in self.details :
             if isinstance(d, AtAt) :
                 d_atat : AtAt = d
-                if not d.validate_atat(macro_defs, block_names_only) :
+                if not d.validate_atat(macro_defs, named_blocks) :
                     return False
 
-            if not d.validate_atat(macro_defs, block_names_only) :
+            if not d.validate_atat(macro_defs, named_blocks) :
                 return False
 
         return True
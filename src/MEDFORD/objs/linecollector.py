@@ -1,18 +1,169 @@
 
 from enum import Enum
-from typing import List, Dict, Tuple, Optional
-from MEDFORD.objs.lines import AtAtLine, Line, MacroLine, NovelDetailLine, ContinueLine, CommentLine
+from typing import Any, Callable, Iterable, Iterator, List, Dict, Tuple, Optional, Union
+from MEDFORD.objs.lines import Line, LineKind, NovelDetailLine, CommentLine
 from MEDFORD.objs.linecollections import AtAt, Macro, Block, Detail
+from MEDFORD.objs.lineindex import LineIndex
+from MEDFORD.submodules.mfdvalidator.errors import DuplicateBlockName
+
+import MEDFORD.mfdglobals as mfdglobals
+
+# what feed and close emit: each Macro, Detail and Block as soon as it is complete
+Collected = Union[Macro, Detail, Block]
+
+class DuplicatePolicy(Enum) :
+    """What to do with a Block that has the same major token and name as an earlier one."""
+    ERROR = "error" # report a DuplicateBlockName error; the later Block is kept
+    WARN = "warn"   # the later Block is kept, see BlockIndex.duplicates
+    MERGE = "merge" # append the later Block's details to the earlier one's
+
+    def __str__(self) :
+        return self.value
+
+class BlockIndex() :
+    """The Blocks of a file, indexed as they are added.
+
+    by_major maps major token to name to Block, both in insertion order. A
+    Block with the same major and name as an earlier one replaces it, in the
+    earlier one's place, or is merged into it (see DuplicatePolicy); either
+    way it is also listed in duplicates. Merging extends a copy of the first
+    Block, so the Blocks added are never modified.
+
+    The flat list, major@name dict and line numbers are built on first use
+    after a change and then shared, so callers must not modify them."""
+    policy: DuplicatePolicy
+    by_major: Dict[str, Dict[str, Block]]
+    duplicates: List[Block] # every Block whose major@name was already taken, in order
+    _first: Dict[str, Block] # major@name -> first Block added, only for names with duplicates
+    _by_lineno: Optional[Dict[int, Block]]
+    _flat: Optional[List[Block]]
+    _keyed: Optional[Dict[str, Block]]
+
+    def __init__(self, blocks: Optional[Iterable[Block]] = None, policy: DuplicatePolicy = DuplicatePolicy.WARN) :
+        self.policy = policy
+        self.by_major = {}
+        self.duplicates = []
+        self._first = {}
+        self._by_lineno = None
+        self._flat = None
+        self._keyed = None
+        if blocks is not None :
+            for b in blocks :
+                self.add(b)
+
+    def add(self, b: Block) -> None :
+        major = b.get_str_major()
+        names = self.by_major.setdefault(major, {})
+        kept = names.get(b.name)
+
+        if kept is None :
+            names[b.name] = b
+        else :
+            self.duplicates.append(b)
+            key = major + '@' + b.name
+            merged = key in self._first
+            first = self._first.setdefault(key, kept)
+            if self.policy == DuplicatePolicy.MERGE :
+                if not merged :
+                    # the first Block stays as it was added
+                    kept = kept.copy()
+                    names[b.name] = kept
+                kept.add_details(b.details[1:])
+            else :
+                if self.policy == DuplicatePolicy.ERROR :
+                    mfdglobals.mv.instance().add_error(DuplicateBlockName(b, first))
+                # replacing the value keeps the first one's place
+                names[b.name] = b
+        self._by_lineno = None
+        self._flat = None
+        self._keyed = None
+
+    def get(self, key: str) -> Optional[Block] :
+        """Returns the Block named by major@name, or None."""
+        major, _, name = key.partition('@')
+        names = self.by_major.get(major)
+        return names.get(name) if names is not None else None
+
+    def __contains__(self, key: str) -> bool :
+        return self.get(key) is not None
+
+    def __len__(self) -> int :
+        return sum([len(names) for names in self.by_major.values()])
+
+    def get_first(self, key: str) -> Optional[Block] :
+        """Returns the first Block added as major@name, or None."""
+        first = self._first.get(key)
+        return first if first is not None else self.get(key)
+
+    def get_all(self, key: str) -> List[Block] :
+        """Returns every Block added as major@name, in order. Linear in the
+        number of duplicates."""
+        first = self.get_first(key)
+        if first is None :
+            return []
+        return [first] + [b for b in self.duplicates if b.get_str_major() + '@' + b.name == key]
+
+    def iter_added(self) -> Iterator[Block] :
+        """Yields every Block added, as added rather than merged or replaced:
+        the first Block of each name, then the duplicates."""
+        for major, names in self.by_major.items() :
+            for name, b in names.items() :
+                yield self._first.get(major + '@' + name, b)
+        yield from self.duplicates
+
+    def majors(self) -> List[str] :
+        return list(self.by_major.keys())
+
+    def iter_major(self, major: str) -> Iterator[Block] :
+        """Yields the Blocks of a major token, in insertion order."""
+        yield from self.by_major.get(major, {}).values()
+
+    def block_at(self, lineno: int) -> Optional[Block] :
+        """Returns the Block holding the line at lineno, or None."""
+        if self._by_lineno is None :
+            self._by_lineno = {}
+            for b in self.flat() :
+                for n in b.get_linenos() :
+                    self._by_lineno[n] = b
+        return self._by_lineno.get(lineno)
+
+    def flat(self) -> List[Block] :
+        """Returns every Block, grouped by major token."""
+        if self._flat is None :
+            self._flat = []
+            for names in self.by_major.values() :
+                self._flat.extend(names.values())
+        return self._flat
+
+    def keyed(self) -> Dict[str, Block] :
+        """Returns every Block keyed by major@name, in the same order as flat."""
+        if self._keyed is None :
+            self._keyed = {}
+            for major, names in self.by_major.items() :
+                for name, block in names.items() :
+                    self._keyed[major + '@' + name] = block
+        return self._keyed
 
 class LineCollector() :
     defined_macros: Dict[str, Macro]
-    named_blocks: Dict[str, Dict[str, Block]]
+    block_index: BlockIndex
+    named_blocks: Dict[str, Dict[str, Block]] # block_index.by_major
+    _line_index: Optional[LineIndex] # built on first use after a change, see get_line_index
     comments: List[CommentLine]
+
+    # state of the Lines fed so far, see feed
+    _state: 'LineCollector.CollectorState'
+    _row: Dict[LineKind, 'Transition'] # _transitions[_state]
+    _line_collection: List[Line]
+    _detail_collection: List[Detail]
+    _group_has_block: bool
     # TODO: what if multiple blocks with the same name?
     #       ADJUSTED: 2 layer dict, first by block major then by name
+    #       ADJUSTED: see DuplicatePolicy
     # TODO: provide error handler?
 
     # how do I actually make this usable? still have to type LineCollector.(name) to use any of these.
+    # State of the collector: what the Lines in _line_collection will become.
     class CollectorState(Enum) :
         NA = 0
         MACRO = 1
@@ -26,145 +177,259 @@ class LineCollector() :
     comment = CollectorState.COMMENT
     atat = CollectorState.ATAT
 
-    def __init__(self, lines: List[Line]) :
+    # (state, line kind) -> Transition, see _build_transitions
+    _transitions: Dict[CollectorState, Dict[LineKind, 'Transition']]
+
+    def __init__(self, lines: Optional[Iterable[Line]] = None, duplicate_policy: DuplicatePolicy = DuplicatePolicy.WARN) :
         self.defined_macros = {}
-        self.named_blocks = {}
+        self.block_index = BlockIndex(policy=duplicate_policy)
+        self.named_blocks = self.block_index.by_major
+        self._line_index = None
         self.comments = []
+        self._reset_state()
 
-        self._ProcessLines(lines)
+        if lines is not None :
+            self._ProcessLines(lines)
     
-    def _ProcessLines(self, lines: List[Line]):
-        state: str = "na" # ?
-        line_collection = [] 
-        # TODO : figure out how to add type to line_collection without everything exploding
-        detail_collection: List[Detail] = []
-            
+    def _ProcessLines(self, lines: Iterable[Line]):
         for line in lines :
-            line_collection, detail_collection = self._check_do_completion(False, line, state, line_collection, detail_collection)
-
-            if isinstance(line, MacroLine) :
-                state = "macro"
-                line_collection.append(line)
-            
-            elif isinstance(line, AtAtLine) :
-                state = "atat"
-                line_collection.append(line)
-
-            elif isinstance(line, NovelDetailLine) :
-                state = "detail"
-                line_collection.append(line)
-            
-            elif isinstance(line, ContinueLine) :
-                # TODO : ensure no continue lines after comments?
-                line_collection.append(line)
-            
-            elif isinstance(line, CommentLine) :
-                state = "comment"
-                line_collection.append(line)
+            self.feed(line)
+        self.close()
+
+    def feed(self, line: Line) -> List[Collected] :
+        """Adds the next Line of the file, and returns whatever it completed, in order.
+
+        A Line completes the Macro or Detail before it (unless it is a continuation
+        line), and a Detail that starts a new Block completes the Block before it,
+        which is emitted before the Detail. Completed Macros go into defined_macros
+        and completed Blocks into named_blocks, as when all Lines are given at once."""
+        self._line_index = None
+        out = self._step(line)
+        if len(out) > 0 :
+            self._add_completed(out)
+        return out
+
+    def close(self) -> List[Collected] :
+        """Ends the file, returning the Macro or Detail still open and the last Block(s).
+        The collector can be fed again afterwards, as the start of a new group of Lines."""
+        self._line_index = None
+        out = self._finish()
+        self._add_completed(out)
+        return out
 
+    def iter_blocks(self, lines: Iterable[Line]) -> Iterator[Block] :
+        """Consumes Lines one at a time and yields each Block as soon as it is closed.
+
+        Only the Lines of the Detail currently being read and the Details of
+        the Block currently being read are held, so memory grows with the
+        largest Block rather than with the file. Macros and comments are still
+        collected into defined_macros and comments; yielded Blocks are NOT
+        added to named_blocks, that is left to the caller.
+        """
+        self._reset_state()
+        for line in lines :
+            yield from self._feed(line)
+        yield from self._close()
+
+    def _reset_state(self) -> None :
+        self._state = LineCollector.na
+        self._row = LineCollector._transitions[LineCollector.na]
+        # TODO : figure out how to add type to line_collection without everything exploding
+        self._line_collection = []
+        self._detail_collection = []
+        self._group_has_block = False
+
+    # _feed and _close only return the Blocks, and leave them out of named_blocks (see iter_blocks).
+    def _feed(self, line: Line) -> List[Block] :
+        return [item for item in self._step(line) if isinstance(item, Block)]
+
+    def _close(self) -> List[Block] :
+        return [item for item in self._finish() if isinstance(item, Block)]
+
+    def _step(self, line: Line) -> List[Collected] :
+        complete, close_block, self._state, self._row = self._row[line.kind]
+        completed: List[Collected] = []
+        if complete is not None :
+            complete(self, completed)
+            self._line_collection = []
+        if close_block :
+            self._complete_block(completed)
+        # TODO : ensure no continue lines after comments?
+        self._line_collection.append(line)
+        return completed
+
+    def _finish(self) -> List[Collected] :
         # finish up
-        if state != "na" :
-            _,_ = self._check_do_completion(True, None, state, line_collection, detail_collection)
+        if self._state != LineCollector.na :
+            completed: List[Collected] = []
+            LineCollector._completers[self._state](self, completed)
+            if len(self._detail_collection) > 0 :
+                self._complete_block(completed)
+            self._reset_state()
+            return completed
         else :
             raise ValueError("Somehow reached completion of _ProcessLines without changing state.")
 
-    
-    def _generate_blocks(self, detail_coll: List[Detail]) -> List[Block] :
-        # iterate thru details and put them into blocks
-        tmp_coll: List[Detail] = [detail_coll[0]]
-        block_coll: List[Block] = []
-
-        if len(detail_coll) > 1 :
-            for idx, d in enumerate(detail_coll[1:]) :
-                # TODO: ?
-                if len(block_coll) > 0 :
-                    if d.is_header or d.major_tokens != tmp_coll[0].major_tokens :
-                        block_coll.append(Block(tmp_coll))
-                        tmp_coll = [d]
-                    else :
-                        tmp_coll.append(d)
-                else :
-                    if d.is_header :
-                        block_coll.append(Block(tmp_coll))
-                        tmp_coll = [d]
-                    else :
-                        tmp_coll.append(d)
-            
-            block_coll.append(Block(tmp_coll))
+    def _sync_state(self, line: Line) -> Optional[bool] :
+        """Returns whether a fresh LineCollector could take over at `line`, i.e. produce the
+        same Macros and Blocks from `line` onwards as this one would.
 
-        else :
-            return [Block(tmp_coll)]
-
-        return block_coll
-
-    def _check_do_completion(self, final: bool, line:Optional[Line], state:str, line_collection, detail_collection: List[Detail]) -> Tuple[List[Line],List[Detail]] :
-        if final or (state != "na" and not isinstance(line, ContinueLine)) :
-            # finish whatever we're holding right now
-
-            # should probably have a mixin shared between macro and detail
-            #   to handle macro stuff
-            if state == "macro" :
-                headline = line_collection[0]
-                extralines = None
-                if len(line_collection) > 1 :
-                    extralines = line_collection[1:]
-
-                m = Macro(headline, extralines)
-                self.defined_macros[m.name] = m
-
-            elif state == "comment" :
-                self.comments.extend(line_collection)
-                # just throw the comment into the pile
-
-            elif state == "detail" :
-                headline = line_collection[0]
-                extralines = None
-                if len(line_collection) > 1 :
-                    extralines = line_collection[1:]
-                
-                d = Detail(headline, extralines)
-                detail_collection.append(d)
-
-            elif state == "atat" :
-                headline = line_collection[0]
-                extralines = None
-                if len(line_collection) > 1 :
-                    extralines = line_collection[1:]
-                a = AtAt(headline, extralines)
-                detail_collection.append(a)
-
-            line_collection = []
-
-        if (final and (detail_collection is not None) and len(detail_collection) > 0) or \
-                (state == "detail" and not (isinstance(line, NovelDetailLine) or isinstance(line, ContinueLine) or \
-                                            isinstance(line, CommentLine))) :
-            bs = self._generate_blocks(detail_collection)
-            for b in bs :
-                major = b.get_str_major()
-                if major not in self.named_blocks.keys() :
-                    self.named_blocks[major] = {}
-                self.named_blocks[b.get_str_major()][b.name] = b
+        If so, returns the value the fresh collector's _group_has_block must start with
+        (see _starts_new_block); otherwise returns None. Mirrors _transitions."""
+        if self._state == LineCollector.na :
+            # continuation lines before anything else are kept and glued onto the next line
+            return False if len(self._line_collection) == 0 else None
+        if line.kind == LineKind.CONTINUE or self._state == LineCollector.atat :
+            return None
+
+        if self._state == LineCollector.detail :
+            if line.kind == LineKind.MACRO :
+                # every open Detail and Block is closed by this line
+                return False
+        elif len(self._detail_collection) == 0 and not self._group_has_block :
+            return False
+
+        if isinstance(line, NovelDetailLine) and line.minor_token is None :
+            # a header always starts a new Block, so all that carries over is whether
+            #   the current run of details will have closed a Block by then.
+            n_open = len(self._detail_collection)
+            has_block = self._group_has_block
+            if self._state == LineCollector.detail :
+                headline = self._line_collection[0]
+                if n_open > 0 and self._starts_new_block(self._detail_collection, headline.minor_token is None, headline.major_tokens) :
+                    has_block = True
+                n_open += 1
+            return has_block or n_open > 0
+
+        return None
+
+    def _add_completed(self, items: List[Collected]) -> None :
+        for item in items :
+            if isinstance(item, Block) :
+                self._add_named_block(item)
+
+    def _add_named_block(self, b: Block) -> None :
+        self.block_index.add(b)
 
+    def _starts_new_block(self, open_details: List[Detail], is_header: bool, major_tokens: List[str]) -> bool :
+        # A header always starts a new block, and once a block has been closed
+        #   in this run of details, so does a change of major.
+        if is_header :
+            return True
+        return self._group_has_block and major_tokens != open_details[0].major_tokens
+
+    def _add_detail(self, d: Detail, detail_collection: List[Detail], completed: List[Collected]) -> List[Detail] :
+        if len(detail_collection) > 0 and self._starts_new_block(detail_collection, d.is_header, d.major_tokens) :
+            completed.append(Block(detail_collection))
+            self._group_has_block = True
             detail_collection = []
+        detail_collection.append(d)
+        completed.append(d)
+        return detail_collection
+    
+    # What each state completes, once a line that is not a continuation ends it.
+    # should probably have a mixin shared between macro and detail
+    #   to handle macro stuff
+    def _complete_macro(self, completed: List[Collected]) -> None :
+        headline = self._line_collection[0]
+        extralines = None
+        if len(self._line_collection) > 1 :
+            extralines = self._line_collection[1:]
+
+        m = Macro(headline, extralines)
+        self.defined_macros[m.name] = m
+        completed.append(m)
+
+    def _complete_comment(self, completed: List[Collected]) -> None :
+        # just throw the comment into the pile
+        self.comments.extend(self._line_collection)
+
+    def _complete_detail(self, completed: List[Collected]) -> None :
+        headline = self._line_collection[0]
+        extralines = None
+        if len(self._line_collection) > 1 :
+            extralines = self._line_collection[1:]
+
+        d = Detail(headline, extralines)
+        self._detail_collection = self._add_detail(d, self._detail_collection, completed)
+
+    def _complete_atat(self, completed: List[Collected]) -> None :
+        headline = self._line_collection[0]
+        extralines = None
+        if len(self._line_collection) > 1 :
+            extralines = self._line_collection[1:]
+        a = AtAt(headline, extralines)
+        self._detail_collection = self._add_detail(a, self._detail_collection, completed)
 
-        return (line_collection, detail_collection)
+    def _complete_block(self, completed: List[Collected]) -> None :
+        completed.append(Block(self._detail_collection))
+        self._group_has_block = False
+        self._detail_collection = []
 
+    _completers: Dict[CollectorState, Callable[['LineCollector', List[Collected]], None]] = {
+        CollectorState.MACRO: _complete_macro,
+        CollectorState.COMMENT: _complete_comment,
+        CollectorState.DETAIL: _complete_detail,
+        CollectorState.ATAT: _complete_atat,
+    }
+
+    # both views are shared with the BlockIndex; do not modify them.
     def get_flat_blocks(self) -> List[Block] :
-        t : List[Dict[str, Block]] = [named_blocks for major_token, named_blocks in self.named_blocks.items()]
-        out : List[Block] = []
-        for name_dict in t :
-            out.extend([block for name, block in name_dict.items()])
-        return out
+        return self.block_index.flat()
     
     # combines major token with name to flatten 2-level dict into 1 level
     # later can be adjusted to keep 2 layer, but requires adjustment of Dictionizer
     def get_1lvl_blocks(self) -> Dict[str, Block] :
-        tdict: Dict[str, Block] = {}
-        for major in self.named_blocks.keys() :
-            for name, block in self.named_blocks[major].items() :
-                tdict[major + '@' + name] = block
-
-        return tdict
+        return self.block_index.keyed()
 
     def get_macros(self) -> Dict[str, Macro] :
-        return self.defined_macros
\ No newline at end of file
+        return self.defined_macros
+
+    def get_line_index(self) -> LineIndex :
+        """Returns the LineIndex of everything fed so far. It is built on the first
+        call after a Line is fed, so nothing is spent on it unless it is queried."""
+        if self._line_index is None :
+            index = LineIndex()
+            for l in self.comments :
+                index.add(l)
+            for m in self.defined_macros.values() :
+                index.add(m)
+            for b in self.block_index.iter_added() :
+                for d in b.details :
+                    index.add(d)
+                index.add(b)
+            # the Block being collected is not complete yet, but its Details are
+            for d in self._detail_collection :
+                index.add(d)
+            self._line_index = index
+        return self._line_index
+
+# What a line of some kind does in some state: the completer to run on the lines
+#   collected so far (if any), whether it also completes the Block being
+#   collected, the next state, and the row of transitions out of that state.
+Transition = Tuple[Optional[Callable[[LineCollector, List[Collected]], None]], bool, LineCollector.CollectorState, Dict[LineKind, Any]]
+
+def _build_transitions() -> Dict[LineCollector.CollectorState, Dict[LineKind, Transition]] :
+    State = LineCollector.CollectorState
+    state_of_kind: Dict[LineKind, State] = {
+        LineKind.COMMENT: State.COMMENT,
+        LineKind.MACRO: State.MACRO,
+        LineKind.DETAIL: State.DETAIL,
+        LineKind.ATAT: State.ATAT,
+    }
+    rows: Dict[State, Dict[LineKind, Transition]] = {state: {} for state in State}
+    for state, row in rows.items() :
+        for kind in LineKind :
+            if kind == LineKind.CONTINUE :
+                # continuation lines are added to whatever is being collected;
+                #   before anything else, they are glued onto the next line.
+                row[kind] = (None, False, state, row)
+                continue
+            nxt = state_of_kind[kind]
+            complete = LineCollector._completers.get(state) # nothing to complete in NA
+            # a macro definition ends a run of details; details (also @-@) and comments don't
+            close_block = state == State.DETAIL and kind == LineKind.MACRO
+            row[kind] = (complete, close_block, nxt, rows[nxt])
+    return rows
+
+LineCollector._transitions = _build_transitions()
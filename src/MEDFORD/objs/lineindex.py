@@ -0,0 +1,126 @@
+"""Module defining the LineIndex, which maps a line number to the Line, Macro
+or Detail, and Block covering it.
+
+Each kind of object is kept as a list of [first, last] line number intervals,
+sorted by first line, which do not overlap (a Detail covers the lines from its
+headline to its last continuation line, a Block those from its first Detail to
+the end of its last). A query is a bisect on each list, so O(log n)."""
+
+from bisect import bisect_right
+from typing import Any, List, Optional, Union
+
+from MEDFORD.objs.lines import Line
+from MEDFORD.objs.linecollections import Block, Detail, Macro
+
+class _Intervals() :
+    starts: List[int]
+    ends: List[int]
+    items: List[Any]
+    _sorted: bool
+
+    def __init__(self) :
+        self.starts = []
+        self.ends = []
+        self.items = []
+        self._sorted = True
+
+    def add(self, start: int, end: int, item: Any) -> None :
+        # objects are usually added in file order; sort once, on the next find, if not.
+        if len(self.starts) > 0 and start < self.starts[-1] :
+            self._sorted = False
+        self.starts.append(start)
+        self.ends.append(end)
+        self.items.append(item)
+
+    def find(self, lineno: int) -> Optional[Any] :
+        if not self._sorted :
+            order = sorted(range(len(self.starts)), key=lambda i: self.starts[i])
+            self.starts = [self.starts[i] for i in order]
+            self.ends = [self.ends[i] for i in order]
+            self.items = [self.items[i] for i in order]
+            self._sorted = True
+
+        idx = bisect_right(self.starts, lineno) - 1
+        if idx >= 0 and self.ends[idx] >= lineno :
+            return self.items[idx]
+        return None
+
+    def __len__(self) -> int :
+        return len(self.items)
+
+class Position() :
+    """What covers a line number: the Line on it (None for an empty line), the
+    Macro or Detail it belongs to, and the Block that Detail belongs to."""
+    lineno: int
+    line: Optional[Line]
+    collection: Optional[Union[Macro, Detail]]
+    block: Optional[Block]
+
+    def __init__(self, lineno: int, line: Optional[Line], collection: Optional[Union[Macro, Detail]], block: Optional[Block]) :
+        self.lineno = lineno
+        self.line = line
+        self.collection = collection
+        self.block = block
+
+    def __repr__(self) -> str :
+        return f"Position({self.lineno}, {type(self.line).__name__}, {type(self.collection).__name__}, {type(self.block).__name__})"
+
+class LineIndex() :
+    """Index of the Lines, Macros, Details and Blocks of a file by line number.
+
+    Adding an object only queues it; the intervals are built on the next
+    query (see LineCollector.get_line_index). The Lines of
+    a Macro or Detail are indexed with it, so only Lines outside of any (i.e.
+    comments) need to be added on their own. Line numbers are those of the
+    Lines when they were indexed; if the Lines are renumbered, build a new index."""
+    _pending: List[Union[Line, Macro, Detail, Block]]
+    _lines: _Intervals # of Line
+    _collections: _Intervals # of Union[Macro, Detail]
+    _blocks: _Intervals # of Block
+
+    def __init__(self) :
+        self._pending = []
+        self._lines = _Intervals()
+        self._collections = _Intervals()
+        self._blocks = _Intervals()
+
+    def add(self, item: Union[Line, Macro, Detail, Block]) -> None :
+        self._pending.append(item)
+
+    def _build(self) -> None :
+        for item in self._pending :
+            if isinstance(item, Line) :
+                self._lines.add(item.lineno, item.lineno, item)
+            elif isinstance(item, Block) :
+                first = item.details[0].headline.lineno
+                self._blocks.add(first, max(first, _last_lineno(item.details[-1])), item)
+            else :
+                self._collections.add(item.headline.lineno, _last_lineno(item), item)
+                self._lines.add(item.headline.lineno, item.headline.lineno, item.headline)
+                if item.extralines is not None :
+                    for l in item.extralines :
+                        self._lines.add(l.lineno, l.lineno, l)
+        self._pending = []
+
+    def line_at(self, lineno: int) -> Optional[Line] :
+        if len(self._pending) > 0 :
+            self._build()
+        return self._lines.find(lineno)
+
+    def collection_at(self, lineno: int) -> Optional[Union[Macro, Detail]] :
+        if len(self._pending) > 0 :
+            self._build()
+        return self._collections.find(lineno)
+
+    def block_at(self, lineno: int) -> Optional[Block] :
+        if len(self._pending) > 0 :
+            self._build()
+        return self._blocks.find(lineno)
+
+    def find(self, lineno: int) -> Position :
+        return Position(lineno, self.line_at(lineno), self.collection_at(lineno), self.block_at(lineno))
+
+def _last_lineno(coll: Union[Macro, Detail]) -> int :
+    if coll.extralines is not None and len(coll.extralines) > 0 :
+        return coll.extralines[-1].lineno
+    return coll.headline.lineno
@@ -3,10 +3,15 @@ Handles functionality such as identifying Line types (comment, macro definition)
 and parsing line content, such as identifying the relevant Major and Minor tokens 
 in a line. Eventually returns Line objects."""
 
+import io
+import mmap
+import os
 import re
-from typing import Tuple, List, Optional
-from MEDFORD.submodules.mfdvalidator.errors import MissingAtAtName
-from MEDFORD.objs.lines import Line, MacroLine, CommentLine, NovelDetailLine, ContinueLine
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Tuple, List, Optional
+from MEDFORD.submodules.mfdvalidator.errors import LineTooLong, MFDErr, MissingAtAtName
+from MEDFORD.objs.lines import Line, LineSource, MacroLine, CommentLine, NovelDetailLine, ContinueLine
 
 import MEDFORD.mfdglobals as mfdglobals
 
@@ -32,6 +37,124 @@ class DetailStatics():
     comment_use_regex:str = "(?=({}\\s.+))".format(comment_header)
     latex_use_regex:str = "{}[^({})]+{}".format(escaped_lm, escaped_lm, escaped_lm)
     atat_use_regex:str = "{}(?P<major>[A-Za-z_]+)-{}(?P<referenced>[A-Za-z_]+)(\\s(?P<name>.+))?$".format(token_header, token_header)
+    macro_def_regex:str = "{}[A-Za-z]".format(macro_header)
+    macro_name_body_regex:str = "{}(?P<mname>[A-Za-z0-9_]+)\\s(?P<mbody>.+)$".format(macro_header)
+    novel_token_regex:str = "{}[A-Za-z]".format(token_header)
+
+    # Compiled once at import so that per-line calls do not go through the `re` cache.
+    major_minor_pattern: re.Pattern = re.compile(major_minor_reg)
+    macro_use_pattern: re.Pattern = re.compile(macro_use_regex)
+    comment_use_pattern: re.Pattern = re.compile(comment_use_regex)
+    latex_use_pattern: re.Pattern = re.compile(latex_use_regex)
+    atat_use_pattern: re.Pattern = re.compile(atat_use_regex)
+    macro_def_pattern: re.Pattern = re.compile(macro_def_regex)
+    macro_name_body_pattern: re.Pattern = re.compile(macro_name_body_regex)
+    novel_token_pattern: re.Pattern = re.compile(novel_token_regex)
+
+    # Pieces of latex_use_regex and macro_use_regex for LineTokenizer, each a single character
+    #   class run. Matched at a fixed position, they cannot backtrack, so scanning is linear.
+    latex_body_pattern: re.Pattern = re.compile("[^({})]*".format(escaped_lm))
+    macro_closed_name_pattern: re.Pattern = re.compile("[a-zA-Z0-9_]*")
+    macro_open_name_pattern: re.Pattern = re.compile("[a-zA-Z0-9]*")
+
+    # Matches at the same positions as comment_use_pattern, without capturing the rest of the
+    #   line; otherwise a line of n '#'s costs O(n^2) to scan.
+    comment_start_pattern: re.Pattern = re.compile("{}\\s.".format(comment_header))
+
+    # Every comment, LaTeX or macro span starts with one of these characters.
+    span_trigger_pattern: re.Pattern = re.compile("[{}]".format(re.escape(comment_header[0] + _latex_marker[0] + macro_header[0])))
+
+class LineTokenizer :
+    """Single-pass scanner that finds every possible inline comment, LaTeX block and macro use in a line.
+
+    Produces exactly the same locations as running `LineReader.find_possible_inline_comments`,
+    `LineReader.find_possible_latex` and `LineReader.find_macro_uses` separately, but only walks
+    the line once, stopping at characters that can start one of the three constructs.
+
+    LaTeX blocks and macro uses are recognized by scan_latex and scan_macro rather than the
+    regexes in DetailStatics: the first run of characters that can continue a match is the
+    only one that can, so there is nothing to backtrack over, and no character is read more
+    than a constant number of times, whatever the line."""
+    @staticmethod
+    def scan_latex(line:str, pos:int) -> int :
+        """Returns the end of the LaTeX block starting at pos, or -1 if there is none.
+        Same as matching `DetailStatics.latex_use_pattern` at pos."""
+        marker = DetailStatics._latex_marker
+        if not line.startswith(marker, pos) :
+            return -1
+        body_start = pos + len(marker)
+        # the body cannot contain the marker's character, so it must end right before the closing marker.
+        body_end = DetailStatics.latex_body_pattern.match(line, body_start).end()
+        if body_end == body_start or not line.startswith(marker, body_end) :
+            return -1
+        return body_end + len(marker)
+
+    @staticmethod
+    def scan_macro(line:str, pos:int) -> Optional[Tuple[Macro, int]] :
+        """Returns the macro use starting at pos and the end of the whole match (which for an
+        open macro use includes the character after the name), or None if there is none.
+        Same as matching `DetailStatics.macro_use_pattern` at pos."""
+        header = DetailStatics.macro_header
+        if not line.startswith(header, pos) :
+            return None
+        name_start = pos + len(header)
+
+        if line.startswith("{", name_start) :
+            # closed, `@{name}
+            name_end = DetailStatics.macro_closed_name_pattern.match(line, name_start + 1).end()
+            if name_end == name_start + 1 or not line.startswith("}", name_end) :
+                return None
+            return ((pos, name_end + 1, line[name_start + 1:name_end]), name_end + 1)
+
+        # open, `@name followed by whitespace, a closing brace or the end of the line
+        name_end = DetailStatics.macro_open_name_pattern.match(line, name_start).end()
+        if name_end == name_start :
+            return None
+        if name_end == len(line) :
+            end = name_end
+        elif line[name_end].isspace() or line[name_end] == "}" :
+            end = name_end + 1
+        else :
+            return None
+        return ((pos, name_end, line[name_start:name_end]), end)
+
+    @staticmethod
+    def find_spans(line:str) -> Tuple[List[int], List[Tex], List[Macro]] :
+        """Returns the possible inline comment locations, LaTeX blocks and macro uses of a string line."""
+        poss_inline: List[int] = []
+        poss_tex: List[Tex] = []
+        poss_macro: List[Macro] = []
+
+        # Mirrors re.finditer: LaTeX blocks and macro uses cannot overlap others of the same kind,
+        #   so each kind only resumes searching after the end of its previous match.
+        tex_resume: int = 0
+        macro_resume: int = 0
+
+        comment_char = DetailStatics.comment_header[0]
+        latex_char = DetailStatics._latex_marker[0]
+        comment_match = DetailStatics.comment_start_pattern.match
+        scan_latex = LineTokenizer.scan_latex
+        scan_macro = LineTokenizer.scan_macro
+
+        for trigger in DetailStatics.span_trigger_pattern.finditer(line) :
+            pos = trigger.start()
+            char = line[pos]
+            if char == comment_char :
+                if comment_match(line, pos) is not None :
+                    poss_inline.append(pos)
+            elif char == latex_char :
+                if pos >= tex_resume :
+                    end = scan_latex(line, pos)
+                    if end != -1 :
+                        poss_tex.append((pos, end))
+                        tex_resume = end
+            elif pos >= macro_resume :
+                found = scan_macro(line, pos)
+                if found is not None :
+                    poss_macro.append(found[0])
+                    macro_resume = found[1]
+
+        return (poss_inline, poss_tex, poss_macro)
 
 class LineReader :
     """Class that is used to identify line type, process strings, and return Line objects.
@@ -40,6 +163,14 @@ class LineReader :
     Contains functions such as `is_comment_line` and `get_major_minor`.
     
     Primary point of entry is the function `process_line`; everything else is mostly for use only within the LineReader class."""
+    # Files smaller than this are not worth starting a process pool for.
+    parallel_min_bytes: int = 4 * 1024 * 1024
+    # Chunks handed out per worker, so that uneven chunks still balance out.
+    chunks_per_worker: int = 4
+    # Default for max_line_length: longer lines are reported as LineTooLong and skipped,
+    #   bounding the work done per line. None for no limit.
+    MAX_LINE_LENGTH: Optional[int] = 1_000_000
+
     ## Methods to classify line type:
     # Comment
     # Macro definition
@@ -47,22 +178,22 @@ class LineReader :
     @staticmethod
     def is_comment_line(line:str) -> bool :
         """Returns True if the provided string is a comment line."""
-        return re.match(f"{DetailStatics.comment_header}", line) is not None
+        return line.startswith(DetailStatics.comment_header)
 
     @staticmethod
     def is_macro_def_line(line:str) -> bool :
         """Returns True if the provided string is a macro definition line."""
-        return re.match(f"{DetailStatics.macro_header}[A-Za-z]", line) is not None
+        return DetailStatics.macro_def_pattern.match(line) is not None
 
     @staticmethod
     def is_atat_line(line:str) -> bool :
         """Returns True if the provided string is an At-At line."""
-        return re.match(DetailStatics.atat_use_regex, line) is not None
+        return DetailStatics.atat_use_pattern.match(line) is not None
 
     @staticmethod
     def find_macro_name_body(line:str) -> Tuple[str, str] :
         """Given a string, attempts to identify a macro name and its macro definition. If successful, returns them as a tuple."""
-        m = re.match(f"{DetailStatics.macro_header}(?P<mname>[A-Za-z0-9_]+)\\s(?P<mbody>.+)$", line)
+        m = DetailStatics.macro_name_body_pattern.match(line)
         if m is not None :
             return (m.group('mname'), m.group('mbody'))
 
@@ -71,23 +202,26 @@ class LineReader :
     @staticmethod
     def is_novel_token_line(line:str) -> bool :
         """Returns whether the line contains a novel MEDFORD token."""
-        return re.match(f"{DetailStatics.token_header}[A-Za-z]", line) is not None
+        return DetailStatics.novel_token_pattern.match(line) is not None
 
     @staticmethod
     def get_major_minor(line:str) -> Tuple[List[str], str, str] :
         """Given a line string, attempts to identify its major and minor tokens. 
         Returns a list of found major tokens, the minor token, and the line content.
         """
-        mm_res: Optional[re.Match] = re.match(DetailStatics.major_minor_reg, line)
+        mm_res: Optional[re.Match] = DetailStatics.major_minor_pattern.match(line)
         if mm_res is None :
             raise NotImplementedError("Something went horribly wrong trying to find Major and Minor tokens.")
         else :
             mm_match_res : re.Match = mm_res
             match_grps = mm_match_res.groupdict()
 
-            major_res : List[str] = match_grps['major'].split("_")
+            # tokens repeat on nearly every line, so share one copy of each.
+            major_res : List[str] = [sys.intern(t) for t in match_grps['major'].split("_")]
             if 'minor' in match_grps.keys() :
                 minor_res : str = match_grps['minor']
+                if minor_res is not None :
+                    minor_res = sys.intern(minor_res)
             else :
                 minor_res : str = ""
 
@@ -99,14 +233,14 @@ class LineReader :
         """Given a line and its line number, attempts to identify at-at attributes.
         
         DEPRECIATED, At-At is currently being reworked."""
-        aa_res: Optional[re.Match] = re.match(DetailStatics.atat_use_regex, line)
+        aa_res: Optional[re.Match] = DetailStatics.atat_use_pattern.match(line)
         if aa_res is None :
             raise ValueError("Attempted to get @-@ attributes on a line that does not contain @-@ use.")
         else :
             aa_match_res : re.Match = aa_res
             match_grps = aa_match_res.groupdict()
             if match_grps['name'] is None :
-                mfdglobals.validator.add_error(MissingAtAtName(match_grps['major'], match_grps['referenced'], lineno))
+                mfdglobals.mv.instance().add_error(MissingAtAtName(match_grps['major'], match_grps['referenced'], lineno))
                 return None
 
             major_res = match_grps['major'].split("_")
@@ -121,24 +255,24 @@ class LineReader :
     @staticmethod
     def contains_inline_comment(line:str) -> bool :
         """Returns True if the line contains an Inline comment."""
-        return re.search(DetailStatics.comment_use_regex, line) is not None
+        return DetailStatics.comment_use_pattern.search(line) is not None
 
     @staticmethod
     def contains_macro_use(line:str) -> bool :
         """Returns True if the line contains a macro usage."""
-        return re.search(DetailStatics.macro_use_regex, line) is not None
+        return DetailStatics.macro_use_pattern.search(line) is not None
 
     @staticmethod
     def contains_latex_use(line:str) -> bool:
         """Returns True if the line contains a LaTeX block."""
-        return re.search(DetailStatics.latex_use_regex, line) is not None
+        return DetailStatics.latex_use_pattern.search(line) is not None
 
     ## Methods to find specific locations of attributes
     @staticmethod
     def find_possible_inline_comments(line:str) -> List[int] :
         """Returns all possible locations of inline comments in a string line."""
         locations = []
-        all_poss_comments = re.finditer(DetailStatics.comment_use_regex, line)
+        all_poss_comments = DetailStatics.comment_use_pattern.finditer(line)
         for match in all_poss_comments:
             locations.append(match.start())
         return locations
@@ -147,7 +281,7 @@ class LineReader :
     def find_macro_uses(line:str) -> List[Macro] :
         """Returns all possible macro uses in a string line."""
         locations = []
-        all_poss_macros = re.finditer(DetailStatics.macro_use_regex, line)
+        all_poss_macros = DetailStatics.macro_use_pattern.finditer(line)
         # Checks both possible macro use types, 'closed' (e.g. `@{macro}) and 'open' (e.g. `@macro)
         for match in all_poss_macros:
             if match.group('r1') is not None :
@@ -160,36 +294,154 @@ class LineReader :
     def find_possible_latex(line:str) -> List[Tex] :
         """Returns all possible LaTeX blocks in a string line."""
         locations = []
-        all_poss_comments = re.finditer(DetailStatics.latex_use_regex, line)
+        all_poss_comments = DetailStatics.latex_use_pattern.finditer(line)
         for match in all_poss_comments:
             locations.append((match.start(), match.end()))
         return locations
 
-    # TODO : move file reading/crunching into LineReader from the main Medford function,
-    #       so we can more easily add different file operation types (line-by-line vs dumping into memory).
-    #       May also become relevant when we start handling imports.
+    # TODO : May also become relevant when we start handling imports.
+    @staticmethod
+    def iter_lines(lines: Iterable[str], start: int = 0, max_line_length: Optional[int] = MAX_LINE_LENGTH) -> Iterator[Line] :
+        """Lazily processes an iterable of strings (such as an open file handle), yielding one Line object at a time.
+        
+        Line numbers start at `start`. Empty, At-At and too long lines are skipped, as in `process_line`."""
+        for idx, line in enumerate(lines, start) :
+            p_line = LineReader.process_line(line, idx, max_line_length)
+            if p_line is not None :
+                yield p_line
 
     @staticmethod
-    def process_line(line: str, lineno: int) -> Optional[Line] :
+    def process_chunk(filename: str, start: int, end: int, max_line_length: Optional[int] = MAX_LINE_LENGTH) -> Tuple[List[Line], int, List[MFDErr]] :
+        """Processes the lines in bytes [start, end) of a file, which must begin and end on line boundaries.
+
+        Returns the Line objects, numbered from 0 at the start of the chunk, the
+        number of lines in the chunk (including empty ones), so chunks can be renumbered
+        when merged, and the errors found, which are not reported anywhere yet."""
+        with open(filename, 'rb') as f :
+            f.seek(start)
+            data = f.read(end - start)
+
+        lines: List[Line] = []
+        n_lines = 0
+        with mfdglobals.mv.context() as validator :
+            # same newline handling as reading the file in text mode
+            for idx, line in enumerate(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8")) :
+                p_line = LineReader.process_line(line, idx, max_line_length)
+                if p_line is not None :
+                    lines.append(p_line)
+                n_lines = idx + 1
+        return (lines, n_lines, validator.get_errors())
+
+    @staticmethod
+    def _chunk_bounds(filename: str, n_chunks: int) -> List[Tuple[int, int]] :
+        """Splits a file into at most n_chunks byte ranges that each end just after a newline."""
+        size = os.path.getsize(filename)
+        bounds: List[Tuple[int, int]] = []
+        prev = 0
+        with open(filename, 'rb') as f :
+            for k in range(1, n_chunks) :
+                target = size * k // n_chunks
+                if target <= prev :
+                    continue
+                f.seek(target)
+                f.readline()
+                cut = f.tell()
+                if cut >= size :
+                    break
+                bounds.append((prev, cut))
+                prev = cut
+        bounds.append((prev, size))
+        return bounds
+
+    @staticmethod
+    def iter_parallel_lines(filename: str, workers: Optional[int] = None, start: int = 0, max_line_length: Optional[int] = MAX_LINE_LENGTH) -> Iterator[Line] :
+        """Processes a file in line-aligned chunks on a process pool, yielding Line objects in file order.
+
+        Line classification depends on nothing but the line itself, so chunks are independent;
+        they are renumbered as they are merged. Files under `parallel_min_bytes` are read
+        sequentially. `workers` defaults to the number of CPUs."""
+        if os.path.getsize(filename) < LineReader.parallel_min_bytes or workers == 1 :
+            with open(filename, 'r', encoding="utf-8") as f :
+                yield from LineReader.iter_lines(f, start, max_line_length)
+            return
+
+        n_workers = workers if workers is not None else (os.cpu_count() or 1)
+        bounds = LineReader._chunk_bounds(filename, n_workers * LineReader.chunks_per_worker)
+        with ProcessPoolExecutor(max_workers=n_workers) as executor :
+            futures = [executor.submit(LineReader.process_chunk, filename, b_start, b_end, max_line_length) for (b_start, b_end) in bounds]
+            lineno_base = start
+            for fut in futures :
+                chunk_lines, n_lines, errs = fut.result()
+                for err in errs :
+                    err._shift_linenos(lineno_base)
+                    mfdglobals.mv.instance().add_error(err)
+                for l in chunk_lines :
+                    l.lineno += lineno_base
+                    yield l
+                lineno_base += n_lines
+
+    @staticmethod
+    def iter_mmap_lines(filename: str, start: int = 0, encoding: str = "utf-8", max_line_length: Optional[int] = MAX_LINE_LENGTH) -> Iterator[Line] :
+        """Memory-maps a file and lazily yields span-based Line objects from it.
+
+        Each Line stores only byte offsets into the mapped file instead of its own
+        strings, which are decoded again when needed (e.g. by `get_content`).
+        Lines are split on "\n", "\r\n" and a lone "\r", as in text mode.
+
+        This saves memory, not work: every line is still decoded and run through
+        `process_line` once, and decoded again on each later access. The map is
+        not closed here, as the Lines read from it for as long as they exist; it
+        is released with the last of them."""
+        with open(filename, 'rb') as f :
+            if os.fstat(f.fileno()).st_size == 0 :
+                return
+            # the map keeps its own handle, so it outlives the file object for as long as Lines refer to it.
+            source = LineSource(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), encoding)
+
+        buf = source.buffer
+        buf_len = len(buf)
+        pos = 0
+        idx = start
+        while pos < buf_len :
+            nl = buf.find(b"\n", pos)
+            end = buf_len if nl == -1 else nl + 1
+            cr = buf.find(b"\r", pos, end - 1)
+            if cr != -1 and cr != nl - 1 :
+                # a lone carriage return also ends a line ("\r\n" ends one with its "\n").
+                end = cr + 1
+            line = source.get(pos, end)
+            p_line = LineReader.process_line(line, idx, max_line_length)
+            if p_line is not None :
+                p_line._attach_source(source, pos, end, line)
+                yield p_line
+            pos = end
+            idx += 1
+
+    @staticmethod
+    def process_line(line: str, lineno: int, max_line_length: Optional[int] = MAX_LINE_LENGTH) -> Optional[Line] :
         """Given a line string and its line number, attempts to create a Line object containing all of its features.
         
         Features include whether there is an inline comment and whether there are any LaTeX blocks.
         
         Output are Line objects of their relevant subclass, which includes `CommentLine`s, `MacroLine`s, `NovelDetailLine`s, and `ContinueLine`s.
-        Currently only returns None in the case of an At-At line (which are currently being ignored entirely) or if the line is empty."""
+        Currently only returns None in the case of an At-At line (which are currently being ignored entirely), if the line is empty,
+        or if it is longer than max_line_length characters, which is reported as LineTooLong."""
+        if max_line_length is not None and len(line) > max_line_length :
+            mfdglobals.mv.instance().add_error(LineTooLong(lineno, len(line), max_line_length))
+            return None
+
         if line.strip() == "" :
             return None
 
         if LineReader.is_comment_line(line) :
             return CommentLine(lineno, line)
 
-        poss_inline = LineReader.find_possible_inline_comments(line)
-        poss_tex = LineReader.find_possible_latex(line)
-        poss_macro = LineReader.find_macro_uses(line)
+        poss_inline, poss_tex, poss_macro = LineTokenizer.find_spans(line)
 
         if LineReader.is_macro_def_line(line) :
             mname, mbody = LineReader.find_macro_name_body(line)
-            return MacroLine(lineno, line, mname, mbody, poss_inline, poss_tex, poss_macro)
+            body_offset = len(DetailStatics.macro_header) + len(mname) + 1
+            return MacroLine(lineno, line, mname, mbody, poss_inline, poss_tex, poss_macro, body_offset)
 
         # atat is currently being redefined.
         if LineReader.is_atat_line(line) :
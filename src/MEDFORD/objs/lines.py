@@ -1,4 +1,5 @@
-from typing import List, Tuple, Dict
+from enum import IntEnum
+from typing import Any, List, Sequence, Tuple, Dict, Optional
 
 # new plan:
 # three ABCs, Line, Content, and Templateable
@@ -22,18 +23,65 @@ from typing import List, Tuple, Dict
 # Mixins                        #
 #################################
 class ContentMixin() :
-    raw_content:str 
+    # A mixin can't hold slots next to Line's own, so the concrete Line classes
+    #   declare _content_slots themselves.
+    __slots__ = ()
+    _content_slots = ('_raw_content', '_content_span', 'offset', 'has_inline', 'has_tex', 'has_macros',
+                      'comm_str', 'comm_loc', 'tex_locs', 'macro_uses', '_plan')
 
-    offset: int = -1
+    _raw_content: str
+    _content_span: Optional[Tuple[int, int]]
 
-    has_inline: bool = False
-    has_tex: bool = False
-    has_macros: bool = False
+    offset: int
 
-    comm_str: str = ""
-    comm_loc: int = -1
-    tex_locs: List[Tuple[int, int]] = []
-    macro_uses: List[Tuple[int,int,str]] = []
+    has_inline: bool
+    has_tex: bool
+    has_macros: bool
+
+    comm_str: str
+    comm_loc: int
+    tex_locs: Sequence[Tuple[int, int]]
+    macro_uses: Sequence[Tuple[int,int,str]]
+    _plan: Optional[Tuple[str, ...]]
+
+    def __init__(self, lineno: int, line: str) :
+        super().__init__(lineno, line) # type: ignore
+        self._content_span = None
+        self.offset = -1
+        self.has_inline = False
+        self.has_tex = False
+        self.has_macros = False
+        self.comm_str = ""
+        self.comm_loc = -1
+        self.tex_locs = ()
+        self.macro_uses = ()
+        self._plan = None
+
+    @property
+    def raw_content(self) -> str :
+        if self._content_span is not None :
+            return self._source.get(*self._content_span)
+        return self._raw_content
+
+    @raw_content.setter
+    def raw_content(self, value: str) -> None :
+        self._raw_content = value
+        self._content_span = None
+        self._plan = None
+
+    def _attach_source(self, source: 'LineSource', start: int, end: int, full_line: str) -> None :
+        # the content keeps its own span, so that truncating line for an inline
+        #   comment does not change raw_content.
+        raw = self._raw_content
+        content_start = start + len(full_line[:self.offset].encode(source.encoding))
+        if self.offset + len(raw) == len(full_line) :
+            content_end = end
+        else :
+            content_end = content_start + len(raw.encode(source.encoding))
+        self._content_span = (content_start, content_end)
+        del self._raw_content
+
+        super()._attach_source(source, start, end, full_line) # type: ignore
 
     # TODO: is this the right place to put this?
     #           line is technically undefined...
@@ -50,9 +98,13 @@ class ContentMixin() :
         new_macro = [(x - self.offset, y - self.offset, name) for (x,y,name) in poss_macro]
         return (new_com, new_tex, new_macro)
 
-    def resolve_comm_tex_macro_logic(self, poss_com: List[int], poss_tex: List[Tuple[int,int]], poss_macro: List[Tuple[int,int,str]]) -> None :
+    def resolve_comm_tex_macro_logic(self, poss_com: List[int], poss_tex: List[Tuple[int,int]], poss_macro: List[Tuple[int,int,str]], offset: Optional[int] = None) -> None :
         # adjust to raw_content positions
-        self._get_raw_content_offset()
+        # if the caller already knows where raw_content starts, skip searching for it.
+        if offset is None :
+            self._get_raw_content_offset()
+        else :
+            self.offset = offset
         (poss_com, poss_tex, poss_macro) = self._offset_positions(poss_com, poss_tex, poss_macro)
 
         if len(poss_com) > 0 and len(poss_tex) > 0 :
@@ -69,24 +121,33 @@ class ContentMixin() :
 
         return
 
-    def recurse_comm_tex_overlap(self, poss_com: List[int], poss_tex: List[Tuple[int, int]]) -> Tuple[int, List[Tuple[int, int]]]:
-        """
-        Recursive helper function for deconvolute_comm_tex.
+    def sweep_comm_tex_overlap(self, poss_com: List[int], poss_tex: List[Tuple[int, int]]) -> Tuple[int, List[Tuple[int, int]]]:
         """
-        if len(poss_com) == 0 :
-            return(-1, poss_tex)
-        elif len(poss_tex) == 0 :
-            return(poss_com[0], [])
-
-        if poss_com[0] < poss_tex[0][0] :
-            return (poss_com[0], [])
+        Helper function for deconvolute_comm_tex. Walks both (sorted) lists once, in step:
+        a possible comment inside a TeX block is skipped, and the first one that is not
+        is the inline comment; TeX blocks after it are dropped.
 
-        elif poss_tex[0][0] < poss_com[0] < poss_tex[0][1] :
-            return self.recurse_comm_tex_overlap(poss_com[1:], poss_tex)
+        Returns the location of the inline comment (-1 if there is none) and the true TeX blocks.
+        """
+        kept: List[Tuple[int, int]] = []
+        i_com = 0
+        i_tex = 0
+        while i_com < len(poss_com) :
+            if i_tex == len(poss_tex) :
+                return (poss_com[i_com], kept)
+
+            com = poss_com[i_com]
+            (tex_start, tex_end) = poss_tex[i_tex]
+            if com < tex_start :
+                return (com, kept)
+            elif tex_start < com < tex_end :
+                i_com += 1
+            else :
+                kept.append(poss_tex[i_tex])
+                i_tex += 1
 
-        else :
-            next_loop_ret = self.recurse_comm_tex_overlap(poss_com, poss_tex[1:])
-            return (next_loop_ret[0], [poss_tex[0]] + next_loop_ret[1])
+        kept.extend(poss_tex[i_tex:])
+        return (-1, kept)
 
     def deconvolute_comm_tex(self, poss_com: List[int], poss_tex: List[Tuple[int, int]]) -> None :
         """
@@ -115,7 +176,7 @@ class ContentMixin() :
         $$ TeX 1 $$ # inline $$ TeX 2$$ -> yes inline, one tex (first) \\
         $$ TeX # inline $$ -> no inline, one tex
         """
-        results = self.recurse_comm_tex_overlap(poss_com, poss_tex)
+        results = self.sweep_comm_tex_overlap(poss_com, poss_tex)
         if results[0] == -1 :
             self.has_inline = False
         else :
@@ -130,42 +191,41 @@ class ContentMixin() :
             self.has_tex = True
             self.tex_locs = results[1]
     
-    def recurse_macro_tex_overlap(self, poss_macro: List[Tuple[int, int, str]], poss_tex: List[Tuple[int,int]]) -> List[Tuple[int, int, str]] :
-        if len(poss_macro) == 0 :
-            return([])
-        elif len(poss_tex) == 0 :
-            return(poss_macro)
-        
-        elif poss_macro[0][0] < poss_tex[0][0] : # this macro is fine, move on to next MAC
-            next_loop_ret = self.recurse_macro_tex_overlap(poss_macro[1:], poss_tex)
-            return [poss_macro[0]] + next_loop_ret
-        
-        elif poss_tex[0][0] < poss_macro[0][0] < poss_tex[0][1] : # this macro invalid, move on to next MAC
-            return self.recurse_macro_tex_overlap(poss_macro[1:], poss_tex)
-        
-        else : # don't know if macro is fine yet, move to next TEX
-            return self.recurse_macro_tex_overlap(poss_macro, poss_tex[1:])
+    def sweep_macro_tex_overlap(self, poss_macro: List[Tuple[int, int, str]], poss_tex: List[Tuple[int,int]]) -> List[Tuple[int, int, str]] :
+        """
+        Returns the macro uses that do not start inside a TeX block, walking both (sorted) lists once.
+        """
+        kept: List[Tuple[int, int, str]] = []
+        i_mac = 0
+        i_tex = 0
+        while i_mac < len(poss_macro) and i_tex < len(poss_tex) :
+            mac_start = poss_macro[i_mac][0]
+            (tex_start, tex_end) = poss_tex[i_tex]
+            if mac_start < tex_start :
+                kept.append(poss_macro[i_mac])
+                i_mac += 1
+            elif tex_start < mac_start < tex_end :
+                i_mac += 1
+            else :
+                i_tex += 1
+
+        kept.extend(poss_macro[i_mac:])
+        return kept
 
     def find_macro_uses(self, poss_macro: List[Tuple[int,int,str]]) -> None :
-        ind_last : int = -1
+        # only the macro uses before an inline comment are part of the content.
+        n_uses : int = len(poss_macro)
         if self.has_inline :
-            for i in range(0, len(poss_macro)) :
-                if poss_macro[i][0] > self.comm_loc :
-                    ind_last = i
-                    break
-        else :
-            ind_last = len(poss_macro) - 1
-        
-        if ind_last >= 0 :
-            if self.has_tex :
-                # iterate thru
-                deconv_results = self.recurse_macro_tex_overlap(poss_macro[:ind_last], self.tex_locs)
-                if len(deconv_results) > 0 :
-                    self.has_macros = True
-                    self.macro_uses = deconv_results
-            else :
-                self.has_macros = True
-                self.macro_uses = poss_macro[:ind_last+1]
+            n_uses = 0
+            while n_uses < len(poss_macro) and poss_macro[n_uses][0] < self.comm_loc :
+                n_uses += 1
+
+        uses = poss_macro[:n_uses]
+        if self.has_tex :
+            uses = self.sweep_macro_tex_overlap(uses, self.tex_locs)
+        if len(uses) > 0 :
+            self.has_macros = True
+            self.macro_uses = uses
 
     def replace_macros(self, macro_defs: Dict[str, str]) -> None :
         # TODO: add tests to make sure macro_uses is in first->last order
@@ -181,24 +241,69 @@ class ContentMixin() :
             self.line = self.line[:cur_macro_pos[0]] + macro_defs[cur_macro_name] + self.line[cur_macro_pos[1]:]
 
     def get_content(self, macro_defs: Dict[str, str], remove_comments = True) -> str :
+        if not self.has_macros or len(self.macro_uses) == 0 :
+            if remove_comments :
+                return self.remove_inline_comment()
+            return self.raw_content
+
         if remove_comments :
-            temp_content = self.remove_inline_comment()
+            plan = self.get_content_plan()
         else :
-            temp_content = self.raw_content
+            plan = self._compile_plan(self.raw_content)
+        return ContentMixin.fill_plan(plan, macro_defs)
 
+    def get_content_length(self, macro_lengths: Dict[str, int], remove_comments = True) -> int :
+        """Returns the length get_content would return, given the length of each
+        macro's content, without building the string."""
         if not self.has_macros or len(self.macro_uses) == 0 :
-            return temp_content
-        else :
-            n_macro_uses: int = len(self.macro_uses)
-            out = temp_content
-            for i in range(0, n_macro_uses) :
-                cur_macro:Tuple[int, int, str] = self.macro_uses[n_macro_uses - i - 1]
-                cur_macro_pos: Tuple[int, int] = (cur_macro[0], cur_macro[1])
-                cur_macro_name: str = cur_macro[2]
-
-                out = out[:cur_macro_pos[0]] + macro_defs[cur_macro_name] + out[cur_macro_pos[1]:]
+            if remove_comments :
+                return len(self.remove_inline_comment())
+            return len(self.raw_content)
 
-            return out
+        if remove_comments :
+            plan = self.get_content_plan()
+        else :
+            plan = self._compile_plan(self.raw_content)
+        n = 0
+        for i in range(0, len(plan)) :
+            n += macro_lengths[plan[i]] if i % 2 == 1 else len(plan[i])
+        return n
+
+    def get_content_plan(self) -> Tuple[str, ...] :
+        """Returns the content (without inline comment) as a substitution plan.
+
+        The plan alternates literal segments (even indices) and the names of the
+        macros to substitute between them (odd indices), e.g.
+        ("a ", "Macro", " b"). It is compiled the first time it is needed."""
+        if self._plan is None :
+            if self.has_inline :
+                # compiled on the unstripped content, as the macro positions are
+                #   relative to it; then stripped like remove_inline_comment.
+                plan = list(self._compile_plan(self.raw_content[:self.comm_loc]))
+                plan[0] = plan[0].lstrip()
+                plan[-1] = plan[-1].rstrip()
+                self._plan = tuple(plan)
+            else :
+                self._plan = self._compile_plan(self.raw_content)
+        return self._plan
+
+    def _compile_plan(self, content: str) -> Tuple[str, ...] :
+        plan: List[str] = []
+        prev_end = 0
+        for (start, end, name) in self.macro_uses :
+            plan.append(content[prev_end:start])
+            plan.append(name)
+            prev_end = end
+        plan.append(content[prev_end:])
+        return tuple(plan)
+
+    @staticmethod
+    def fill_plan(plan: Tuple[str, ...], macro_defs: Dict[str, str]) -> str :
+        """Builds the string for a substitution plan, given the content of each macro."""
+        parts = list(plan)
+        for i in range(1, len(parts), 2) :
+            parts[i] = macro_defs[parts[i]]
+        return "".join(parts)
         
     def remove_inline_comment(self) -> str :
         if self.has_inline :
@@ -213,13 +318,81 @@ class ContentMixin() :
 # Classes                       #
 #################################
 
+class LineSource() :
+    """Read-only buffer, such as a memory-mapped file, that span-based Lines take their text from.
+
+    Lines attached to a LineSource store only (start, end) byte offsets into it; their
+    strings are decoded on demand. Windows and old Mac line endings are returned as a
+    plain newline, as they would be when reading the file in text mode."""
+    buffer: Any
+    encoding: str
+
+    def __init__(self, buffer: Any, encoding: str = "utf-8") :
+        self.buffer = buffer
+        self.encoding = encoding
+
+    def __getstate__(self) -> Tuple[bytes, str] :
+        # a memory map cannot be pickled; the Lines pointing into it keep working on a copy
+        return (bytes(self.buffer), self.encoding)
+
+    def __setstate__(self, state: Tuple[bytes, str]) -> None :
+        self.buffer, self.encoding = state
+
+    def get(self, start: int, end: int) -> str :
+        out = self.buffer[start:end].decode(self.encoding)
+        if out.endswith("\r\n") :
+            out = out[:-2] + "\n"
+        elif out.endswith("\r") :
+            out = out[:-1] + "\n"
+        return out
+
+class LineKind(IntEnum) :
+    """Tag of each kind of Line, set by its class (Line.kind). The LineCollector
+    dispatches on it with a dict lookup rather than a chain of isinstance checks."""
+    # an IntEnum, as a plain Enum hashes in Python; these are hashed for every line.
+    COMMENT = 0
+    MACRO = 1
+    DETAIL = 2
+    ATAT = 3
+    CONTINUE = 4
+
 class Line() :
+    __slots__ = ('lineno', '_line', '_source', '_span')
+
+    kind: LineKind # class attribute of each subclass
     lineno: int
-    line: str
+    _line: str
+    _source: Optional[LineSource]
+    _span: Optional[Tuple[int, int]]
 
     def __init__(self, lineno : int, line : str) :
         self.lineno = lineno
-        self.line = line
+        self._line = line
+        self._source = None
+        self._span = None
+
+    @property
+    def line(self) -> str :
+        if self._span is not None and self._source is not None :
+            return self._source.get(*self._span)
+        return self._line
+
+    @line.setter
+    def line(self, value: str) -> None :
+        self._line = value
+        self._span = None
+
+    def _attach_source(self, source: LineSource, start: int, end: int, full_line: str) -> None :
+        """Replaces the strings held by this Line with offsets into source.
+        
+        full_line is the decoded text of source[start:end] that the Line was created from."""
+        self._source = source
+        if len(self._line) == len(full_line) :
+            self._span = (start, end)
+        else :
+            # line was truncated at an inline comment; still a prefix of full_line.
+            self._span = (start, start + len(self._line.encode(source.encoding)))
+        del self._line
     
     def __eq__(self, other) -> bool :
         if type(self) == type(other) :
@@ -231,6 +404,10 @@ class Line() :
         return self.lineno
 
 class CommentLine(Line) :
+    __slots__ = ()
+
+    kind = LineKind.COMMENT
+
     def __init__(self, lineno: int, line: str) :
         super(CommentLine, self).__init__(lineno, line)
 
@@ -239,15 +416,19 @@ class CommentLine(Line) :
     # TODO : complete
 
 class MacroLine(ContentMixin, Line) :
+    __slots__ = ContentMixin._content_slots + ('macro_name',)
+
+    kind = LineKind.MACRO
+
     macro_name: str
 
-    def __init__(self, lineno: int, line: str, macro_name:str, macro_body:str, poss_inline, poss_tex, poss_macro) :
+    def __init__(self, lineno: int, line: str, macro_name:str, macro_body:str, poss_inline, poss_tex, poss_macro, body_offset: Optional[int] = None) :
         super(MacroLine, self).__init__(lineno, line)
         self.macro_name = macro_name
         self.raw_content = macro_body
 
         # [1:] is to skip the macro that this line itself is defining
-        self.resolve_comm_tex_macro_logic(poss_inline, poss_tex, poss_macro[1:])
+        self.resolve_comm_tex_macro_logic(poss_inline, poss_tex, poss_macro[1:], body_offset)
     
     def __eq__(self, other) -> bool:
         if type(self) == type(other) and self.macro_name == other.macro_name and \
@@ -258,6 +439,10 @@ class MacroLine(ContentMixin, Line) :
 
 
 class NovelDetailLine(ContentMixin, Line) :
+    __slots__ = ContentMixin._content_slots + ('major_tokens', 'minor_token')
+
+    kind = LineKind.DETAIL
+
     major_tokens: List[str]
     minor_token: str
 
@@ -268,7 +453,9 @@ class NovelDetailLine(ContentMixin, Line) :
         self.minor_token = minor
         self.raw_content = payload
 
-        self.resolve_comm_tex_macro_logic(poss_inline, poss_tex, poss_macro)
+        # the payload is normally the rest of the line after the tokens
+        payload_offset = len(line) - len(payload) if line.endswith(payload) else None
+        self.resolve_comm_tex_macro_logic(poss_inline, poss_tex, poss_macro, payload_offset)
 
     def __eq__(self, other) -> bool :
         if type(self) == type(other) and self.major_tokens == other.major_tokens and \
@@ -278,6 +465,10 @@ class NovelDetailLine(ContentMixin, Line) :
         return False
 
 class AtAtLine(NovelDetailLine) :
+    __slots__ = ('referenced_majors',)
+
+    kind = LineKind.ATAT
+
     major_tokens: List[str]
     referenced_majors: List[str]
 
@@ -290,12 +481,16 @@ class AtAtLine(NovelDetailLine) :
         return self.get_content(macro_defs)
 
 class ContinueLine(ContentMixin, Line) :
+    __slots__ = ContentMixin._content_slots
+
+    kind = LineKind.CONTINUE
+
     # TODO : complete
     def __init__(self, lineno: int, line: str, poss_inline, poss_tex, poss_macro) :
         super(ContinueLine, self).__init__(lineno, line)
         self.raw_content = line
         
-        self.resolve_comm_tex_macro_logic(poss_inline, poss_tex, poss_macro)
+        self.resolve_comm_tex_macro_logic(poss_inline, poss_tex, poss_macro, 0)
 
     def __eq__(self, other) -> bool :
         if type(self) == type(other) and self.raw_content == other.raw_content :
@@ -1,5 +1,8 @@
 from enum import Enum
-from typing import List, Optional, Tuple
+from typing import Collection, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING :
+    from MEDFORD.objs.lineindex import Position
 
 class ErrType(Enum) :
     OTHER = "other"
@@ -14,6 +17,7 @@ class MFDErr():
     errtype: ErrType
     msg: str # verbose-ish error message
     helpmsg: str # extended error message for user help
+    position: Optional['Position'] = None # what covers the head line, see MedfordValidator.set_line_index
 
     def __init__(self, errname: str, msg: str, helpmsg: str) :
         #self.lineobjs = lineobjs
@@ -28,6 +32,10 @@ class MFDErr():
     def get_lineno_range(self) -> Tuple[int, int] :
         raise NotImplementedError("also not implemented. :)")
     
+    def _shift_linenos(self, n: int) -> None :
+        # for errors found on a part of a file, e.g. by a worker process
+        raise NotImplementedError("not implemented for %s" % type(self).__name__)
+
     def _overwrite_msg(self, msg:str) -> None :
         self.msg = msg
     
@@ -121,12 +129,17 @@ class MissingContent(MFDErr) :
     def get_lineno_range(self) -> Tuple[int, int]:
         return self.lineno_range
 
+    def _shift_linenos(self, n: int) -> None :
+        self.lineno_head += n
+        self.lineno_range = (self.lineno_range[0] + n, self.lineno_range[1] + n)
+
 
 # Specific Error Types: Other
 class MaxMacroDepthExceeded(MFDErr) :
     lineno_all_flat: List[int] # list of ALL involved line no's
     lineno_all_2d: List[List[int]] # list of all involved line no's, split by macro
     lineno_head_each_macro: List[int] # list of only head line of each macro
+    is_loop: bool # macros[0] uses itself, through macros[1:-1]
 
     def __init__(self, macroobjs: List) :
         self.errtype = ErrType.OTHER
@@ -141,19 +154,27 @@ class MaxMacroDepthExceeded(MFDErr) :
 
         self.macros : List[Macro] = macroobjs_typed
 
+        # a reference loop is passed as e.g. [A, B, A]
+        self.is_loop = len(macroobjs_typed) > 1 and macroobjs_typed[0] is macroobjs_typed[-1]
+        distinct: List[Macro] = macroobjs_typed[:-1] if self.is_loop else macroobjs_typed
+
         self.lineno_all_2d = []
         self.lineno_all_flat = []
         self.lineno_head_each_macro = []
-        for (idx, mo) in enumerate(macroobjs_typed) :
+        for (idx, mo) in enumerate(distinct) :
             lns = mo.get_linenos()
             self.lineno_all_2d.append(lns)
             self.lineno_all_flat.extend(lns)
             self.lineno_head_each_macro.append(lns[0])
         
-        message: str = f"Macro {self.macros[0].name} on line {self.lineno_head_each_macro[0]} is 11 references deep in a macro reference chain. (Macro history: %s)" % '->'.join([m.name for m in self.macros])
-        helpmsg: str = "You can use a macro within a macro only up to 10 macros deep. You may have an loop of references (e.g. macro 1 uses macro 2, but macro 2 uses macro 1), or you need to reduce the number of layers. The full text of your macro reference is below: \n"
-        for i in range(0, len(self.macros)) :
-            helpmsg = helpmsg + "Lines (%d-%d): (%s) %s\n" % (self.lineno_all_2d[i][0], self.lineno_all_2d[i][-1], self.macros[i].name, self.macros[i].get_raw_content())
+        if self.is_loop :
+            message: str = f"Macro {self.macros[0].name} on line {self.lineno_head_each_macro[0]} is part of a loop of macro references. (Macro loop: %s)" % '->'.join([m.name for m in self.macros])
+            helpmsg: str = "A macro cannot use itself, directly or through other macros. Remove one of the references in the loop. The full text of the macros in the loop is below: \n"
+        else :
+            message: str = f"Macro {self.macros[0].name} on line {self.lineno_head_each_macro[0]} is 11 references deep in a macro reference chain. (Macro history: %s)" % '->'.join([m.name for m in self.macros])
+            helpmsg: str = "You can use a macro within a macro only up to 10 macros deep. You may have an loop of references (e.g. macro 1 uses macro 2, but macro 2 uses macro 1), or you need to reduce the number of layers. The full text of your macro reference is below: \n"
+        for i in range(0, len(distinct)) :
+            helpmsg = helpmsg + "Lines (%d-%d): (%s) %s\n" % (self.lineno_all_2d[i][0], self.lineno_all_2d[i][-1], distinct[i].name, distinct[i].get_raw_content())
 
         super(MaxMacroDepthExceeded, self).__init__(type(self).__name__, message, helpmsg)
 
@@ -163,6 +184,61 @@ class MaxMacroDepthExceeded(MFDErr) :
     def get_lineno_range(self) -> Tuple[int]:
         raise NotImplementedError("ahh")
 
+class MacroExpansionLimitExceeded(MFDErr) :
+    lineno_all: List[int]
+    expanded_length: int # characters expanded so far in the file, including this collection
+
+    def __init__(self, collectionobj, expanded_length: int, limit: str) :
+        self.errtype = ErrType.OTHER
+
+        from MEDFORD.objs.linecollections import LineCollection, Macro
+
+        if not isinstance(collectionobj, LineCollection) :
+            raise ValueError("Attempted to create a MacroExpansionLimitExceeded without a Macro or Detail.")
+
+        self.collection = collectionobj
+        self.expanded_length = expanded_length
+        self.lineno_all = collectionobj.get_linenos()
+
+        if isinstance(collectionobj, Macro) :
+            what = f"Macro {collectionobj.name}"
+        else :
+            what = "Detail"
+        message: str = f"{what} on line {self.lineno_all[0]} brings the expanded macro content of the file to {expanded_length} characters, over the limit of {limit}."
+        helpmsg: str = "A macro that uses another macro several times grows very quickly when nested (a macro using another one twice, 10 levels deep, is 1024 times as long). Reduce how often macros are repeated inside other macros. The text that went over the limit is: \n"
+        helpmsg = helpmsg + "Lines (%d-%d): %s\n" % (self.lineno_all[0], self.lineno_all[-1], collectionobj.get_raw_content())
+
+        super(MacroExpansionLimitExceeded, self).__init__(type(self).__name__, message, helpmsg)
+
+    def get_head_lineno(self) -> int:
+        return self.lineno_all[0]
+
+    def get_lineno_range(self) -> Tuple[int, int]:
+        return (self.lineno_all[0], self.lineno_all[-1])
+
+class LineTooLong(MFDErr) :
+    lineno: int
+    length: int
+
+    def __init__(self, lineno: int, length: int, limit: int) :
+        self.errtype = ErrType.SYNTAX
+
+        self.lineno = lineno
+        self.length = length
+
+        message: str = f"Line is {length} characters long, over the limit of {limit}; it was skipped."
+        helpmsg: str = "Very long lines are not read, to bound the time spent on any one line. Split the content over several lines with continuation lines, or raise the limit with --max-line-length."
+        super(LineTooLong, self).__init__(type(self).__name__, message, helpmsg)
+
+    def get_head_lineno(self) -> int:
+        return self.lineno
+
+    def get_lineno_range(self) -> Tuple[int, int]:
+        return (self.lineno, self.lineno)
+
+    def _shift_linenos(self, n: int) -> None :
+        self.lineno += n
+
 # Specific error types: Content
 
 
@@ -210,6 +286,59 @@ class MissingRequiredField(MFDErr) :
             raise ValueError("Attempted to get a lineno range of a {self.__name__} error that does not have a Block.")
     pass
 
+class MissingRequiredBlock(MFDErr) :
+    # A required major token that has no Block at all, so there is no line
+    #   to point to; reported on line 0.
+    major_token: str
+
+    def __init__(self, major_token: str) :
+        self.errtype = ErrType.PYDANTIC
+
+        self.major_token = major_token
+
+        message: str = f"The file has no Block for the required major token {self.major_token}."
+        helpmsg: str = f"MEDFORD files must contain at least one {self.major_token} Block, which starts with a line like:\n@{self.major_token} (name of this medford block)"
+
+        super(MissingRequiredBlock, self).__init__(type(self).__name__, message, helpmsg)
+
+    def get_head_lineno(self) -> int:
+        return 0
+
+    def get_lineno_range(self) -> Tuple[int, int]:
+        return (0, 0)
+
+class OtherPydanticError(MFDErr) :
+    # A pydantic error that no more specific error type describes, reported with
+    #   pydantic's own message on the first line of its Block, if it has one.
+    pydantic_type: str
+    loc: Tuple
+
+    def __init__(self, pydantic_err: dict, block_inp = None) :
+        self.errtype = ErrType.PYDANTIC
+
+        from MEDFORD.objs.linecollections import Block
+
+        self.block : Optional[Block] = block_inp if isinstance(block_inp, Block) else None
+        self.pydantic_type = pydantic_err.get('type', "unknown")
+        self.loc = tuple(pydantic_err.get('loc', ()))
+
+        where: str = "-".join(str(l) for l in self.loc if isinstance(l, str))
+        message: str = f"{where}: {pydantic_err.get('msg', self.pydantic_type)}" if where != "" else pydantic_err.get('msg', self.pydantic_type)
+        helpmsg: str = f"The model rejected this content ({self.pydantic_type})."
+
+        super(OtherPydanticError, self).__init__(type(self).__name__, message, helpmsg)
+
+    def get_head_lineno(self) -> int:
+        if self.block is not None :
+            return self.block.get_linenos()[0]
+        return 0
+
+    def get_lineno_range(self) -> Tuple[int, int]:
+        if self.block is not None :
+            temp_lines: List[int] = self.block.get_linenos()
+            return (temp_lines[0], temp_lines[-1])
+        return (0, 0)
+
 class MissingRequiredFieldbcofLogic(MissingRequiredField) :
     def __init__(self, block_inp, missing_token:str, token_logic_str:str) :
         super(MissingRequiredFieldbcofLogic, self).__init__(block_inp, missing_token)
@@ -267,6 +396,44 @@ class InvalidValue(MFDErr) :
     pass
 
 
+class DuplicateBlockName(MFDErr) :
+    # A Block with the same major token and name as an earlier one, when
+    #   duplicates are errors (see DuplicatePolicy).
+    major_token: str
+    name: str
+
+    lineno_head: int
+    lineno_range: Tuple[int, int]
+    lineno_first: int # head line of the earlier Block
+
+    def __init__(self, block_inp, first_inp) :
+        self.errtype = ErrType.OTHER
+
+        from MEDFORD.objs.linecollections import Block
+
+        if not isinstance(block_inp, Block) or not isinstance(first_inp, Block) :
+            raise ValueError("Attempted to create a DuplicateBlockName without two Blocks.")
+
+        self.block: Block = block_inp
+        self.major_token = block_inp.get_str_major()
+        self.name = block_inp.name
+
+        lineno_all = block_inp.get_linenos()
+        self.lineno_range = (min(lineno_all), max(lineno_all))
+        self.lineno_head = self.lineno_range[0]
+        self.lineno_first = first_inp.get_linenos()[0]
+
+        message: str = f"Block {self.major_token}@{self.name} on line {self.lineno_head} has the same name as the Block on line {self.lineno_first}."
+        helpmsg: str = f"Each {self.major_token} Block needs a name of its own, or only one of them is kept. Rename one of them, or use --duplicates merge to combine their details into one Block."
+
+        super(DuplicateBlockName, self).__init__(type(self).__name__, message, helpmsg)
+
+    def get_head_lineno(self) -> int:
+        return self.lineno_head
+
+    def get_lineno_range(self) -> Tuple[int, int]:
+        return self.lineno_range
+
 class MissingAtAtName(MFDErr) :
     major_token: str
     referenced_major: str
@@ -295,14 +462,14 @@ class AtAtReferencedDoesNotExist(MFDErr) :
     referenced_major: str
     referenced_name: str
 
-    named_blocks: List[str]
+    named_blocks: Collection[str]
 
     lineno_head : int
     lineno_range: Tuple[int, int]
     lineno_all: List[int]
 
     # TODO: add Blcok to give lineno range of block?
-    def __init__(self, atat_inp, referenced_name: str, named_blocks: List[str]) :
+    def __init__(self, atat_inp, referenced_name: str, named_blocks: Collection[str]) :
         self.errtype = ErrType.MALFORMED_CONTENT
 
         from MEDFORD.objs.linecollections import AtAt
@@ -336,4 +503,41 @@ class AtAtReferencedDoesNotExist(MFDErr) :
             return (temp_lines[0], temp_lines[-1])
         else :
             raise ValueError("Attempted to get a head lineno of a {self.__name__} error that does not have an atat object.")
-        
\ No newline at end of file
+
+# Errors rebuilt from a cache
+
+class CachedError(MFDErr) :
+    """An error as kept in a ResultCache: its name, type, messages and line numbers,
+    without the Lines, Details or Blocks it was found on."""
+    lineno_head: Optional[int]
+    lineno_range: Optional[Tuple[int, int]]
+
+    def __init__(self, errname: str, errtype: ErrType, msg: str, helpmsg: str, lineno_head: Optional[int], lineno_range: Optional[Tuple[int, int]]) :
+        self.errtype = errtype
+        self.lineno_head = lineno_head
+        self.lineno_range = lineno_range
+        super(CachedError, self).__init__(errname, msg, helpmsg)
+
+    @classmethod
+    def of(cls, err: MFDErr) -> 'CachedError' :
+        if isinstance(err, CachedError) :
+            return err
+        try :
+            lineno_head: Optional[int] = err.get_head_lineno()
+        except (NotImplementedError, ValueError) :
+            lineno_head = None
+        try :
+            lineno_range: Optional[Tuple[int, int]] = err.get_lineno_range()
+        except (NotImplementedError, ValueError) :
+            lineno_range = None
+        return cls(err.errname, err.errtype, err.msg, err.helpmsg, lineno_head, lineno_range)
+
+    def get_head_lineno(self) -> int :
+        if self.lineno_head is None :
+            raise NotImplementedError("not known for a cached %s" % self.errname)
+        return self.lineno_head
+
+    def get_lineno_range(self) -> Tuple[int, int] :
+        if self.lineno_range is None :
+            raise NotImplementedError("not known for a cached %s" % self.errname)
+        return self.lineno_range
@@ -63,6 +63,26 @@ class AtAtWarning(MFDWarning) :
 
         super().__init__(msg, help_msg, lines)
 
+class UnusedMacroWarning(MFDWarning) :
+    def __init__(self, macro_name: str, lines: Union[List[int], int]) :
+        msg: str = f"Macro {macro_name} is defined but never used."
+        help_msg: str = f"No detail uses the macro {macro_name}, directly or through another macro. It can be removed, unless it is kept for other files to copy."
+
+        super().__init__(msg, help_msg, lines)
+
+class DuplicateBlockWarning(MFDWarning) :
+    def __init__(self, block_name: str, first_line: int, lines: Union[List[int], int]) :
+        msg: str = f"Block {block_name} replaces the Block of the same name on line {first_line}."
+        help_msg: str = f"Only the last Block named {block_name} is kept. Rename one of them, or use --duplicates merge to combine their details into one Block."
+
+        super().__init__(msg, help_msg, lines)
+
+class CachedWarning(MFDWarning) :
+    # a warning as kept in a ResultCache, named after the warning it was rebuilt from
+    def __init__(self, name: str, msg: str, help_msg: str, lines: Union[List[int], int]) :
+        super().__init__(msg, help_msg, lines)
+        self.name = name
+
 ################ ERRORS ################################################
 
 class MFDError(Notice) :
@@ -1,13 +1,22 @@
-from typing import Dict, List
-from MEDFORD.submodules.mfdvalidator.errors import MFDErr, ErrType, MissingRequiredField
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, TYPE_CHECKING
+from MEDFORD.submodules.mfdvalidator.errors import MFDErr, ErrType, MissingRequiredField, MissingRequiredBlock, OtherPydanticError
 import random
 
+if TYPE_CHECKING :
+    from MEDFORD.objs.lineindex import LineIndex
+
+# validator of the run in progress in the current thread or asyncio task, see MedfordValidator.context
+_current: "ContextVar[Optional[MedfordValidator]]" = ContextVar("medford_validator", default=None)
+
 class MedfordValidator(object):
     _instance = None
 
     _syntax_err_coll: Dict[int, List[MFDErr]]
     _other_err_coll: Dict[int, List[MFDErr]]
     _pydantic_err_coll: Dict[int, List[MFDErr]]
+    _get_line_index: Optional[Callable[[], 'LineIndex']]
     _id: float
 
     # TODO: error options, eg:
@@ -18,17 +27,43 @@ class MedfordValidator(object):
     @classmethod
     def init(cls) -> 'MedfordValidator': 
         print('Creating new MedfordErrorManager instance.')
-        MedfordValidator._instance = super(MedfordValidator, cls).__new__(cls)
-
-        MedfordValidator._instance._syntax_err_coll = {}
-        MedfordValidator._instance._other_err_coll = {}
-        MedfordValidator._instance._pydantic_err_coll = {}
-        MedfordValidator._instance._id = random.random()
+        MedfordValidator._instance = cls.new()
 
         return MedfordValidator._instance
 
+    @classmethod
+    def new(cls) -> 'MedfordValidator' :
+        """Creates a validator that is separate from the process-wide instance,
+        e.g. to collect the errors of a single MFD run. See context."""
+        v = super(MedfordValidator, cls).__new__(cls)
+        v._syntax_err_coll = {}
+        v._other_err_coll = {}
+        v._pydantic_err_coll = {}
+        v._get_line_index = None
+        v._id = random.random()
+        return v
+
+    @classmethod
+    @contextmanager
+    def context(cls, validator: Optional['MedfordValidator'] = None) -> Iterator['MedfordValidator'] :
+        """Makes validator (default: a new one) the one that instance() returns
+        in the current context, until the with block ends.
+
+        Contexts are per thread and per asyncio task, so runs in different threads
+        or tasks each report to their own validator instead of the shared one."""
+        v = validator if validator is not None else cls.new()
+        token = _current.set(v)
+        try :
+            yield v
+        finally :
+            _current.reset(token)
+
     @classmethod
     def instance(cls) -> 'MedfordValidator':
+        current = _current.get()
+        if current is not None :
+            return current
+
         # TODO: change into proper error?
         if MedfordValidator._instance is None :
             print('Warning: had to create error manager in instance call.')
@@ -36,7 +71,20 @@ class MedfordValidator(object):
             
         return MedfordValidator._instance
 
+    def set_line_index(self, get_index: Callable[[], 'LineIndex']) -> None :
+        """Points every error collected so far, and every one added from now on,
+        at what covers its head line (see MFDErr.position) in the LineIndex that
+        get_index returns. get_index is only called when there is an error to locate."""
+        self._get_line_index = get_index
+        for err in self.get_errors() :
+            self._locate(err)
+
+    def _locate(self, err: MFDErr) -> None :
+        if self._get_line_index is not None :
+            err.position = self._get_line_index().find(err.get_head_lineno())
+
     def add_error(self, err: MFDErr) :
+        self._locate(err)
         if err.errtype == ErrType.SYNTAX :
             self._add_syntax_err(err)
         elif err.errtype == ErrType.PYDANTIC :
@@ -101,18 +149,47 @@ class MedfordValidator(object):
     def n_pydantic_errs(self) -> int :
         return len(self._pydantic_err_coll)
 
-    def handle_pydantic_errors(self, errs):
+    def get_errors(self) -> List[MFDErr] :
+        """Returns every error collected so far."""
+        out: List[MFDErr] = []
+        for coll in (self._syntax_err_coll, self._other_err_coll, self._pydantic_err_coll) :
+            for errs in coll.values() :
+                out.extend(errs)
+        return out
+
+    def handle_pydantic_errors(self, errs, data: Optional[Dict] = None):
+        """Records the errors of a pydantic ValidationError. data, the dictionary
+        that was validated, is used to find the Block of errors of unknown types."""
         for e in errs.errors() :
-            if e['type'] == "missing" :
+            if e['type'] == "missing" and len(e['loc']) == 1 :
+                # a major token missing from the top level dictionary
+                self.add_error(MissingRequiredBlock(e['loc'][0]))
+            elif e['type'] == "missing" :
                 block_info = e['input']['Block']
                 missing_token = e['loc'][2]
                 # lock = (MAJOR, ?, MINOR) TODO: check in other cases
                 self.add_error(MissingRequiredField(block_info, missing_token))
 #            if e['type'] == "value_error" :
             else :
-                raise ValueError("Error manager was passed a pydantic error it does not know how to handle: %s" % str(e))
+                self.add_error(OtherPydanticError(e, MedfordValidator._find_block(e, data)))
         pass
 
+    @staticmethod
+    def _find_block(e, data: Optional[Dict]) :
+        # the deepest Block along the error's location in the validated data, if any
+        block = None
+        if isinstance(e.get('input'), dict) :
+            block = e['input'].get('Block')
+        cur = data
+        for key in e.get('loc', ()) :
+            try :
+                cur = cur[key] # type: ignore
+            except (KeyError, IndexError, TypeError) :
+                break
+            if isinstance(cur, dict) and 'Block' in cur :
+                block = cur['Block']
+        return block
+
     @classmethod
     def _clear_errors(cls) :
         print(MedfordValidator._instance)
@@ -120,6 +197,7 @@ class MedfordValidator(object):
             MedfordValidator._instance._syntax_err_coll = {}
             MedfordValidator._instance._other_err_coll = {}
             MedfordValidator._instance._pydantic_err_coll = {}
+            MedfordValidator._instance._get_line_index = None
             MedfordValidator._instance._id = random.random()
         else :
             exit(1)
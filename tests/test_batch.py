@@ -0,0 +1,45 @@
+import io
+from pathlib import Path
+
+from MEDFORD.batch import find_mfd_files, run_batch
+from MEDFORD.objs.linecollector import DuplicatePolicy
+
+valid = "@MEDFORD name\n@MEDFORD-Version 2.0\n@Contributor Me\n"
+no_desc = "@MEDFORD-Version 2.0\n"
+
+def make_tree(root: Path) -> None :
+    (root / "sub").mkdir()
+    (root / "a.mfd").write_text(valid)
+    (root / "sub" / "b.MFD").write_text(valid)
+    (root / "sub" / "c.mfd").write_text(no_desc)
+    (root / "sub" / "notes.txt").write_text(no_desc)
+
+def test_find_mfd_files(tmp_path) :
+    make_tree(tmp_path)
+    found = [Path(f).relative_to(tmp_path).as_posix() for f in find_mfd_files(str(tmp_path))]
+    assert found == ["a.mfd", "sub/b.MFD", "sub/c.mfd"]
+
+def test_run_batch(tmp_path) :
+    make_tree(tmp_path)
+    for workers in (1, 2) :
+        out = io.StringIO()
+        status = run_batch(str(tmp_path), workers, out)
+        lines = out.getvalue().splitlines()
+        assert status == 1
+        assert len(lines) == 4
+        assert sorted(lines[:3]) == sorted([f"PASS {tmp_path / 'a.mfd'}", f"PASS {tmp_path / 'sub' / 'b.MFD'}", f"FAIL {tmp_path / 'sub' / 'c.mfd'} (1 syntax)"])
+        assert lines[3].startswith("3 files: 2 passed, 1 failed")
+
+def test_run_batch_options(tmp_path, capsys) :
+    (tmp_path / "dup.mfd").write_text(valid + "@Contributor Me\n")
+    for workers in (1, 2) :
+        out = io.StringIO()
+        assert run_batch(str(tmp_path), workers, out) == 0
+        assert run_batch(str(tmp_path), workers, out, duplicate_policy=DuplicatePolicy.ERROR) == 1
+        assert out.getvalue().splitlines()[2] == f"FAIL {tmp_path / 'dup.mfd'} (1 other)"
+        # the limit reaches the worker processes, however they are started
+        out = io.StringIO()
+        assert run_batch(str(tmp_path), workers, out, max_line_length=15) == 1
+        assert out.getvalue().splitlines()[0] == f"FAIL {tmp_path / 'dup.mfd'} (3 syntax)"
+    # the parser's own output does not end up beside the report
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,60 @@
+import json
+
+from MEDFORD.bench.cli import main
+from MEDFORD.bench.compare import compare_results
+from MEDFORD.bench.corpus import CorpusSpec, generate, write_corpus
+from MEDFORD.bench.runner import STAGES, bench_collect, bench_file
+from MEDFORD.medford import validate
+
+def test_generate_is_deterministic() :
+    spec = CorpusSpec(n_blocks=20, n_macros=6, macro_chain=3, macro_ratio=0.5, latex_ratio=0.5, comment_ratio=0.5)
+    assert generate(spec) == generate(spec)
+    assert generate(spec) != generate(CorpusSpec(n_blocks=20, n_macros=6, macro_chain=3, macro_ratio=0.5, seed=1))
+
+def test_generated_file_is_valid(tmp_path) :
+    spec = CorpusSpec(n_blocks=20, details_per_block=3, continuation_depth=2, n_macros=6, macro_chain=3,
+                      macro_ratio=1.0, latex_ratio=0.5, comment_ratio=0.5)
+    f = tmp_path / "synthetic.mfd"
+    write_corpus(spec, str(f))
+    res = validate(f)
+    assert res.is_valid
+    assert res.profile["collect"].counts["MacroLine"] == 6
+    assert res.profile["collect"].counts["ContinueLine"] == 20 * 2 * 2
+    assert res.profile["collect"].counts["blocks"] == 21
+    assert res.profile["dictionize"].counts["macro_uses"] > 0
+
+def test_bench_file(tmp_path) :
+    f = tmp_path / "synthetic.mfd"
+    n_lines = write_corpus(CorpusSpec(n_blocks=5, n_macros=2, macro_ratio=0.5), str(f))
+    res = bench_file(str(f), repeat=1)
+    assert res["lines"] == n_lines
+    assert list(res["stages"].keys()) == STAGES
+    for st in res["stages"].values() :
+        assert st["seconds"] > 0
+        assert st["peak_bytes"] > 0
+
+def test_bench_collect() :
+    res = bench_collect([800, 1600], repeat=1)
+    # 7 Lines per block (the blank line between blocks is not one), 100 macros and 2 @MEDFORD lines
+    assert [r["lines"] for r in res] == [7 * 100 + 102, 7 * 200 + 102]
+    assert all([r["lines_per_sec"] > 0 for r in res])
+
+def results(lines_per_sec: float, peak_bytes: int) -> dict :
+    return {"workloads": {"plain": {"stages": {"read": {"lines_per_sec": lines_per_sec, "peak_bytes": peak_bytes}}}}}
+
+def test_compare_results() :
+    base = results(1000, 1000)
+    assert not any([c.regressed for c in compare_results(base, results(800, 1050))])
+    slower = compare_results(base, results(700, 1000))
+    assert [(c.metric, c.regressed) for c in slower] == [("lines_per_sec", True), ("peak_bytes", False)]
+    bigger = compare_results(base, results(2000, 1200), memory_threshold=0.1)
+    assert [(c.metric, c.regressed) for c in bigger] == [("lines_per_sec", False), ("peak_bytes", True)]
+    # workloads missing from the baseline are not compared
+    assert compare_results({"workloads": {}}, base) == []
+
+def test_compare_exit_status(tmp_path) :
+    base, cur = tmp_path / "base.json", tmp_path / "cur.json"
+    base.write_text(json.dumps(results(1000, 1000)))
+    cur.write_text(json.dumps(results(900, 1000)))
+    assert main(["compare", "--baseline", str(base), "--current", str(cur)]) == 0
+    assert main(["compare", "--baseline", str(base), "--current", str(cur), "--speed-threshold", "0.05"]) == 1
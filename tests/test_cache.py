@@ -0,0 +1,65 @@
+import os
+from pathlib import Path
+
+from MEDFORD.cache import ResultCache
+from MEDFORD.medford import _plain_data, validate
+
+samples = Path(__file__).parent.parent / "samples"
+
+def test_key_depends_on_contents_and_mode() :
+    k = ResultCache.key(b"@MEDFORD name\n", "OTHER")
+    assert k == ResultCache.key(b"@MEDFORD name\n", "OTHER")
+    assert k != ResultCache.key(b"@MEDFORD other\n", "OTHER")
+    assert k != ResultCache.key(b"@MEDFORD name\n", "BCODMO")
+    assert k != ResultCache.key(b"@MEDFORD name\n", "OTHER", "unused_macros=True")
+
+def test_hit_skips_stages(tmp_path) :
+    cache = ResultCache(str(tmp_path / "cache"))
+    first = validate(samples / "dnc.MFD", cache=cache)
+    assert not first.from_cache
+    assert "pydantic" in first.timings
+
+    second = validate(samples / "dnc.MFD", cache=cache)
+    assert second.from_cache
+    assert list(second.timings.keys()) == ["cache"]
+    assert second.dict_data == _plain_data(first.dict_data)
+    assert not second.is_valid
+    summary = lambda res: [(e.errname, e.get_head_lineno(), e.msg) for e in res.errors["pydantic"]]
+    assert summary(second) == summary(first)
+
+def test_entry_is_compact(tmp_path) :
+    cache = ResultCache(str(tmp_path / "cache"))
+    f = samples / "pdam_cunning.MFD"
+    first = validate(f, cache=cache)
+    # none of the Lines, Details or Blocks of the file are stored
+    [entry] = list((tmp_path / "cache").iterdir())
+    assert entry.stat().st_size < f.stat().st_size
+
+    second = validate(f, cache=cache)
+    assert second.from_cache and second.is_valid
+    assert second.dict_data["Paper"][0]["Primary"][0]["Link"] == ["https://www.nature.com/articles/s41598-018-34459-8"]
+    assert [(w.name, w.lines) for w in second.warnings] == [(w.name, w.lines) for w in first.warnings]
+
+def test_changed_file_misses(tmp_path) :
+    cache = ResultCache(str(tmp_path / "cache"))
+    f = tmp_path / "f.mfd"
+    f.write_text("@MEDFORD name\n@MEDFORD-Version 2.0\n@Contributor Me\n")
+    assert validate(f, cache=cache).is_valid
+
+    f.write_text("@MEDFORD-Version 2.0\n")
+    res = validate(f, cache=cache)
+    assert not res.from_cache
+    assert res.has_syntax_err()
+
+def test_lru_eviction(tmp_path) :
+    cache = ResultCache(str(tmp_path), max_bytes=1000)
+    for i in range(3) :
+        cache.put(str(i), "x" * 300)
+        # mtime resolution can be coarse, so order the entries explicitly
+        os.utime(tmp_path / f"{i}.pickle", (i, i))
+    cache.get("0")
+
+    cache.put("3", "x" * 300)
+    assert cache.get("1") is None
+    assert cache.get("0") is not None
+    assert cache.get("3") is not None
@@ -1,8 +1,10 @@
 from MEDFORD.objs.dictionizer import Dictionizer
-from MEDFORD.objs.linecollections import Block, Detail
+from MEDFORD.objs.linecollections import Block, Detail, Macro
 from MEDFORD.objs.linereader import LineReader as LR
 from MEDFORD.objs.linecollector import LineCollector as LC
 from MEDFORD.objs.lines import Line
+from MEDFORD.submodules.mfdvalidator.errors import MaxMacroDepthExceeded, MacroExpansionLimitExceeded
+import MEDFORD.mfdglobals as mfdglobals
 
 from typing import List, Dict, Any
 
@@ -108,4 +110,130 @@ class TestDictionizer() :
         assert 'minor' in c_d.keys()
         assert len(c_d["minor"][0]) == 2
         assert isinstance(c_d["minor"][0][0], Detail)
-        assert c_d["minor"][0][1] == "minor1"
\ No newline at end of file
+        assert c_d["minor"][0][1] == "minor1"
+
+    #########################################
+    # Macro Resolution                      #
+    #########################################
+
+    def preprocess_macros(self, lines: List[str]) -> Dict[str, Macro] :
+        line_objs: List[Line] = []
+        for idx, l in enumerate(lines) :
+            pl = LR.process_line(l, idx)
+            if pl is not None :
+                line_objs.append(pl)
+
+        return LC(line_objs).defined_macros
+
+    def test_macros_resolved_in_dependency_order(self) :
+        sample_lines = [
+            "`@Macro3 `@Macro2 3",
+            "`@Macro2 `@Macro1 2",
+            " and `@Macro1",
+            "`@Macro1 1"
+            ]
+        macros = self.preprocess_macros(sample_lines)
+
+        mfdglobals.validator._clear_errors()
+        d = Dictionizer(macros, {})
+        assert d.resolve_macros(["Macro3"]) == {"Macro1": "1", "Macro2": "1 2 and 1", "Macro3": "1 2 and 1 3"}
+        assert len(mfdglobals.validator._other_err_coll) == 0
+
+    def test_macros_resolved_only_when_used(self) :
+        sample_lines = [
+            "`@Macro1 1",
+            "`@Macro2 `@Macro1 2",
+            "`@Unused `@Macro1",
+            "@Major name",
+            "@Major-minor `@Macro2"
+            ]
+        line_objs: List[Line] = []
+        for idx, l in enumerate(sample_lines) :
+            pl = LR.process_line(l, idx)
+            if pl is not None :
+                line_objs.append(pl)
+        lc = LC(line_objs)
+        bl = lc.get_flat_blocks()
+
+        d = Dictionizer(lc.defined_macros, {})
+        assert len(d.resolved_macros) == 0
+        assert [m.name for m in d.get_unused_macros(bl)] == ["Unused"]
+        assert len(d.resolved_macros) == 0
+
+        res_d = d.generate_dict(bl)
+        assert res_d["Major"][0]["minor"][0][1] == "1 2"
+        assert sorted(d.resolved_macros.keys()) == ["Macro1", "Macro2"]
+
+    def test_macro_loop_reported_once(self) :
+        sample_lines = [
+            "`@Macro1 `@Macro2",
+            "`@Macro2 `@Macro3",
+            "`@Macro3 `@Macro1",
+            "`@Macro4 `@Macro3"
+            ]
+        macros = self.preprocess_macros(sample_lines)
+
+        mfdglobals.validator._clear_errors()
+        d = Dictionizer(macros, {})
+        assert all(d.resolve_macros([n])[n] == "ERROR" for n in macros.keys())
+
+        errs = mfdglobals.validator._other_err_coll
+        assert list(errs.keys()) == [0]
+        assert len(errs[0]) == 1
+        err = errs[0][0]
+        assert isinstance(err, MaxMacroDepthExceeded)
+        assert err.is_loop
+        assert [m.name for m in err.macros] == ["Macro1", "Macro2", "Macro3", "Macro1"]
+        mfdglobals.validator._clear_errors()
+
+    def test_macro_expansion_budget(self) :
+        # every macro repeats the previous one 10 times; L9 would be 3 billion characters long
+        sample_lines = ["`@L0 lol"]
+        for i in range(1, 10) :
+            sample_lines.append(f"`@L{i} " + " ".join([f"`@L{i-1}"] * 10))
+        sample_lines.extend(["@Major name", "@Major-minor `@L9"])
+        line_objs: List[Line] = []
+        for idx, l in enumerate(sample_lines) :
+            pl = LR.process_line(l, idx)
+            if pl is not None :
+                line_objs.append(pl)
+        lc = LC(line_objs)
+
+        mfdglobals.validator._clear_errors()
+        d = Dictionizer(lc.defined_macros, {})
+        res_d = d.generate_dict(lc.get_flat_blocks())
+        assert res_d["Major"][0]["minor"][0][1] == "ERROR"
+        assert d.macro_graph.expanded_chars < 10 * Macro.MAX_EXPANDED_CHARS # type: ignore
+
+        errs = [e for es in mfdglobals.validator._other_err_coll.values() for e in es]
+        assert len(errs) == 1
+        assert isinstance(errs[0], MacroExpansionLimitExceeded)
+        mfdglobals.validator._clear_errors()
+
+    def test_macro_expansion_budget_only_charged_when_used(self) :
+        # L9 would go over the budget, but nothing uses it
+        sample_lines = ["`@L0 lol"]
+        for i in range(1, 10) :
+            sample_lines.append(f"`@L{i} " + " ".join([f"`@L{i-1}"] * 10))
+        sample_lines.extend(["@Major name", "@Major-minor `@L1"])
+        line_objs: List[Line] = []
+        for idx, l in enumerate(sample_lines) :
+            pl = LR.process_line(l, idx)
+            if pl is not None :
+                line_objs.append(pl)
+        lc = LC(line_objs)
+
+        mfdglobals.validator._clear_errors()
+        d = Dictionizer(lc.defined_macros, {})
+        assert d.macro_graph.expanded_chars == 0
+        res_d = d.generate_dict(lc.get_flat_blocks())
+        assert res_d["Major"][0]["minor"][0][1] == " ".join(["lol"] * 10)
+        assert len(mfdglobals.validator._other_err_coll) == 0
+
+        d = Dictionizer(lc.defined_macros, {}, max_expanded_chars=10)
+        res_d = d.generate_dict(lc.get_flat_blocks())
+        assert res_d["Major"][0]["minor"][0][1] == "ERROR"
+        errs = [e for es in mfdglobals.validator._other_err_coll.values() for e in es]
+        assert len(errs) == 1
+        assert isinstance(errs[0], MacroExpansionLimitExceeded)
+        mfdglobals.validator._clear_errors()
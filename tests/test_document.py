@@ -0,0 +1,86 @@
+from MEDFORD.objs.document import MFDDocument
+from MEDFORD.objs.linereader import LineReader
+from MEDFORD.objs.linecollector import LineCollector
+from MEDFORD.objs.lines import Line
+
+from typing import List
+
+class TestDocument() :
+    def setup_method(self, test_method) :
+        self.texts: List[str] = [
+            "`@Tufts Tufts University\n",
+            "`@Dept Computer Science, `@Tufts\n",
+            "@Contributor Polina Shpilker\n",
+            "@Contributor-Association `@Dept\n",
+            "# comment\n",
+            "@Contributor Kiki Shpilker\n",
+            "@Contributor-Association Cat\n",
+            "@Paper Some Paper\n",
+            "@Paper-Note note\n",
+            " that continues\n",
+        ]
+
+    def full_parse(self, texts: List[str]) -> LineCollector :
+        lines: List[Line] = []
+        for idx, t in enumerate(texts) :
+            l = LineReader.process_line(t, idx)
+            if l is not None :
+                lines.append(l)
+        return LineCollector(lines)
+
+    def assert_matches_full_parse(self, doc: MFDDocument) :
+        lc = self.full_parse(doc.texts)
+        assert doc.get_named_blocks() == lc.get_1lvl_blocks()
+        assert doc.macros == lc.get_macros()
+        for name, block in doc.get_named_blocks().items() :
+            assert block.get_linenos() == lc.get_1lvl_blocks()[name].get_linenos()
+
+    def test_initial_parse(self) :
+        doc = MFDDocument(self.texts)
+        self.assert_matches_full_parse(doc)
+        assert len(doc.segments) > 1
+        assert doc.resolved_macros["Dept"] == "Computer Science, Tufts University"
+
+    def test_edit_detail_keeps_other_blocks(self) :
+        doc = MFDDocument(self.texts)
+        untouched = doc.get_named_blocks()["Contributor@Polina Shpilker"]
+
+        doc.edit(6, 7, ["@Contributor-Association Dog\n"])
+        self.assert_matches_full_parse(doc)
+        assert doc.get_named_blocks()["Contributor@Polina Shpilker"] is untouched
+
+    def test_insert_lines_shifts_linenos(self) :
+        doc = MFDDocument(self.texts)
+        paper = doc.get_named_blocks()["Paper@Some Paper"]
+
+        doc.edit(5, 5, ["@Contributor New Person\n", "@Contributor-Role Author\n"])
+        self.assert_matches_full_parse(doc)
+        assert doc.get_named_blocks()["Paper@Some Paper"] is paper
+        assert paper.get_linenos() == [9, 10, 11]
+        assert doc.find(11).block is paper
+        assert doc.find(6).line.lineno == 6
+
+    def test_delete_block(self) :
+        doc = MFDDocument(self.texts)
+        doc.edit(5, 7, [])
+        self.assert_matches_full_parse(doc)
+        assert "Contributor@Kiki Shpilker" not in doc.get_named_blocks()
+
+    def test_edit_macro_reresolves_users(self) :
+        doc = MFDDocument(self.texts)
+        doc.edit(0, 1, ["`@Tufts Tufts\n"])
+        self.assert_matches_full_parse(doc)
+        assert doc.resolved_macros["Tufts"] == "Tufts"
+        assert doc.resolved_macros["Dept"] == "Computer Science, Tufts"
+
+    def test_undefined_macro_while_editing(self) :
+        doc = MFDDocument(self.texts)
+        doc.edit(0, 1, [])
+        assert "Tufts" not in doc.resolved_macros
+        assert "Dept" not in doc.resolved_macros
+
+    def test_edit_turns_line_into_continuation(self) :
+        doc = MFDDocument(self.texts)
+        doc.edit(7, 8, [" no longer a new block\n"])
+        self.assert_matches_full_parse(doc)
+        assert "Paper@Some Paper" not in doc.get_named_blocks()
@@ -109,4 +109,51 @@ class Macro_Replacement_Tests :
         raise NotImplementedError()
 
     def test_basic_replacement(self) :
-        raise NotImplementedError()
\ No newline at end of file
+        raise NotImplementedError()
+
+def test_MacroLine_body_repeats_macro_name() :
+    # the body also appears at the start of the line, so searching for it finds the wrong offset.
+    test_line = "`@Ab `@A"
+    lr = LineReader.process_line(test_line, -1)
+    assert isinstance(lr, MacroLine)
+    assert lr.raw_content == "`@A"
+    assert lr.macro_uses[0] == (0,3,"A")
+    assert lr.get_content({"A":"value"}) == "value"
+
+def test_lines_have_no_instance_dict() :
+    test_lines = ["# comment", "`@Macro def", "@Major-minor content", " continue"]
+    for idx, l in enumerate(test_lines) :
+        lr = LineReader.process_line(l, idx)
+        assert lr is not None
+        assert not hasattr(lr, "__dict__")
+
+def test_content_defaults_not_shared() :
+    first = LineReader.process_line("@Major content", 0)
+    second = LineReader.process_line("@Major content $$tex$$", 1)
+    assert isinstance(first, NovelDetailLine) and isinstance(second, NovelDetailLine)
+    assert not first.has_tex
+    assert len(first.tex_locs) == 0
+    assert second.tex_locs == [(8, 15)]
+
+def test_content_plan_alternates_literals_and_macros() :
+    lr = LineReader.process_line("@Major-minor a `@M1 b `@M2 `@M1", 0)
+    assert isinstance(lr, NovelDetailLine)
+    assert lr.get_content_plan() == ("a ", "M1", " b ", "M2", " ", "M1", "")
+    assert lr.get_content({"M1":"1", "M2":"22"}) == "a 1 b 22 1"
+    assert lr.get_content({"M1":"x", "M2":"y"}) == "a x b y x"
+
+def test_many_tex_spans() :
+    # one candidate span per recursive call used to hit the recursion limit
+    n = 5000
+    line = LineReader.process_line("@Major-minor " + "$$x$$ `@M " * n + "# comment $$y$$", 0)
+    assert line.has_tex and len(line.tex_locs) == n
+    assert line.has_inline and line.comm_loc == len("$$x$$ `@M ") * n
+    assert line.tex_locs[-1] == (line.comm_loc - 10, line.comm_loc - 5)
+
+def test_content_with_leading_space_comment_and_macro() :
+    lr = LineReader.process_line(" cont `@M # note `@N", 0)
+    assert isinstance(lr, ContinueLine)
+    assert lr.macro_uses == [(6, 9, "M")]
+    assert lr.get_content_plan() == ("cont ", "M", "")
+    assert lr.get_content({"M":"value"}) == "cont value"
+    assert lr.get_content_length({"M":5}) == len("cont value")
@@ -0,0 +1,99 @@
+from pathlib import Path
+
+from MEDFORD.medford import validate
+from MEDFORD.objs.linecollector import DuplicatePolicy
+from MEDFORD.models.generics import Entity
+
+samples = Path(__file__).parent.parent / "samples"
+
+def test_validate_valid_file() :
+    res = validate(samples / "pdam_cunning.MFD")
+    assert res.is_valid
+    assert isinstance(res.entity, Entity)
+    assert res.n_errors() == 0
+    assert list(res.timings.keys()) == ["collect", "dictionize", "pydantic"]
+
+def test_validate_stops_on_syntax_error() :
+    # would sys.exit from the command line
+    res = validate(samples / "all_syntax_errs.MFD")
+    assert not res.is_valid
+    assert res.has_syntax_err()
+    assert res.entity is None
+    assert res.dict_data is None
+    assert list(res.errors.keys()) == ["syntax"]
+    assert "pydantic" not in res.timings
+
+def test_validate_collects_pydantic_errors() :
+    res = validate(samples / "dnc.MFD")
+    assert not res.is_valid
+    assert res.entity is not None
+    assert res.dict_data is not None
+    assert len(res.errors["pydantic"]) == 2
+
+def test_validate_unused_macros(tmp_path) :
+    f = tmp_path / "unused.mfd"
+    f.write_text("`@Unused value\n@MEDFORD name\n@MEDFORD-Version 2.0\n@Contributor Me\n")
+    res = validate(f, report_unused_macros=True)
+    assert res.is_valid
+    assert len(res.warnings) == 1
+    assert res.warnings[0].get_start_line() == 0
+
+def test_validate_missing_required_block(tmp_path) :
+    f = tmp_path / "nocontrib.mfd"
+    f.write_text("@MEDFORD name\n@MEDFORD-Version 2.0\n")
+    res = validate(f)
+    assert not res.is_valid
+    assert res.entity is None
+    assert [e.errname for e in res.errors["pydantic"]] == ["MissingRequiredBlock"]
+
+def test_validate_profile(tmp_path) :
+    f = tmp_path / "macros.mfd"
+    f.write_text("`@Lab Shpilker lab\n`@Who `@Lab member\n@MEDFORD name\n@MEDFORD-Version 2.0\n@Contributor Me\n@Contributor-Role `@{Who}\n")
+    res = validate(f)
+    assert res.is_valid
+    assert list(res.profile.keys()) == list(res.timings.keys())
+    for st in res.profile.values() :
+        assert st.wall_time == res.timings[st.name]
+        assert st.cpu_time >= 0
+    assert res.profile["collect"].counts["lines"] == 6
+    assert res.profile["collect"].counts["MacroLine"] == 2
+    assert res.profile["collect"].counts["blocks"] == 2
+    assert res.profile["dictionize"].counts["macro_uses"] == 1
+    assert res.profile["dictionize"].counts["macros_resolved"] == 2
+    assert res.profile["pydantic"].counts == {"blocks": 2, "errors": 0}
+    assert res.format_profile().splitlines()[1].startswith("collect")
+
+def test_errors_carry_position(tmp_path) :
+    f = tmp_path / "noname.mfd"
+    f.write_text("@MEDFORD name\n@MEDFORD-Version 2.0\n@Contributor Me\n@Data-Type sequencing\n that continues\n")
+    res = validate(f)
+    err = res.errors["syntax"][0]
+    assert err.errname == "MissingDescError"
+    assert err.position.lineno == err.get_head_lineno() == 3
+    assert err.position.collection is err.detail
+    assert err.position.block.details[0] is err.detail
+
+def test_validate_duplicate_blocks(tmp_path) :
+    f = tmp_path / "dup.mfd"
+    f.write_text("@MEDFORD name\n@MEDFORD-Version 2.0\n@Contributor Me\n@Contributor-Role Author\n@Contributor Me\n@Contributor-Email me@example.org\n")
+    res = validate(f)
+    assert res.is_valid
+    assert [w.get_start_line() for w in res.warnings] == [4]
+    assert "Role" not in res.dict_data["Contributor"][0]
+
+    res = validate(f, duplicate_policy=DuplicatePolicy.MERGE)
+    assert res.warnings == []
+    assert {"Role", "Email"} <= res.dict_data["Contributor"][0].keys()
+
+    res = validate(f, duplicate_policy=DuplicatePolicy.ERROR)
+    assert not res.is_valid
+    assert [e.errname for e in res.errors["other"]] == ["DuplicateBlockName"]
+
+def test_validate_macro_expansion_limit(tmp_path) :
+    f = tmp_path / "macros.mfd"
+    f.write_text("`@Big " + "x" * 100 + "\n@MEDFORD name\n@MEDFORD-Version 2.0\n@Contributor Me\n@Contributor-Role `@Big\n")
+    assert validate(f).is_valid
+
+    res = validate(f, max_expanded_chars=50)
+    assert not res.is_valid
+    assert [e.errname for e in res.errors["other"]] == ["MacroExpansionLimitExceeded"]
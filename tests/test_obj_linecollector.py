@@ -1,11 +1,13 @@
-from MEDFORD.objs.linecollector import LineCollector
+from MEDFORD.objs.linecollector import DuplicatePolicy, LineCollector
 from MEDFORD.objs.linereader import LineReader
-from MEDFORD.objs.lines import AtAtLine, Line, ContinueLine, MacroLine, CommentLine, NovelDetailLine
+from MEDFORD.objs.lines import AtAtLine, Line, LineKind, ContinueLine, MacroLine, CommentLine, NovelDetailLine
 from MEDFORD.objs.linecollections import Macro, Detail, Block
 from typing import List, Dict
 
 from typing import Optional
 
+import MEDFORD.mfdglobals as mfdglobals
+
 
 class TestLineCollection() :
     def setup_method(self, test_method) :
@@ -58,7 +60,7 @@ class TestLineCollection() :
         assert len(lc.comments) == 0
 
         exdet = Detail(confirmed_line, None)
-        blocks = lc._generate_blocks([exdet])
+        blocks = [Block([exdet])]
 
         assert len(blocks) == 1
 
@@ -478,6 +480,24 @@ class TestLineCollection() :
         assert len(blocks) == 1
         assert blocks[0].get_content(resolved_macros) == "hello value value 2 hello hello"
 
+    def test_detail_content_follows_macro_changes(self) :
+        test_lines: List[str] = [
+            "@Major name",
+            "@Major-minor `@Macro and",
+            " `@Macro again"
+        ]
+        confirmed_lines : List[Line] = []
+        for idx, l in enumerate(test_lines) :
+            L = LineReader.process_line(l, idx)
+            assert L is not None
+            confirmed_lines.append(L)
+
+        lc : LineCollector = LineCollector(confirmed_lines)
+        detail = lc.get_flat_blocks()[0].details[1]
+        assert detail.get_content({"Macro":"one"}) == "one and one again"
+        assert detail.get_content({"Macro":"one"}) == "one and one again"
+        assert detail.get_content({"Macro":"two"}) == "two and two again"
+
     #########################################
     # Free-for-all. Yipee!                  #
     #########################################
@@ -575,4 +595,178 @@ class TestLineCollection() :
         assert lc.named_blocks['Contributor']['Polina Shpilker'] == block_1
         assert lc.named_blocks['Contributor']['Kiki Shpilker'] == block_2
 
-        assert lc.comments == [comment_1, comment_2, comment_3]
\ No newline at end of file
+        assert lc.comments == [comment_1, comment_2, comment_3]
+    #########################################
+    # Streaming Tests                       #
+    #########################################
+
+    def test_iter_blocks_yields_before_input_ends(self) :
+        test_lines: List[str] = [
+            "@Major First",
+            "@Major-minor content",
+            "@Major Second",
+            "@Major-minor more content",
+            "@Major Third"
+        ]
+        consumed: List[int] = []
+
+        def line_source() :
+            for idx, l in enumerate(LineReader.iter_lines(test_lines)) :
+                consumed.append(idx)
+                yield l
+
+        lc : LineCollector = LineCollector()
+        block_iter = lc.iter_blocks(line_source())
+
+        first = next(block_iter)
+        assert first.name == "First"
+        # the block closes once the next Detail is complete, not at the end of input
+        assert len(consumed) == 4
+
+        rest = list(block_iter)
+        assert [b.name for b in rest] == ["Second", "Third"]
+        assert len(lc.named_blocks.keys()) == 0
+
+    def test_feed_emits_as_soon_as_complete(self) :
+        test_lines: List[str] = [
+            "`@Mac value",
+            "@Major First",
+            "@Major-minor content `@Mac",
+            "continued",
+            "# comment",
+            "@Major Second",
+        ]
+        lines = list(LineReader.iter_lines(test_lines))
+        lc : LineCollector = LineCollector()
+
+        emitted = [[type(item).__name__ for item in lc.feed(l)] for l in lines]
+        assert emitted == [[], ["Macro"], ["Detail"], [], ["Detail"], []]
+        # the header of Second closes First
+        assert [type(item).__name__ for item in lc.close()] == ["Block", "Detail", "Block"]
+
+        assert list(lc.defined_macros.keys()) == ["Mac"]
+        assert list(lc.named_blocks['Major'].keys()) == ["First", "Second"]
+        assert lc.named_blocks == LineCollector(lines).named_blocks
+
+    def test_block_index(self) :
+        test_lines: List[str] = [
+            "@Major First",
+            "@Major-minor content",
+            "@Other One",
+            "@Major Second",
+            "@Major First",
+            "@Major-minor replaced",
+        ]
+        lc : LineCollector = LineCollector(list(LineReader.iter_lines(test_lines)))
+        index = lc.block_index
+
+        # views are built once and shared until the next Block is added
+        assert lc.get_flat_blocks() is lc.get_flat_blocks()
+        assert list(lc.get_1lvl_blocks().keys()) == ["Major@First", "Major@Second", "Other@One"]
+        assert [b.name for b in lc.get_flat_blocks()] == ["First", "Second", "One"]
+
+        assert index.get("Other@One") is lc.named_blocks["Other"]["One"]
+        assert "Major@Third" not in index
+        assert index.majors() == ["Major", "Other"]
+        assert [b.name for b in index.iter_major("Major")] == ["First", "Second"]
+        assert len(index) == 3
+
+        # the later First replaced the earlier one, lines and all
+        assert index.block_at(5) is index.get("Major@First")
+        assert index.block_at(1) is None
+        assert index.block_at(3) is index.get("Major@Second")
+
+    def test_line_index(self) :
+        test_lines: List[str] = [
+            "`@Mac value",
+            "@Major First",
+            "@Major-minor content",
+            "continued",
+            "# comment",
+            "",
+            "@Major-minor more",
+        ]
+        lc : LineCollector = LineCollector(list(LineReader.iter_lines(test_lines)))
+        # only built once queried
+        assert lc._line_index is None
+        index = lc.get_line_index()
+        assert lc.get_line_index() is index
+        first = lc.named_blocks["Major"]["First"]
+
+        assert index.collection_at(0) is lc.defined_macros["Mac"]
+        assert index.block_at(0) is None
+
+        pos = index.find(3)
+        assert isinstance(pos.line, ContinueLine)
+        assert pos.collection is first.details[1]
+        assert pos.block is first
+
+        # between the Details of a Block, but in neither
+        pos = index.find(5)
+        assert pos.line is None and pos.collection is None
+        assert pos.block is first
+        assert isinstance(index.line_at(4), CommentLine)
+
+        assert index.find(6).collection is first.details[2]
+        assert index.find(7).block is None
+
+    duplicate_lines: List[str] = [
+        "@Major First",
+        "@Major-minor one",
+        "@Major First",
+        "@Major-minor two",
+        "@Major Second",
+        "@Major First",
+        "@Major-other three",
+    ]
+
+    def test_duplicate_names_kept(self) :
+        lc : LineCollector = LineCollector(list(LineReader.iter_lines(self.duplicate_lines)))
+        index = lc.block_index
+        assert [b.get_linenos() for b in index.get_all("Major@First")] == [[0, 1], [2, 3], [5, 6]]
+        assert index.duplicates == index.get_all("Major@First")[1:]
+        # the last one wins, in the place of the first
+        assert [b.name for b in lc.get_flat_blocks()] == ["First", "Second"]
+        assert lc.named_blocks["Major"]["First"] is index.duplicates[-1]
+
+    def test_duplicate_names_merged(self) :
+        lc : LineCollector = LineCollector(list(LineReader.iter_lines(self.duplicate_lines)), DuplicatePolicy.MERGE)
+        merged = lc.named_blocks["Major"]["First"]
+        assert merged.get_linenos() == [0, 1, 3, 6]
+        assert [t for t, _ in merged.minor_tokens] == ["minor", "minor", "other"]
+        assert lc.get_flat_blocks()[0] is merged
+        # the collected Blocks are left as they were
+        assert [len(b.details) for b in lc.block_index.get_all("Major@First")] == [2, 2, 2]
+
+    def test_duplicate_names_merged_errors_once(self) :
+        # a Block without a description is reported when created, and not again when merged
+        test_lines : List[str] = ["@Major-minor one", "@Other One", "@Major-minor one", "@Major-other two"]
+        with mfdglobals.mv.context() as v :
+            lc : LineCollector = LineCollector(list(LineReader.iter_lines(test_lines)), DuplicatePolicy.MERGE)
+        assert [(e.errname, e.get_head_lineno()) for e in v.get_errors()] == [("MissingDescError", 0), ("MissingDescError", 2)]
+        assert lc.get_flat_blocks()[0].get_linenos() == [0, 3]
+
+    def test_duplicate_names_error(self) :
+        with mfdglobals.mv.context() as v :
+            LineCollector(list(LineReader.iter_lines(self.duplicate_lines)), DuplicatePolicy.ERROR)
+        errs = v.get_errors()
+        assert [e.errname for e in errs] == ["DuplicateBlockName"] * 2
+        assert [(e.get_head_lineno(), e.lineno_first) for e in errs] == [(2, 0), (5, 0)]
+
+    def test_transition_table(self) :
+        kinds = {CommentLine: LineKind.COMMENT, MacroLine: LineKind.MACRO, NovelDetailLine: LineKind.DETAIL,
+                 AtAtLine: LineKind.ATAT, ContinueLine: LineKind.CONTINUE}
+        for cls, kind in kinds.items() :
+            assert cls.kind == kind
+
+        table = LineCollector._transitions
+        for state in LineCollector.CollectorState :
+            assert set(table[state].keys()) == set(LineKind)
+            for kind, (complete, _, nxt, row) in table[state].items() :
+                assert row is table[nxt]
+                # nothing to complete before anything is collected, or on a continuation line
+                assert (complete is None) == (state == LineCollector.na or kind == LineKind.CONTINUE)
+
+        # only a macro definition closes a run of details
+        closing = [(state, kind) for state, row in table.items() for kind, t in row.items() if t[1]]
+        assert closing == [(LineCollector.detail, LineKind.MACRO)]
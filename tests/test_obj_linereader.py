@@ -1,6 +1,6 @@
 import pytest
 from MEDFORD.objs.lines import AtAtLine, CommentLine,MacroLine,NovelDetailLine,ContinueLine
-from MEDFORD.objs.linereader import LineReader
+from MEDFORD.objs.linereader import LineReader, LineTokenizer
 from submodules.mfdvalidator.validator import MedfordValidator as em
 from MEDFORD.submodules.mfdvalidator.errors import MissingAtAtName
 
@@ -140,9 +140,115 @@ def test_detect_macro_badcurly() :
     assert res is not None
     assert isinstance(res, NovelDetailLine)
     assert res.has_macros
+def test_tokenizer_matches_separate_finders() :
+    example_lines = [
+        "@Major-minor $$block 1$$ and $$ block # 2 $$ and # a comment",
+        "`@Macro def `@MacroUse1 `@{MacroUse2} # comment `@MacroUse3",
+        "@Major $$ `@NotAMacro $$ `@Macro$$tex$$",
+        "@Major `@a`@b `@c_d `@{e_f}}",
+        "$$$$ $$a$$b$$ # $$c$$ #",
+        "no spans at all",
+    ]
+    for ex in example_lines :
+        assert LineTokenizer.find_spans(ex) == (LineReader.find_possible_inline_comments(ex),
+                                                LineReader.find_possible_latex(ex),
+                                                LineReader.find_macro_uses(ex))
+
+def test_scanners_match_regexes() :
+    # fuzz the hand-written scanners against the regexes they replace, at every position
+    import random
+    from MEDFORD.objs.linereader import DetailStatics
+    rng = random.Random(0)
+    alphabet = ["$", "$$", "(", ")", "`@", "`", "@", "{", "}", "a", "Z", "0", "_", " ", "\t", "\n", "\u00a0", "#"]
+    for _ in range(20000) :
+        line = "".join([rng.choice(alphabet) for _ in range(rng.randint(0, 12))])
+        for pos in range(len(line) + 1) :
+            m = DetailStatics.latex_use_pattern.match(line, pos)
+            assert LineTokenizer.scan_latex(line, pos) == (-1 if m is None else m.end())
+
+            m = DetailStatics.macro_use_pattern.match(line, pos)
+            found = LineTokenizer.scan_macro(line, pos)
+            if m is None :
+                assert found is None
+            elif m.group('r1') is not None :
+                assert found == ((m.start('r1'), m.end('r1'), m.group('mname_closed')), m.end())
+            else :
+                assert found == ((m.start('r2'), m.end('r2'), m.group('mname_open')), m.end())
+
+def test_line_too_long() :
+    import MEDFORD.mfdglobals as mfdglobals
+    long_line = "@Major-minor " + "$$" * 10
+    with mfdglobals.mv.context() as validator :
+        assert LineReader.process_line("@Major-minor short", 3, 20) is not None
+        assert LineReader.process_line(long_line, 4, 20) is None
+        assert LineReader.process_line(long_line, 5, None) is not None
+        assert LineReader.process_line(long_line, 6) is not None
+    errs = validator.get_errors()
+    assert [e.errname for e in errs] == ["LineTooLong"]
+    assert errs[0].get_head_lineno() == 4
+    assert "33 characters" in errs[0].msg
+
 # TODO : move tests over from test_linereader to test "find" capabilities
 # TODO : add test for major-minor identification
 # TODO : add raw content setting tests (e.g. mname, mbody)
 
 # TODO : add test to check indices of returned regex.
-#           reason: regex returns *were* including space after the regex *sometimes*. That is unacceptable.
\ No newline at end of file
+#           reason: regex returns *were* including space after the regex *sometimes*. That is unacceptable.
+def test_mmap_lines_match_text_lines(tmp_path) :
+    example_lines = [
+        "`@Macro déf `@Other\r\n",
+        "@Major Name $$tex$$ # comment `@Macro\r\n",
+        "\r\n",
+        "@Major-minor `@{Macro} ünïcode\r\n",
+        " continued # comment $$ not tex $$",
+    ]
+    path = tmp_path / "mmap_test.mfd"
+    path.write_bytes("".join(example_lines).encode("utf-8"))
+
+    with open(path, 'r', encoding="utf-8") as f :
+        text_lines = list(LineReader.iter_lines(f))
+    mmap_lines = list(LineReader.iter_mmap_lines(str(path)))
+
+    assert len(mmap_lines) == len(text_lines) == 4
+    for t, m in zip(text_lines, mmap_lines) :
+        assert t == m
+        assert m.line == t.line
+        assert m.raw_content == t.raw_content
+        assert m.get_content({"Macro": "value", "Other": "o"}) == t.get_content({"Macro": "value", "Other": "o"})
+        assert not hasattr(m, "_line")
+
+def test_mmap_lines_split_on_lone_carriage_return(tmp_path) :
+    path = tmp_path / "mmap_cr.mfd"
+    path.write_bytes(b"@Major one\r@Major-minor two\r\n continued\n\r`@M m")
+
+    with open(path, 'r', encoding="utf-8") as f :
+        text_lines = list(LineReader.iter_lines(f))
+    mmap_lines = list(LineReader.iter_mmap_lines(str(path)))
+
+    assert [l.lineno for l in mmap_lines] == [l.lineno for l in text_lines] == [0, 1, 2, 4]
+    for t, m in zip(text_lines, mmap_lines) :
+        assert m.line == t.line
+        assert m.raw_content == t.raw_content
+
+def test_parallel_lines_match_sequential(tmp_path, monkeypatch) :
+    example_lines = [
+        "`@Macro value\n",
+        "@Major Name `@Macro # comment\n",
+        "\n",
+        "@Major-minor $$tex$$ content\n",
+        " continued\r\n",
+        "# comment line\n",
+    ] * 20
+    path = tmp_path / "parallel_test.mfd"
+    path.write_bytes("".join(example_lines).encode("utf-8"))
+
+    with open(path, 'r', encoding="utf-8") as f :
+        sequential = list(LineReader.iter_lines(f))
+
+    monkeypatch.setattr(LineReader, "parallel_min_bytes", 0)
+    parallel = list(LineReader.iter_parallel_lines(str(path), 3))
+
+    assert len(parallel) == len(sequential)
+    for s, p in zip(sequential, parallel) :
+        assert s == p
+        assert s.get_lineno() == p.get_lineno()
@@ -0,0 +1,161 @@
+"""Checks that the parser's hot paths scale roughly linearly with their input.
+
+Each case is run at growing sizes, and the exponent k of cost ~ size**k is
+fitted on a log-log scale. Linear code fits k close to 1, quadratic code
+close to 2; a case fails past the maximum exponent.
+
+Each case is checked twice. The number of lines of parser code executed (see
+count_steps) is the same on every run and every machine, but does not see work
+done in C: slicing, concatenating or joining strings, or a regex match, count
+the same at every size. Wall time sees all of it, but is noisy on a busy
+machine, so it is fitted on the best of several runs, with a wider margin, and
+fitted again before a case fails."""
+
+import gc
+import io
+import math
+import os
+import sys
+import time
+from contextlib import contextmanager, redirect_stdout
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import pytest
+
+import MEDFORD.mfdglobals as mfdglobals
+import MEDFORD.objs.lines
+from MEDFORD.bench.corpus import ADVERSARIAL_LINES, CorpusSpec, generate
+from MEDFORD.models.generics import Entity
+from MEDFORD.objs.dictionizer import Dictionizer
+from MEDFORD.objs.linecollections import Detail
+from MEDFORD.objs.linecollector import DuplicatePolicy, LineCollector
+from MEDFORD.objs.linereader import LineReader
+
+STEP_SIZES = [250, 500, 1000, 2000]
+MAX_STEP_EXPONENT = 1.2
+TIME_SIZES = [1000, 4000, 16000]
+MAX_TIME_EXPONENT = 1.3
+TIME_ATTEMPTS = 3
+
+# the MEDFORD package; only lines executed in its files are counted
+SRC_DIR = os.path.dirname(os.path.dirname(MEDFORD.objs.lines.__file__))
+
+@contextmanager
+def no_gc() -> Iterator[None] :
+    # as timeit does: collections triggered by objects other tests left behind are noise
+    gc.collect()
+    gc.disable()
+    try :
+        yield
+    finally :
+        gc.enable()
+
+def best_time(f: Callable[[], object], repeat: int = 5) -> float :
+    best = math.inf
+    with no_gc() :
+        for _ in range(repeat) :
+            start = time.perf_counter()
+            f()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+def count_steps(f: Callable[[], object]) -> int :
+    """Runs f, returning how many lines of MEDFORD code it executed."""
+    steps = 0
+    def trace_line(frame, event, arg) :
+        nonlocal steps
+        if event == "line" :
+            steps += 1
+        return trace_line
+    def trace_call(frame, event, arg) :
+        return trace_line if frame.f_code.co_filename.startswith(SRC_DIR) else None
+
+    old = sys.gettrace()
+    sys.settrace(trace_call)
+    try :
+        f()
+    finally :
+        sys.settrace(old)
+    return steps
+
+def fit_exponent(sizes: List[int], costs: List[float]) -> float :
+    xs = [math.log(n) for n in sizes]
+    ys = [math.log(max(c, 1e-9)) for c in costs]
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    return sum([(x - mx) * (y - my) for x, y in zip(xs, ys)]) / sum([(x - mx) ** 2 for x in xs])
+
+def case_exponent(name: str, sizes: List[int], cost: Callable[[Callable[[], object]], float]) -> float :
+    setup, run = CASES[name]
+    costs = []
+    with mfdglobals.mv.context(mfdglobals.mv.new()), redirect_stdout(io.StringIO()) :
+        for n in sizes :
+            arg = setup(n)
+            costs.append(cost(lambda: run(arg)))
+    return fit_exponent(sizes, costs)
+
+def process_line(line: str) -> Any :
+    return LineReader.process_line(line, 0)
+
+def corpus_lines(n: int) -> List[Any] :
+    spec = CorpusSpec(n_blocks=max(1, n // 5), continuation_depth=1, n_macros=max(1, n // 50), macro_chain=3,
+                      macro_ratio=0.3, latex_ratio=0.3, comment_ratio=0.3)
+    return generate(spec).splitlines(True)
+
+def collected(n: int) -> LineCollector :
+    return LineCollector(LineReader.iter_lines(corpus_lines(n)))
+
+def dictionized(n: int) -> Dict[str, Any] :
+    lc = collected(n)
+    return Dictionizer(lc.get_macros(), lc.get_1lvl_blocks()).generate_dict(lc.get_flat_blocks())
+
+# name -> (setup(size), run(what setup returned)); only run is measured
+CASES: Dict[str, Tuple[Callable[[int], Any], Callable[[Any], Any]]] = {
+    # adversarial lines, with thousands of candidate spans
+    "tex_spans_then_comment": (lambda n: "@Major-minor " + "$$x$$ " * n + "# comment", process_line),
+    "comments_inside_tex": (lambda n: "@Major-minor $$" + "# " * n + "$$ # comment", process_line),
+    "macros_between_tex_spans": (lambda n: "@Major-minor " + "$$x$$ `@{M} " * n, process_line),
+    "macros_then_comment": (lambda n: "@Major-minor " + "`@M " * n + "# comment", process_line),
+    # get_content caches its result, so run it on a Detail seen for the first time
+    "detail_get_content": (lambda n: list(LineReader.iter_lines(["@Major-minor `@M start\n"] + ["continued `@M text\n"] * n)),
+                           lambda lines: Detail(lines[0], lines[1:]).get_content({"M": "macro"})),
+    "merge_duplicate_blocks": (lambda n: list(LineReader.iter_lines(["@Contributor Me\n", "@Contributor-Role Author\n"] * n)),
+                               lambda lines: LineCollector(lines, DuplicatePolicy.MERGE)),
+    # the stages of the pipeline, on a synthetic file of n // 5 Blocks
+    "stage_read": (corpus_lines, lambda text_lines: list(LineReader.iter_lines(text_lines))),
+    "stage_collect": (lambda n: list(LineReader.iter_lines(corpus_lines(n))), LineCollector),
+    "stage_dictionize": (collected, lambda lc: Dictionizer(lc.get_macros(), lc.get_1lvl_blocks()).generate_dict(lc.get_flat_blocks())),
+    "stage_pydantic": (dictionized, lambda d: Entity(**d)),
+}
+for _name, _make_line in ADVERSARIAL_LINES.items() :
+    CASES["adversarial_" + _name] = (lambda n, make_line=_make_line: make_line(n * 2), process_line)
+
+def test_fit_exponent() :
+    assert fit_exponent([1, 2, 4], [1, 2, 4]) == pytest.approx(1)
+    assert fit_exponent([1, 2, 4], [1, 4, 16]) == pytest.approx(2)
+
+def test_count_steps() :
+    def loop(n: int) -> None :
+        # lines run here are not counted, only those of the parser
+        for _ in range(n) :
+            LineReader.process_line("@Major-minor content", 0)
+    assert count_steps(lambda: loop(10)) == 10 * count_steps(lambda: loop(1)) > 0
+
+def test_cases_give_right_results() :
+    lines = CASES["detail_get_content"][0](10)
+    assert CASES["detail_get_content"][1](lines).count("macro") == 11
+    lines = CASES["merge_duplicate_blocks"][0](10)
+    assert len(CASES["merge_duplicate_blocks"][1](lines).get_flat_blocks()[0].details) == 11
+
+@pytest.mark.parametrize("name", list(CASES.keys()))
+def test_steps_scale_linearly(name) :
+    assert case_exponent(name, STEP_SIZES, count_steps) < MAX_STEP_EXPONENT
+
+@pytest.mark.parametrize("name", list(CASES.keys()))
+def test_time_scales_linearly(name) :
+    # a slowdown of the machine skews one fit, but hardly every one
+    exponent = math.inf
+    for _ in range(TIME_ATTEMPTS) :
+        exponent = min(exponent, case_exponent(name, TIME_SIZES, best_time))
+        if exponent < MAX_TIME_EXPONENT :
+            break
+    assert exponent < MAX_TIME_EXPONENT
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from MEDFORD.objs.linereader import LineReader
+from MEDFORD.objs.linecollector import LineCollector
+from MEDFORD.objs.lines import Line
+from MEDFORD.submodules.mfdvalidator.validator import MedfordValidator
+from pydantic import BaseModel, ValidationError
+
+from MEDFORD.submodules.mfdvalidator.errors import MissingContent, OtherPydanticError
+
+def collect(lines: List[str]) -> LineCollector :
+    line_objs: List[Line] = []
+    for idx, l in enumerate(lines) :
+        pl = LineReader.process_line(l, idx)
+        if pl is not None :
+            line_objs.append(pl)
+    return LineCollector(line_objs)
+
+def test_context_replaces_instance() :
+    outer = MedfordValidator.instance()
+    with MedfordValidator.context() as v :
+        assert MedfordValidator.instance() is v
+        assert v is not outer
+        collect(["@Major name", "@Major-minor "])
+    assert MedfordValidator.instance() is outer
+
+    errs = v.get_errors()
+    assert len(errs) == 1
+    assert isinstance(errs[0], MissingContent)
+    assert errs[0] not in outer.get_errors()
+
+def test_contexts_are_per_thread() :
+    def run(n_empty: int) -> int :
+        with MedfordValidator.context() as v :
+            lines = ["@Major name"]
+            for _ in range(n_empty) :
+                lines.append("@Major-minor ")
+            collect(lines)
+            return len(v.get_errors())
+
+    with ThreadPoolExecutor(max_workers=4) as executor :
+        counts = list(executor.map(run, [1, 2, 3, 4] * 5))
+    assert counts == [1, 2, 3, 4] * 5
+
+def test_unknown_pydantic_error_is_recorded() :
+    class Model(BaseModel) :
+        count: int
+
+    class File(BaseModel) :
+        Major: List[Model]
+
+    block = collect(["@Major name", "@Major-count many"]).get_flat_blocks()[0]
+    with MedfordValidator.context() as v :
+        try :
+            Model(count="many")
+        except ValidationError as e :
+            v.handle_pydantic_errors(e)
+        data = {"Major": [{"count": "many", "Block": block}]}
+        try :
+            File(**data)
+        except ValidationError as e :
+            v.handle_pydantic_errors(e, data)
+
+    errs = v.get_errors()
+    assert len(errs) == 2
+    assert all(isinstance(e, OtherPydanticError) and e.pydantic_type == "int_parsing" for e in errs)
+    assert errs[0].msg.startswith("count: ")
+    assert [e.get_head_lineno() for e in errs] == [0, 0]
+    assert errs[1].block is block